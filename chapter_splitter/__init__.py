@@ -0,0 +1,88 @@
+# 動画・音声ファイルをチャプターごとに分割するライブラリ
+# GUI（split_gui.py）とCLI（chapter-split）はこのAPIの薄いラッパー
+# tkinterには依存しないため、ヘッドレス環境やワーカープロセスからも利用できる
+#
+# 起動を速くするため、サブモジュールは最初に名前が参照されたときに読み込む
+# （runner経由のasyncioなど、重いimportは実際に使うまで行わない）
+
+import importlib
+import sys
+import types
+
+# 公開する名前→定義しているサブモジュール
+EXPORTS = {
+    "chapters_from_silences": "analysis",
+    "detect_chapter_list": "analysis",
+    "detect_chapters": "analysis",
+    "find_silences": "analysis",
+    "BatchManifest": "batch",
+    "find_media_files": "batch",
+    "run_batch": "batch",
+    "Chapter": "chapters",
+    "chapters_to_json": "chapters",
+    "clean_title": "chapters",
+    "format_ms": "chapters",
+    "load_chapters_json": "chapters",
+    "make_chapter": "chapters",
+    "parse_time_to_ms": "chapters",
+    "save_chapters_json": "chapters",
+    "to_chapter_list": "chapters",
+    "get_ffmpeg_path": "ffmpeg",
+    "get_ffprobe_path": "ffmpeg",
+    "source_fingerprint": "fingerprint",
+    "verify_plan": "gapless",
+    "write_gapless_outputs": "gapless",
+    "incremental_split": "incremental",
+    "is_url": "inputs",
+    "media_name": "inputs",
+    "NORMALIZE_MODES": "loudness",
+    "chapter_gains": "loudness",
+    "measure_loudness": "loudness",
+    "inherit_metadata": "metadata",
+    "ChapterParseError": "parsers",
+    "load_chapters_file": "parsers",
+    "parse_chapter_list": "parsers",
+    "parse_chapter_text": "parsers",
+    "parse_chapters": "parsers",
+    "MediaProbe": "probe",
+    "probe": "probe",
+    "DEFAULT_PROFILE": "profiles",
+    "ENCODER_PROFILES": "profiles",
+    "find_retag_files": "retag",
+    "retag_files": "retag",
+    "SplitCancelled": "split",
+    "SplitFailed": "split",
+    "SplitPlan": "split",
+    "default_output_dir": "split",
+    "job_output_files": "split",
+    "is_video_file": "split",
+    "plan_split": "split",
+    "split": "split",
+    "WaveformOverview": "waveform",
+    "load_overview": "waveform",
+    "play_snippet": "waveform",
+}
+
+__all__ = sorted(EXPORTS) + ["__version__"]
+
+__version__ = "1.0.0"
+
+def __getattr__(name):
+    if name not in EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(EXPORTS))
+
+# split()とprobe()はサブモジュールと同じ名前のため、サブモジュールを読み込んだときに
+# パッケージの属性がモジュールで上書きされないようにする（従来どおり関数を返す）
+class Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and EXPORTS.get(name) == name:
+            return
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = Package
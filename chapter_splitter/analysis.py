@@ -0,0 +1,180 @@
+import re
+
+from . import runner
+from .chapters import Chapter, chapters_to_json
+from .ffmpeg import PROGRESS_ARGS, get_ffmpeg_path
+from .inputs import input_path
+from .probe import MediaProbe
+
+# NumPyがあればPCMを直接解析し、なければffmpegのsilencedetectで代用する
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 解析用のデコード設定：低いサンプルレートのモノラル16bit PCM
+ANALYSIS_SAMPLE_RATE = 8000
+FRAME_MS = 50
+# 一度に読み込むフレーム数（30秒分、メモリ使用量はこれで一定になる）
+BLOCK_FRAMES = 600
+
+DEFAULT_THRESHOLD_DB = -40.0
+DEFAULT_MIN_SILENCE = 2.0
+DEFAULT_MIN_CHAPTER = 30.0
+
+def decode_pcm_command(ffmpeg_path, media_path, sample_rate=ANALYSIS_SAMPLE_RATE):
+    return [
+        ffmpeg_path, "-hide_banner", "-loglevel", "error",
+        "-i", input_path(media_path),
+        "-map", "0:a:0",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-f", "s16le",
+        "pipe:1",
+    ]
+
+# デコードしたPCMの1ブロック（frame_samplesの倍数、最後のブロックだけ端数あり）のフレームごとのRMS（dBFS）
+# 1フレームに満たない末尾の端数は独立したフレームとして返し、サンプルがなければ空の配列を返す
+def frame_levels(data, frame_samples):
+    samples = np.frombuffer(data[:len(data) // 2 * 2], dtype="<i2").astype(np.float32)
+    frames, remainder = divmod(len(samples), frame_samples)
+    rms = []
+    if frames:
+        frames_data = samples[:frames * frame_samples].reshape(frames, frame_samples)
+        rms.append(np.sqrt(np.mean(frames_data * frames_data, axis=1)))
+    if remainder:
+        tail = samples[frames * frame_samples:]
+        rms.append(np.sqrt(np.mean(tail * tail, keepdims=True)))
+    if not rms:
+        return np.empty(0, dtype=np.float32)
+    return 20 * np.log10(np.maximum(np.concatenate(rms), 1.0) / 32768.0)
+
+# 閾値より小さいフレームがmin_silence秒以上続く区間を探す（NumPyで解析）
+# デコードしたPCMはrunnerからブロックごとに受け取り、出力が途絶えたffmpegはタイムアウトで止める
+# 戻り値は ([(開始秒, 終了秒), ...], 全体の長さ（秒）)
+def find_silences_numpy(ffmpeg_path, media_path, threshold_db, min_silence, should_stop=None):
+    frame_seconds = FRAME_MS / 1000.0
+    frame_samples = ANALYSIS_SAMPLE_RATE * FRAME_MS // 1000
+    min_frames = max(1, int(round(min_silence / frame_seconds)))
+
+    silences = []
+    offset = 0
+    in_silence = False
+    silence_start = 0
+
+    def on_block(data):
+        nonlocal offset, in_silence, silence_start
+        silent = frame_levels(data, frame_samples) < threshold_db
+        if not len(silent):
+            return
+        previous = np.concatenate(([in_silence], silent[:-1]))
+        # 無音の始まりと終わりのフレーム位置（ブロック内の変化点だけを見る）
+        changes = np.flatnonzero(silent != previous)
+        for index in changes:
+            if silent[index]:
+                silence_start = offset + index
+            elif offset + index - silence_start >= min_frames:
+                silences.append((silence_start * frame_seconds, (offset + index) * frame_seconds))
+        in_silence = bool(silent[-1])
+        offset += len(silent)
+
+    process = runner.run(
+        decode_pcm_command(ffmpeg_path, media_path), "ffmpeg decode", on_stdout=on_block,
+        chunk_size=frame_samples * BLOCK_FRAMES * 2, idle_timeout=runner.STALL_TIMEOUT, should_stop=should_stop,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or "音声のデコードに失敗しました")
+
+    if in_silence and offset - silence_start >= min_frames:
+        silences.append((silence_start * frame_seconds, offset * frame_seconds))
+    return silences, offset * frame_seconds
+
+SILENCE_START_PATTERN = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END_PATTERN = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+# NumPyがない場合：ffmpegのsilencedetectフィルタで無音区間を探す
+# -progressの出力で生存を確認し、出力が途絶えたffmpegはタイムアウトで止める
+def find_silences_ffmpeg(ffmpeg_path, media_path, threshold_db, min_silence, should_stop=None):
+    cmd = [ffmpeg_path, "-hide_banner"] + PROGRESS_ARGS + [
+        "-i", input_path(media_path),
+        "-map", "0:a:0",
+        "-ac", "1",
+        "-ar", str(ANALYSIS_SAMPLE_RATE),
+        "-af", f"silencedetect=noise={threshold_db}dB:d={min_silence}",
+        "-f", "null", "-",
+    ]
+    silences = []
+    silence_start = None
+    errors = []
+
+    def on_stderr(line):
+        nonlocal silence_start
+        match = SILENCE_START_PATTERN.search(line)
+        if match:
+            silence_start = max(0.0, float(match.group(1)))
+            return
+        match = SILENCE_END_PATTERN.search(line)
+        if match and silence_start is not None:
+            silences.append((silence_start, float(match.group(1))))
+            silence_start = None
+        elif "silencedetect" not in line:
+            errors.append(line.strip())
+
+    process = runner.run(
+        cmd, "ffmpeg silencedetect", on_stdout=lambda line: None, on_stderr=on_stderr,
+        idle_timeout=runner.STALL_TIMEOUT, should_stop=should_stop,
+    )
+    if process.returncode != 0:
+        raise RuntimeError("\n".join(filter(None, errors[-5:])) or "音声の解析に失敗しました")
+
+    duration = MediaProbe.load(media_path).duration
+    if silence_start is not None and duration and duration > silence_start:
+        silences.append((silence_start, duration))
+    return silences, duration
+
+# should_stopがTrueを返すとffmpegを止めてrunner.ProcessCancelledを送出する
+def find_silences(media_path, threshold_db=DEFAULT_THRESHOLD_DB, min_silence=DEFAULT_MIN_SILENCE, ffmpeg_path=None,
+                  should_stop=None):
+    ffmpeg_path = ffmpeg_path or get_ffmpeg_path()
+    if np is not None:
+        return find_silences_numpy(ffmpeg_path, media_path, threshold_db, min_silence, should_stop)
+    return find_silences_ffmpeg(ffmpeg_path, media_path, threshold_db, min_silence, should_stop)
+
+# 無音区間の中央をチャプターの境界にする
+# 先頭・末尾の無音と、min_chapter秒より短くなる境界は使わない
+def chapters_from_silences(silences, duration, min_chapter=DEFAULT_MIN_CHAPTER):
+    bounds = [0.0]
+    for start, end in silences:
+        if start <= 0 or (duration and end >= duration):
+            continue
+        boundary = (start + end) / 2
+        if boundary - bounds[-1] >= min_chapter and (not duration or duration - boundary >= min_chapter):
+            bounds.append(boundary)
+    if duration:
+        bounds.append(duration)
+
+    chapters = []
+    for i in range(len(bounds) - 1):
+        start_ms = int(round(bounds[i] * 1000))
+        end_ms = int(round(bounds[i + 1] * 1000))
+        chapters.append(Chapter(i, f"Chapter {i + 1}", start_ms, end_ms))
+    return chapters
+
+# 無音を手がかりにチャプターを自動生成し、Chapterのリストを返す
+def detect_chapter_list(media_path, threshold_db=DEFAULT_THRESHOLD_DB, min_silence=DEFAULT_MIN_SILENCE,
+                        min_chapter=DEFAULT_MIN_CHAPTER, ffmpeg_path=None, log=None, should_stop=None):
+    log = log or (lambda msg: None)
+    log(f"🔇 無音区間を解析中（{'NumPy' if np is not None else 'silencedetect'}、閾値 {threshold_db}dB / {min_silence}秒以上）...")
+    silences, duration = find_silences(media_path, threshold_db, min_silence, ffmpeg_path, should_stop)
+    log(f"🔇 {len(silences)}個の無音区間を検出しました")
+    if not duration:
+        raise ValueError("音声の長さを取得できませんでした")
+
+    chapters = chapters_from_silences(silences, duration, min_chapter)
+    log(f"✅ {len(chapters)}個のチャプターを作成しました")
+    return chapters
+
+# {"chapters": [...]}形式（チャプターJSON）で返す
+def detect_chapters(media_path, threshold_db=DEFAULT_THRESHOLD_DB, min_silence=DEFAULT_MIN_SILENCE,
+                    min_chapter=DEFAULT_MIN_CHAPTER, ffmpeg_path=None, log=None):
+    return chapters_to_json(detect_chapter_list(media_path, threshold_db, min_silence, min_chapter, ffmpeg_path, log))
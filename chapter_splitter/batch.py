@@ -0,0 +1,193 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .loudness import DEFAULT_MAX_TRUE_PEAK, DEFAULT_TARGET_LUFS
+from .parsers import load_chapters_file
+from .split import (
+    VIDEO_EXTENSIONS,
+    SplitCancelled,
+    SplitFailed,
+    default_output_dir,
+    plan_split,
+    split,
+)
+from .utils import write_json_atomic
+
+AUDIO_EXTENSIONS = ['.m4a', '.m4b', '.mp3', '.wav', '.aac', '.flac', '.ogg', '.opus']
+MEDIA_EXTENSIONS = AUDIO_EXTENSIONS + VIDEO_EXTENSIONS
+
+MANIFEST_FILENAME = "chapter_split_manifest.json"
+
+# ディレクトリまたはglobパターンからメディアファイルを集める（重複は除く）
+def find_media_files(inputs):
+    files = []
+    seen = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))]
+        else:
+            candidates = sorted(glob.glob(pattern, recursive=True))
+        for path in candidates:
+            path = os.path.abspath(path)
+            if path in seen or not os.path.isfile(path):
+                continue
+            if os.path.splitext(path)[1].lower() in MEDIA_EXTENSIONS:
+                seen.add(path)
+                files.append(path)
+    return files
+
+# 同じ名前のチャプターファイル（<名前>.chapters.json / <名前>.json / <名前>.cue / <名前>.chapters.txt）を探す
+SIDECAR_SUFFIXES = [".chapters.json", ".json", ".cue", ".chapters.txt"]
+
+def find_sidecar_chapters(media_path):
+    stem = os.path.splitext(media_path)[0]
+    for candidate in (stem + suffix for suffix in SIDECAR_SUFFIXES):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# 完了した出力ファイルの記録（出力パス→元ファイル・区間・サイズ・ハッシュ）
+# 中断したバッチを再開するとき、記録と一致する出力は分割し直さない
+class BatchManifest:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.outputs = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.outputs = json.load(f).get("outputs", {})
+            except (OSError, ValueError):
+                self.outputs = {}
+
+    @staticmethod
+    def describe(media_path, job, mode, profile=None):
+        stat = os.stat(media_path)
+        return {
+            "source": os.path.abspath(media_path),
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "mode": mode,
+            "profile": profile,
+            "track": job["track"],
+            "title": job["title"],
+            "start": job["start"],
+            "end": job["end"],
+            "gain": job.get("gain"),
+        }
+
+    # ジョブのすべての出力（プロファイルごと）が記録と一致するか
+    def is_valid(self, media_path, job, mode, verify=False):
+        for output in job["outputs"]:
+            output_file = os.path.abspath(output["output_file"])
+            with self.lock:
+                entry = self.outputs.get(output_file)
+            if entry is None or not os.path.isfile(output_file):
+                return False
+            expected = self.describe(media_path, job, mode, output["profile"])
+            if any(entry.get(key) != value for key, value in expected.items()):
+                return False
+            if os.path.getsize(output_file) != entry.get("size"):
+                return False
+            if verify and file_sha256(output_file) != entry.get("sha256"):
+                return False
+        return True
+
+    def record(self, media_path, job, mode):
+        for output in job["outputs"]:
+            output_file = os.path.abspath(output["output_file"])
+            entry = self.describe(media_path, job, mode, output["profile"])
+            entry["size"] = os.path.getsize(output_file)
+            entry["sha256"] = file_sha256(output_file)
+            with self.lock:
+                self.outputs[output_file] = entry
+
+    def save(self):
+        with self.lock:
+            data = {"version": 1, "outputs": dict(self.outputs)}
+        write_json_atomic(self.path, data)
+
+# ディレクトリやglobに含まれるファイルをまとめて分割する
+# workers個のファイルを同時に処理し、各ファイルはjobsの並列数で分割する
+# 戻り値は {"done": [...], "skipped": [...], "failed": [(パス, エラー), ...]}
+def run_batch(inputs, output_root=None, workers=1, jobs=None, mode="encode", manifest_path=None,
+              verify=False, log=None, should_stop=None, profiles=None, use_cache=True, normalize=None,
+              target_lufs=DEFAULT_TARGET_LUFS, max_true_peak=DEFAULT_MAX_TRUE_PEAK):
+    log = log or (lambda msg: None)
+    output_root = output_root or os.path.join(os.path.expanduser("~"), "Desktop")
+    os.makedirs(output_root, exist_ok=True)
+    manifest = BatchManifest(manifest_path or os.path.join(output_root, MANIFEST_FILENAME))
+    results = {"done": [], "skipped": [], "failed": []}
+    results_lock = threading.Lock()
+
+    files = find_media_files(inputs)
+    log(f"📦 {len(files)}個のファイルをキューに追加しました")
+
+    def process_file(media_path):
+        name = os.path.basename(media_path)
+
+        def file_log(msg):
+            log(f"[{name}] {msg}")
+
+        if should_stop and should_stop():
+            return
+
+        try:
+            sidecar = find_sidecar_chapters(media_path)
+            chapters = load_chapters_file(sidecar) if sidecar else None
+            plan = plan_split(
+                media_path, chapters, output_dir=default_output_dir(media_path, output_root),
+                mode=mode, log=file_log, profiles=profiles, normalize=normalize,
+                target_lufs=target_lufs, max_true_peak=max_true_peak,
+            )
+
+            # 記録済みで有効な出力は分割し直さない
+            pending = [job for job in plan.jobs if not manifest.is_valid(media_path, job, plan.mode, verify)]
+            if not pending:
+                file_log("⏭ すべての出力が完了済みのためスキップします")
+                with results_lock:
+                    results["skipped"].append(media_path)
+                return
+            if len(pending) < len(plan.jobs):
+                file_log(f"⏭ {len(plan.jobs) - len(pending)}チャプターは完了済みのためスキップします")
+            plan = plan.subset(pending)
+
+            try:
+                split(plan, jobs=jobs, log=file_log, should_stop=should_stop, use_cache=use_cache)
+            except (SplitFailed, SplitCancelled) as e:
+                # 確定済みの出力は記録しておき、再開時に使う
+                for job in plan.jobs:
+                    if job["output_file"] in e.completed_outputs:
+                        manifest.record(media_path, job, plan.mode)
+                manifest.save()
+                raise
+
+            for job in plan.jobs:
+                manifest.record(media_path, job, plan.mode)
+            manifest.save()
+            file_log("✅ 分割完了")
+            with results_lock:
+                results["done"].append(media_path)
+        except SplitCancelled:
+            file_log("❌ 処理が中断されました")
+        except Exception as e:
+            file_log(f"❌ エラー: {e}")
+            with results_lock:
+                results["failed"].append((media_path, str(e)))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(process_file, files))
+
+    log(f"📊 完了 {len(results['done'])} / スキップ {len(results['skipped'])} / 失敗 {len(results['failed'])}")
+    return results
@@ -0,0 +1,278 @@
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import runner
+from .chapters import make_chapter
+from .ffmpeg import PROGRESS_ARGS, get_ffmpeg_path, get_ffprobe_version
+from .probe import MediaProbe
+from .split import plan_split, split
+from .utils import get_cache_dir
+
+# ベンチマークの条件（長さ・チャプター数・コンテナ・分割方法）
+BENCH_DURATIONS = {"1m": 60, "10m": 600, "1h": 3600, "10h": 36000}
+BENCH_CHAPTER_COUNTS = [5, 50, 500]
+BENCH_CONTAINERS = ["m4a", "mp3", "wav", "aiff", "mp4"]
+BENCH_STRATEGIES = {
+    "encode-serial": {"mode": "encode", "jobs": 1},
+    "encode-parallel": {"mode": "encode", "jobs": None},
+    "copy": {"mode": "copy", "jobs": 1},
+}
+# 既定では短い条件だけを実行する（--fullで全条件）
+QUICK_DURATIONS = ["1m", "10m"]
+QUICK_CHAPTER_COUNTS = [5, 50]
+
+# コピー分割できる音声のコンテナ（m4aにそのまま格納できるもの、WAV/AIFFはPCMのまま切り出す）
+COPY_CONTAINERS = {"m4a", "mp4", "wav", "aiff"}
+
+# コンテナごとのエンコード設定
+CONTAINER_CODECS = {
+    "m4a": ["-c:a", "aac", "-b:a", "128k"],
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "128k"],
+    "wav": ["-c:a", "pcm_s16le"],
+    "aiff": ["-c:a", "pcm_s16be"],
+    "mp4": ["-c:a", "aac", "-b:a", "128k"],
+}
+
+# 合成用のffmpegも分割と同じrunnerで実行する（-progressの出力が途絶えたらタイムアウト）
+def run_ffmpeg(cmd, name):
+    process = runner.run(cmd[:1] + PROGRESS_ARGS + cmd[1:], name, on_stdout=lambda line: None,
+                         idle_timeout=runner.STALL_TIMEOUT)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or "ffmpegの実行に失敗しました")
+
+# カバー画像（単色のJPEG）を生成する
+def generate_cover(ffmpeg_path, work_dir):
+    cover_path = os.path.join(work_dir, "cover.jpg")
+    if not os.path.exists(cover_path):
+        run_ffmpeg([
+            ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=c=steelblue:s=600x600",
+            "-frames:v", "1",
+            cover_path,
+        ], "ffmpeg bench cover")
+    return cover_path
+
+# lavfiのsine/anoisesrcから合成音声を生成する（同じ条件のファイルは再利用する）
+# mp4は映像とカバー画像、m4aはカバー画像付き
+def generate_media(ffmpeg_path, duration, container, work_dir):
+    media_path = os.path.join(work_dir, f"synthetic_{duration}s.{container}")
+    if os.path.exists(media_path):
+        return media_path
+
+    cmd = [
+        ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.05:sample_rate=44100:duration={duration}",
+    ]
+    maps = ["-filter_complex", "[0:a][1:a]amix=inputs=2:duration=shortest,aformat=channel_layouts=stereo[a]",
+            "-map", "[a]"]
+    video_args = []
+    if container == "mp4":
+        cmd.extend(["-f", "lavfi", "-i", f"color=c=black:s=320x180:r=1:duration={duration}"])
+        cmd.extend(["-i", generate_cover(ffmpeg_path, work_dir)])
+        maps.extend(["-map", "2:v", "-map", "3:v"])
+        video_args = [
+            "-c:v:0", "libx264", "-preset", "ultrafast", "-tune", "stillimage",
+            "-c:v:1", "copy", "-disposition:v:1", "attached_pic",
+        ]
+    elif container == "m4a":
+        cmd.extend(["-i", generate_cover(ffmpeg_path, work_dir)])
+        maps.extend(["-map", "2:v"])
+        video_args = ["-c:v", "copy", "-disposition:v", "attached_pic"]
+
+    # 途中で中断されても壊れたファイルを再利用しないよう、一時ファイルに書き出してから置き換える
+    temp_path = os.path.join(work_dir, f".synthetic_{duration}s.tmp.{container}")
+    run_ffmpeg(cmd + maps + CONTAINER_CODECS[container] + video_args + [temp_path], "ffmpeg bench media")
+    os.replace(temp_path, media_path)
+    return media_path
+
+# 長さが少しずつ異なるチャプターを決まった乱数で作る（毎回同じ境界になる）
+def make_bench_chapters(duration, count):
+    rng = random.Random(count * 1000003 + duration)
+    total_ms = duration * 1000
+    base = total_ms / count
+    bounds = [0]
+    for i in range(1, count):
+        bounds.append(int(i * base + rng.uniform(-0.25, 0.25) * base))
+    bounds.append(total_ms)
+    return [make_chapter(i, f"Chapter {i + 1}", bounds[i], bounds[i + 1]) for i in range(count)]
+
+def maxrss_bytes(usage):
+    # ru_maxrssはLinuxではKB、macOSではバイト
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+def output_duration(path):
+    return MediaProbe.load(path, use_cache=False).duration
+
+# 各出力の長さとチャプターの長さの差（ms）
+def measure_boundary_error(chapters, output_files):
+    def error_ms(pair):
+        chapter, path = pair
+        duration = output_duration(path)
+        if duration is None:
+            return None
+        expected = (chapter["end"] - chapter["start"]) / 1000.0
+        return abs(duration - expected) * 1000
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        errors = [e for e in executor.map(error_ms, zip(chapters, output_files)) if e is not None]
+    if not errors:
+        return None
+    return {"max": max(errors), "mean": sum(errors) / len(errors)}
+
+# 1条件を計測する（別プロセスで実行され、rusageはこの条件のffmpegだけを含む）
+def run_case(spec):
+    output_dir = spec["output_dir"]
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    started = time.perf_counter()
+    plan = plan_split(spec["media"], spec["chapters"], output_dir=output_dir, mode=spec["mode"])
+    split(plan, jobs=spec["jobs"])
+    wall = time.perf_counter() - started
+
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def cpu(before, after, field):
+        return getattr(after, field) - getattr(before, field)
+
+    return {
+        "mode": plan.mode,
+        "wall_s": wall,
+        "cpu_user_s": cpu(self_before, self_after, "ru_utime") + cpu(children_before, children_after, "ru_utime"),
+        "cpu_system_s": cpu(self_before, self_after, "ru_stime") + cpu(children_before, children_after, "ru_stime"),
+        "peak_rss_bytes": maxrss_bytes(self_after),
+        "ffmpeg_peak_rss_bytes": maxrss_bytes(children_after),
+        # ブロックI/O（512バイト単位、ページキャッシュから読んだ分は含まない）
+        "block_read_bytes": cpu(children_before, children_after, "ru_inblock") * 512,
+        "block_write_bytes": cpu(children_before, children_after, "ru_oublock") * 512,
+        "bytes_written": sum(os.path.getsize(path) for path in plan.output_files if os.path.exists(path)),
+        "boundary_error_ms": measure_boundary_error(spec["chapters"], plan.output_files),
+    }
+
+# 子プロセス側：標準入力の条件を実行し、結果を標準出力にJSONで返す
+def case_main():
+    spec = json.load(sys.stdin)
+    json.dump(run_case(spec), sys.stdout)
+    return 0
+
+def run_case_in_subprocess(spec, cache_dir):
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+    # ffprobeのキャッシュは条件ごとに空にして、毎回同じ条件で計測する
+    env["CHAPTER_SPLIT_CACHE_DIR"] = cache_dir
+    process = subprocess.run(
+        [sys.executable, "-m", "chapter_splitter.bench"],
+        input=json.dumps(spec), capture_output=True, encoding='utf-8', errors='replace', env=env,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "計測に失敗しました")
+    return json.loads(process.stdout)
+
+def case_id(container, duration_name, chapter_count, strategy):
+    return f"{container}-{duration_name}-{chapter_count}ch-{strategy}"
+
+# 条件の組み合わせをすべて実行し、結果をまとめて返す
+# repeat回実行したうち、最も速かった回の計測値を記録する
+def run_benchmarks(durations=None, chapter_counts=None, containers=None, strategies=None, repeat=1,
+                   work_dir=None, log=None):
+    log = log or (lambda msg: None)
+    ffmpeg_path = get_ffmpeg_path()
+    durations = durations or QUICK_DURATIONS
+    chapter_counts = chapter_counts or QUICK_CHAPTER_COUNTS
+    containers = containers or BENCH_CONTAINERS
+    strategies = strategies or list(BENCH_STRATEGIES)
+    work_dir = work_dir or get_cache_dir("bench")
+    os.makedirs(work_dir, exist_ok=True)
+
+    cases = []
+    for container in containers:
+        for duration_name in durations:
+            duration = BENCH_DURATIONS[duration_name]
+            log(f"🎛 合成音声を準備中: {container} / {duration_name}")
+            media_path = generate_media(ffmpeg_path, duration, container, work_dir)
+
+            for chapter_count in chapter_counts:
+                chapters = make_bench_chapters(duration, chapter_count)
+                for strategy in strategies:
+                    settings = BENCH_STRATEGIES[strategy]
+                    result = {
+                        "id": case_id(container, duration_name, chapter_count, strategy),
+                        "container": container,
+                        "duration_s": duration,
+                        "chapters": chapter_count,
+                        "strategy": strategy,
+                        "jobs": settings["jobs"] or os.cpu_count() or 1,
+                        "input_bytes": os.path.getsize(media_path),
+                    }
+                    if settings["mode"] == "copy" and container not in COPY_CONTAINERS:
+                        result["status"] = "skipped"
+                        cases.append(result)
+                        continue
+
+                    log(f"⏱ {result['id']}")
+                    runs = []
+                    try:
+                        for _ in range(max(1, repeat)):
+                            run_dir = tempfile.mkdtemp(prefix="bench_", dir=work_dir)
+                            try:
+                                runs.append(run_case_in_subprocess({
+                                    "media": media_path,
+                                    "chapters": chapters,
+                                    "mode": settings["mode"],
+                                    "jobs": result["jobs"],
+                                    "output_dir": os.path.join(run_dir, "out"),
+                                }, os.path.join(run_dir, "cache")))
+                            finally:
+                                shutil.rmtree(run_dir, ignore_errors=True)
+                    except RuntimeError as e:
+                        result["status"] = "failed"
+                        result["error"] = str(e)
+                        log(f"  ❌ {e}")
+                        cases.append(result)
+                        continue
+
+                    best = min(runs, key=lambda run: run["wall_s"])
+                    result.update(best)
+                    result["status"] = "ok"
+                    result["wall_s_runs"] = [run["wall_s"] for run in runs]
+                    log(f"  {best['wall_s']:.2f}s / CPU {best['cpu_user_s'] + best['cpu_system_s']:.2f}s")
+                    cases.append(result)
+
+    return {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "ffmpeg": get_ffprobe_version(ffmpeg_path),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "cases": cases,
+    }
+
+# 前回の結果と比べ、同じ条件の実行時間の比（今回/前回）を返す
+# 戻り値は (条件, 前回の秒数, 今回の秒数, 比) のリスト
+def compare_results(previous, current):
+    previous_cases = {case["id"]: case for case in previous.get("cases", []) if case.get("status") == "ok"}
+    rows = []
+    for case in current.get("cases", []):
+        old = previous_cases.get(case["id"])
+        if case.get("status") != "ok" or old is None or not old["wall_s"]:
+            continue
+        rows.append((case["id"], old["wall_s"], case["wall_s"], case["wall_s"] / old["wall_s"]))
+    return rows
+
+if __name__ == "__main__":
+    sys.exit(case_main())
@@ -0,0 +1,82 @@
+import json
+import re
+
+def clean_title(title):
+    return re.sub(r"^\d+\.\s*", "", title)
+
+def parse_time_to_ms(time_str):
+    if not re.match(r'^\d{1,2}:\d{2}(:\d{2})?$', time_str):
+        raise ValueError(f"不正な時間形式: {time_str}")
+    parts = list(map(int, time_str.split(":")))
+    if len(parts) == 3:
+        return (parts[0] * 3600 + parts[1] * 60 + parts[2]) * 1000
+    elif len(parts) == 2:
+        return (parts[0] * 60 + parts[1]) * 1000
+    return 0
+
+def format_ms(ms):
+    return f"{ms / 1000.0:.6f}"
+
+# チャプター：開始・終了はミリ秒の整数で持つ
+# パーサーやffprobeの結果からそのまま分割処理に渡し、JSONへの書き出しは必要なときだけ行う
+class Chapter:
+    __slots__ = ("index", "title", "start_ms", "end_ms")
+
+    def __init__(self, index, title, start_ms, end_ms):
+        self.index = index
+        self.title = title
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+    def __repr__(self):
+        return f"Chapter({self.index}, {self.title!r}, {self.start_ms}, {self.end_ms})"
+
+    @property
+    def duration_ms(self):
+        return self.end_ms - self.start_ms
+
+    # ffprobeの-show_chaptersと同じ形式の辞書
+    def to_dict(self):
+        return {
+            "id": self.index,
+            "time_base": "1/1000",
+            "start": self.start_ms,
+            "start_time": format_ms(self.start_ms),
+            "end": self.end_ms,
+            "end_time": format_ms(self.end_ms),
+            "tags": {"title": self.title}
+        }
+
+    # ffprobeの結果やチャプターJSONの辞書から作る（time_baseがあれば整数のまま換算する）
+    @classmethod
+    def from_dict(cls, data):
+        title = data.get("tags", {}).get("title", "chapter")
+        time_base = data.get("time_base")
+        if time_base and "start" in data and "end" in data:
+            num, den = (int(part) for part in time_base.split("/"))
+            start_ms = int(data["start"]) * num * 1000 // den
+            end_ms = int(data["end"]) * num * 1000 // den
+        else:
+            start_ms = round(float(data["start_time"]) * 1000)
+            end_ms = round(float(data["end_time"]) * 1000)
+        return cls(data.get("id", 0), title, start_ms, end_ms)
+
+def make_chapter(chapter_id, title, start_ms, end_ms):
+    return Chapter(chapter_id, clean_title(title), start_ms, end_ms).to_dict()
+
+# Chapterと辞書が混在していてもChapterのリストにそろえる
+def to_chapter_list(chapters):
+    return [chapter if isinstance(chapter, Chapter) else Chapter.from_dict(chapter) for chapter in chapters]
+
+# {"chapters": [...]}形式（チャプターJSON）に変換する
+def chapters_to_json(chapters):
+    return {"chapters": [chapter.to_dict() if isinstance(chapter, Chapter) else chapter for chapter in chapters]}
+
+def load_chapters_json(json_path):
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("chapters", [])
+
+def save_chapters_json(json_path, chapters):
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(chapters_to_json(chapters), f, indent=2, ensure_ascii=False)
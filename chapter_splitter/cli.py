@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+from .analysis import (
+    DEFAULT_MIN_CHAPTER,
+    DEFAULT_MIN_SILENCE,
+    DEFAULT_THRESHOLD_DB,
+    detect_chapter_list,
+    detect_chapters,
+)
+from . import instrument, output_cache
+from .batch import run_batch
+from .bench import (
+    BENCH_CHAPTER_COUNTS,
+    BENCH_CONTAINERS,
+    BENCH_DURATIONS,
+    BENCH_STRATEGIES,
+    compare_results,
+    run_benchmarks,
+)
+from .gapless import verify_plan
+from .incremental import incremental_split
+from .inputs import spool_stdin
+from .loudness import DEFAULT_MAX_TRUE_PEAK, DEFAULT_TARGET_LUFS, NORMALIZE_MODES
+from .parsers import PARSE_FORMATS, load_chapters_file, parse_chapters
+from .probe import MediaProbe
+from .profiles import ENCODER_PROFILES
+from .retag import find_retag_files, retag_files
+from .split import SplitCancelled, SplitFailed, plan_split, split
+from .waveform import PREVIEW_AFTER, PREVIEW_BEFORE, load_overview, play_snippet
+
+def log(msg):
+    print(msg, file=sys.stderr, flush=True)
+
+def command_split(args):
+    # 標準入力（「-」）は一時ファイルに書き出してから分割する
+    if args.input == "-":
+        args.input = spool_stdin(sys.stdin.buffer)
+        try:
+            return run_split_command(args)
+        finally:
+            shutil.rmtree(os.path.dirname(args.input), ignore_errors=True)
+    return run_split_command(args)
+
+def run_split_command(args):
+    chapters = load_chapters_file(args.chapters) if args.chapters else None
+    # 入力ファイルにもチャプター情報がなければ無音区間から作る
+    if (chapters is None and args.detect_silence
+            and not MediaProbe.load(args.input, use_cache=not args.no_cache).chapters):
+        chapters = detect_chapter_list(args.input, log=log)
+    probe = None
+    if args.no_cache:
+        probe = MediaProbe.load(args.input, use_cache=False)
+    plan = plan_split(
+        args.input, chapters, output_dir=args.output_dir, mode=args.mode, probe=probe, log=log,
+        profiles=args.profiles, normalize=args.normalize, target_lufs=args.target_lufs,
+        max_true_peak=args.max_true_peak,
+    )
+
+    def on_chapter_done(index, job):
+        log(f"✅ {job['track']}: {job['title']}")
+
+    if args.incremental:
+        incremental_split(plan, jobs=args.jobs, log=log, on_chapter_done=on_chapter_done,
+                          use_cache=not args.no_output_cache)
+    else:
+        split(plan, jobs=args.jobs, log=log, on_chapter_done=on_chapter_done, use_cache=not args.no_output_cache)
+    log("✅ 分割完了")
+    return 0
+
+def command_batch(args):
+    jobs = args.jobs or max(1, (os.cpu_count() or 1) // max(1, args.workers))
+    results = run_batch(
+        args.inputs, output_root=args.output_root, workers=args.workers, jobs=jobs, mode=args.mode,
+        manifest_path=args.manifest, verify=args.verify, log=log, profiles=args.profiles,
+        use_cache=not args.no_output_cache, normalize=args.normalize, target_lufs=args.target_lufs,
+        max_true_peak=args.max_true_peak,
+    )
+    return 1 if results["failed"] else 0
+
+def command_probe(args):
+    probe = MediaProbe.load(args.input, use_cache=not args.no_cache)
+    json.dump({"chapters": probe.chapters}, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+    return 0
+
+def command_detect(args):
+    output = detect_chapters(
+        args.input, threshold_db=args.threshold, min_silence=args.min_silence,
+        min_chapter=args.min_chapter, log=log,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        log(f"✅ JSON書き出し成功: {args.output}")
+    else:
+        json.dump(output, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    return 0
+
+def command_parse(args):
+    # ファイルは1行ずつ読み込んで解析する（標準入力は「-」）
+    if args.text == "-":
+        output = parse_chapters(sys.stdin, args.format)
+    else:
+        with open(args.text, "r", encoding="utf-8-sig") as f:
+            output = parse_chapters(f, args.format)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        log(f"✅ JSON書き出し成功: {args.output}")
+    else:
+        json.dump(output, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    return 0
+
+def command_bench(args):
+    if args.full:
+        args.durations = args.durations or list(BENCH_DURATIONS)
+        args.chapter_counts = args.chapter_counts or BENCH_CHAPTER_COUNTS
+    results = run_benchmarks(
+        durations=args.durations, chapter_counts=args.chapter_counts, containers=args.containers,
+        strategies=args.strategies, repeat=args.repeat, work_dir=args.work_dir, log=log,
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    log(f"✅ 結果を保存しました: {args.output}")
+
+    if not args.compare:
+        return 0
+    with open(args.compare, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    regressions = 0
+    for case, old, new, ratio in compare_results(previous, results):
+        mark = ""
+        if ratio > 1 + args.threshold:
+            mark = " ⚠️"
+            regressions += 1
+        log(f"  {case}: {old:.2f}s → {new:.2f}s ({ratio:.2f}x){mark}")
+    return 1 if regressions else 0
+
+def command_retag(args):
+    tags = {}
+    for item in args.set or []:
+        key, separator, value = item.partition("=")
+        if not separator:
+            raise ValueError(f"--setは「キー=値」の形式で指定してください: {item}")
+        tags[key.strip()] = value
+    for key in args.remove or []:
+        tags[key] = None
+    if not tags and not args.clear:
+        raise ValueError("--set / --remove / --clear のいずれかを指定してください")
+
+    files = find_retag_files(args.inputs)
+    log(f"📦 {len(files)}個のファイルを書き換えます")
+    results = retag_files(files, lambda path: tags, workers=args.workers, clear=args.clear, log=log)
+    return 1 if results["failed"] else 0
+
+def command_verify(args):
+    # 分割と同じ引数で計画を立て、その出力を元の音声と比べる
+    chapters = load_chapters_file(args.chapters) if args.chapters else None
+    plan = plan_split(args.input, chapters, output_dir=args.output_dir, mode=args.mode, profiles=args.profiles)
+    results = verify_plan(plan, log=log)
+    failed = [result for result in results if not result["ok"]]
+    if failed:
+        log(f"❌ {len(failed)}個の出力形式でギャップレスになっていません")
+        return 1
+    log("✅ すべての出力がサンプル単位で元の音声とつながっています")
+    return 0
+
+def command_waveform(args):
+    started = time.perf_counter()
+    overview = load_overview(args.input, use_cache=not args.no_cache, log=log)
+    log(f"🌊 {overview.duration:.1f}秒 / {len(overview.levels)}段（{time.perf_counter() - started:.2f}秒で読み込み）")
+    overview.close()
+    for seconds in args.play or []:
+        log(f"🔈 {seconds:.3f}秒の前後を再生します")
+        play_snippet(args.input, seconds, before=args.before, after=args.after).result()
+    return 0
+
+def command_cache(args):
+    if args.action == "prune":
+        limit = int(args.max_size * 1024 * 1024) if args.max_size is not None else None
+        max_age = args.max_age * 86400 if args.max_age is not None else None
+        removed, removed_bytes = output_cache.prune(limit, max_age)
+        log(f"🧹 {removed}個（{removed_bytes / (1024 * 1024):.1f}MB）を削除しました")
+
+    stats = output_cache.cache_stats()
+    print(f"場所: {stats['path']}")
+    print(f"出力数: {stats['entries']}")
+    print(f"合計: {stats['bytes'] / (1024 * 1024):.1f}MB / 上限 {stats['limit'] / (1024 * 1024):.0f}MB")
+    if stats["oldest"] is not None:
+        print(f"最終利用: {time.strftime('%Y-%m-%d %H:%M', time.localtime(stats['oldest']))} 〜 "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(stats['newest']))}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="chapter-split", description="動画・音声ファイルをチャプターごとに分割")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    split_parser = subparsers.add_parser("split", help="ファイルをチャプターごとに分割")
+    split_parser.add_argument("input", help="入力ファイル（音声または動画、http(s)のURL、「-」で標準入力）")
+    split_parser.add_argument("-c", "--chapters",
+                              help="チャプターJSON・テキスト・CUEシート・ffmetadata（省略時は入力ファイルのチャプター）")
+    split_parser.add_argument("-o", "--output-dir", help="出力先（既定: ~/Desktop/<ファイル名>）")
+    split_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="並列数（既定: CPU数）")
+    split_parser.add_argument("--mode", choices=["encode", "copy"], default="encode",
+                              help="encode: 正確（再エンコード） / copy: 高速（無劣化コピー、WAV/AIFFはサンプル単位で切り出し）")
+    split_parser.add_argument("-p", "--profile", dest="profiles", action="append", choices=list(ENCODER_PROFILES),
+                              help="エンコードプロファイル（複数指定可、既定: aac256）")
+    split_parser.add_argument("--no-cache", action="store_true", help="ffprobeのキャッシュを使わない")
+    split_parser.add_argument("--no-output-cache", action="store_true",
+                              help="分割済み出力のキャッシュを使わない（すべて再エンコードする）")
+    split_parser.add_argument("--incremental", action="store_true",
+                              help="変更のあったチャプターだけを再分割する（タグだけの変更は書き換えのみ）")
+    split_parser.add_argument("--normalize", choices=NORMALIZE_MODES,
+                              help="ラウドネスを正規化する（track: チャプターごと / album: 全体で同じゲイン）")
+    split_parser.add_argument("--target-lufs", type=float, default=DEFAULT_TARGET_LUFS,
+                              help=f"正規化の目標ラウドネス（既定: {DEFAULT_TARGET_LUFS} LUFS）")
+    split_parser.add_argument("--max-true-peak", type=float, default=DEFAULT_MAX_TRUE_PEAK,
+                              help=f"正規化後のトゥルーピークの上限（既定: {DEFAULT_MAX_TRUE_PEAK} dBTP）")
+    split_parser.add_argument("--detect-silence", action="store_true",
+                              help="チャプター情報がない場合は無音区間から自動生成する")
+    split_parser.add_argument("--trace", help="処理時間を計測し、Chrome trace形式のJSONを保存する")
+    split_parser.set_defaults(func=command_split)
+
+    batch_parser = subparsers.add_parser("batch", help="ディレクトリ/globのファイルをまとめて分割")
+    batch_parser.add_argument("inputs", nargs="+", help="ディレクトリまたはglobパターン")
+    batch_parser.add_argument("-o", "--output-root", help="出力先の親ディレクトリ（既定: ~/Desktop）")
+    batch_parser.add_argument("-w", "--workers", type=int, default=min(4, os.cpu_count() or 1),
+                              help="同時に処理するファイル数")
+    batch_parser.add_argument("-j", "--jobs", type=int, help="ファイルごとの並列数（既定: CPU数 / workers）")
+    batch_parser.add_argument("--mode", choices=["encode", "copy"], default="encode")
+    batch_parser.add_argument("-p", "--profile", dest="profiles", action="append", choices=list(ENCODER_PROFILES),
+                              help="エンコードプロファイル（複数指定可、既定: aac256）")
+    batch_parser.add_argument("--normalize", choices=NORMALIZE_MODES,
+                              help="ラウドネスを正規化する（track: チャプターごと / album: ファイル全体で同じゲイン）")
+    batch_parser.add_argument("--target-lufs", type=float, default=DEFAULT_TARGET_LUFS,
+                              help=f"正規化の目標ラウドネス（既定: {DEFAULT_TARGET_LUFS} LUFS）")
+    batch_parser.add_argument("--max-true-peak", type=float, default=DEFAULT_MAX_TRUE_PEAK,
+                              help=f"正規化後のトゥルーピークの上限（既定: {DEFAULT_MAX_TRUE_PEAK} dBTP）")
+    batch_parser.add_argument("--manifest", help="完了記録の保存先（既定: <output-root>/chapter_split_manifest.json）")
+    batch_parser.add_argument("--verify", action="store_true", help="再開時に出力のハッシュも検証する")
+    batch_parser.add_argument("--no-output-cache", action="store_true", help="分割済み出力のキャッシュを使わない")
+    batch_parser.add_argument("--trace", help="処理時間を計測し、Chrome trace形式のJSONを保存する")
+    batch_parser.set_defaults(func=command_batch)
+
+    probe_parser = subparsers.add_parser("probe", help="ファイルのチャプター情報をJSONで出力")
+    probe_parser.add_argument("input")
+    probe_parser.add_argument("--no-cache", action="store_true", help="ffprobeのキャッシュを使わない")
+    probe_parser.set_defaults(func=command_probe)
+
+    detect_parser = subparsers.add_parser("detect", help="無音区間からチャプターを自動生成してJSONで出力")
+    detect_parser.add_argument("input")
+    detect_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_DB,
+                               help=f"無音とみなす音量（dBFS、既定: {DEFAULT_THRESHOLD_DB}）")
+    detect_parser.add_argument("--min-silence", type=float, default=DEFAULT_MIN_SILENCE,
+                               help=f"チャプターの区切りとみなす無音の長さ（秒、既定: {DEFAULT_MIN_SILENCE}）")
+    detect_parser.add_argument("--min-chapter", type=float, default=DEFAULT_MIN_CHAPTER,
+                               help=f"チャプターの最短の長さ（秒、既定: {DEFAULT_MIN_CHAPTER}）")
+    detect_parser.add_argument("-o", "--output", help="JSONの保存先（省略時は標準出力）")
+    detect_parser.set_defaults(func=command_detect)
+
+    parse_parser = subparsers.add_parser("parse", help="チャプターテキストをJSONに変換")
+    parse_parser.add_argument("text", help="チャプターテキスト（タイトル H:MM:SS / YouTube形式 / CUE / ffmetadata、「-」で標準入力）")
+    parse_parser.add_argument("--format", choices=PARSE_FORMATS, default="auto", help="テキストの形式（既定: 自動判定）")
+    parse_parser.add_argument("-o", "--output", help="JSONの保存先（省略時は標準出力）")
+    parse_parser.set_defaults(func=command_parse)
+
+    retag_parser = subparsers.add_parser("retag", help="分割済みのm4aのタグだけをその場で書き換える")
+    retag_parser.add_argument("inputs", nargs="+", help="ファイル・ディレクトリ（再帰）またはglobパターン")
+    retag_parser.add_argument("--set", action="append", metavar="KEY=VALUE",
+                              help="書き込むタグ（album=... / artist=... など、複数指定可）")
+    retag_parser.add_argument("--remove", action="append", metavar="KEY", help="削除するタグ（複数指定可）")
+    retag_parser.add_argument("--clear", action="store_true", help="指定したタグ以外のテキストのタグを削除する")
+    retag_parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="同時に処理するファイル数")
+    retag_parser.add_argument("--trace", help="処理時間を計測し、Chrome trace形式のJSONを保存する")
+    retag_parser.set_defaults(func=command_retag)
+
+    verify_parser = subparsers.add_parser("verify", help="分割した出力がサンプル単位で元の音声とつながるかを検証")
+    verify_parser.add_argument("input", help="分割した元のファイル")
+    verify_parser.add_argument("-c", "--chapters", help="分割に使ったチャプターファイル（省略時は入力ファイルのチャプター）")
+    verify_parser.add_argument("-o", "--output-dir", help="分割の出力先（既定: ~/Desktop/<ファイル名>）")
+    verify_parser.add_argument("--mode", choices=["encode", "copy"], default="encode")
+    verify_parser.add_argument("-p", "--profile", dest="profiles", action="append", choices=list(ENCODER_PROFILES),
+                               help="分割に使ったエンコードプロファイル（複数指定可、既定: aac256）")
+    verify_parser.set_defaults(func=command_verify)
+
+    waveform_parser = subparsers.add_parser("waveform", help="波形の概要を作成・キャッシュし、境界の前後を試聴する")
+    waveform_parser.add_argument("input")
+    waveform_parser.add_argument("--play", type=float, action="append", metavar="SECONDS",
+                                 help="この位置（秒）の前後をffplayで再生する（複数指定可）")
+    waveform_parser.add_argument("--before", type=float, default=PREVIEW_BEFORE, help="再生する位置より前の秒数")
+    waveform_parser.add_argument("--after", type=float, default=PREVIEW_AFTER, help="再生する位置より後の秒数")
+    waveform_parser.add_argument("--no-cache", action="store_true", help="キャッシュを使わずに作り直す")
+    waveform_parser.set_defaults(func=command_waveform)
+
+    cache_parser = subparsers.add_parser("cache", help="分割済み出力のキャッシュの確認・削除")
+    cache_parser.add_argument("action", choices=["stats", "prune"])
+    cache_parser.add_argument("--max-size", type=float,
+                              help="pruneで残す合計サイズ（MB、既定: CHAPTER_SPLIT_OUTPUT_CACHE_MBまたは10240、0ですべて削除）")
+    cache_parser.add_argument("--max-age", type=float, help="pruneでこの日数より長く使われていない出力も削除する")
+    cache_parser.set_defaults(func=command_cache)
+
+    bench_parser = subparsers.add_parser("bench", help="合成音声で分割方法ごとの性能を計測")
+    bench_parser.add_argument("-o", "--output", default="bench_results.json", help="結果JSONの保存先")
+    bench_parser.add_argument("--durations", nargs="+", choices=list(BENCH_DURATIONS),
+                              help="音声の長さ（既定: 1m 10m）")
+    bench_parser.add_argument("--chapters", dest="chapter_counts", nargs="+", type=int,
+                              help="チャプター数（既定: 5 50）")
+    bench_parser.add_argument("--containers", nargs="+", choices=BENCH_CONTAINERS)
+    bench_parser.add_argument("--strategies", nargs="+", choices=list(BENCH_STRATEGIES))
+    bench_parser.add_argument("--full", action="store_true", help="すべての長さ（〜10h）とチャプター数（〜500）で計測")
+    bench_parser.add_argument("--repeat", type=int, default=1, help="各条件の実行回数（最速の回を記録）")
+    bench_parser.add_argument("--work-dir", help="合成音声の保存先（既定: キャッシュディレクトリ）")
+    bench_parser.add_argument("--compare", help="比較する前回の結果JSON")
+    bench_parser.add_argument("--threshold", type=float, default=0.1,
+                              help="この割合を超えて遅くなった条件を退行とみなす（既定: 0.1）")
+    bench_parser.set_defaults(func=command_bench)
+
+    return parser
+
+# --traceの指定があれば処理時間を計測し、終了時に集計表とChrome trace形式のJSONを出力する
+def run_command(args):
+    if not getattr(args, "trace", None):
+        return args.func(args)
+    instrument.start_recording()
+    try:
+        return args.func(args)
+    finally:
+        recorder = instrument.stop_recording()
+        log(recorder.format_summary())
+        recorder.save(args.trace)
+        log(f"📈 計測結果を保存しました: {args.trace}")
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return run_command(args)
+    except SplitCancelled:
+        log("❌ 処理が中断されました")
+        return 130
+    except SplitFailed as e:
+        log(f"❌ {e}")
+        return 1
+    except (OSError, RuntimeError, ValueError) as e:
+        log(f"❌ エラー: {e}")
+        return 1
+    except KeyboardInterrupt:
+        log("❌ 処理が中断されました")
+        return 130
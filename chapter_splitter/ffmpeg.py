@@ -0,0 +1,56 @@
+import functools
+import os
+import re
+
+from . import runner
+
+# パスの探索はプロセス内で一度だけ行う
+@functools.lru_cache(maxsize=None)
+def get_ffmpeg_path():
+    for path in ["/usr/local/bin/ffmpeg", "/opt/homebrew/bin/ffmpeg", "ffmpeg"]:
+        if os.path.exists(path) and os.access(path, os.X_OK):
+            return path
+    return "ffmpeg"
+
+@functools.lru_cache(maxsize=None)
+def get_ffprobe_path():
+    for path in ["/usr/local/bin/ffprobe", "/opt/homebrew/bin/ffprobe", "ffprobe"]:
+        if os.path.exists(path) and os.access(path, os.X_OK):
+            return path
+    return "ffprobe"
+
+@functools.lru_cache(maxsize=None)
+def get_ffplay_path():
+    for path in ["/usr/local/bin/ffplay", "/opt/homebrew/bin/ffplay", "ffplay"]:
+        if os.path.exists(path) and os.access(path, os.X_OK):
+            return path
+    return "ffplay"
+
+@functools.lru_cache(maxsize=None)
+def get_ffprobe_version(ffprobe_path):
+    try:
+        process = runner.run([ffprobe_path, "-version"], "ffprobe -version", timeout=runner.COMMAND_TIMEOUT)
+    except (OSError, runner.ProcessTimeout):
+        return "unknown"
+    lines = process.stdout.splitlines()
+    return lines[0].strip() if lines else "unknown"
+
+# -progress pipe:1 で出力される進捗（key=value形式の行）
+PROGRESS_ARGS = ["-nostats", "-progress", "pipe:1"]
+PROGRESS_PATTERN = re.compile(r"^([a-z0-9_]+)=(\S*)$")
+
+# 進捗行ならキーと値を、それ以外（エラーメッセージなど）ならNoneを返す
+def parse_progress_line(line):
+    match = PROGRESS_PATTERN.match(line.strip())
+    if not match:
+        return None
+    return match.group(1), match.group(2)
+
+# 進捗のout_time_us（古いffmpegではout_time_ms、単位は同じくマイクロ秒）から処理位置（秒）を取得
+def progress_position(key, value):
+    if key not in ("out_time_us", "out_time_ms"):
+        return None
+    try:
+        return max(0, int(value)) / 1000000.0
+    except ValueError:
+        return None
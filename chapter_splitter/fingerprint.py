@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+from .inputs import get_fetcher, is_url
+
+SAMPLE_BLOCK_SIZE = 64 * 1024
+SAMPLE_BLOCKS = 16
+
+# ファイル全体を読まずに内容を識別する高速フィンガープリント
+# サイズと、先頭・末尾を含む等間隔のブロックのハッシュから作る（URLはRangeリクエストで読む）
+def source_fingerprint(path, block_size=SAMPLE_BLOCK_SIZE, blocks=SAMPLE_BLOCKS):
+    if is_url(path):
+        fetcher = get_fetcher(path)
+        return sampled_fingerprint(fetcher.size, fetcher.read, block_size, blocks)
+    with open(path, "rb") as f:
+        def read(offset, length):
+            f.seek(offset)
+            return f.read(length)
+        return sampled_fingerprint(os.path.getsize(path), read, block_size, blocks)
+
+def sampled_fingerprint(size, read, block_size, blocks):
+    digest = hashlib.sha256(str(size).encode("ascii"))
+    if size <= block_size * blocks:
+        digest.update(read(0, size))
+    else:
+        step = (size - block_size) // (blocks - 1)
+        for i in range(blocks):
+            digest.update(read(i * step, block_size))
+    return f"{size}:{digest.hexdigest()}"
+
+# JSONにできる値の組み合わせから安定したキーを作る
+def stable_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
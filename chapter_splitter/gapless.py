@@ -0,0 +1,161 @@
+import hashlib
+import os
+
+from . import instrument, runner
+from .ffmpeg import get_ffmpeg_path
+from .inputs import input_path
+from .mp4 import write_gapless_info
+from .probe import MediaProbe
+from .profiles import get_profile
+
+# サンプル単位の境界（ギャップレス分割）
+# チャプターの境界は元の音声のサンプル番号（整数）で扱う。隣り合うチャプターは境界のサンプル番号を
+# 共有するため、出力をつなげると元の音声と同じ長さになり、重なりも隙間もできない
+# 分割のffmpegでは入力の先頭からのサンプル数をタイムスタンプにして（asetpts=N/SR/TB）、
+# atrimのstart_sample/end_sampleで切り出す。デコードは従来どおり1回だけ
+
+# エンコーダー遅延の情報（iTunSMPB/elst）を書き込むコンテナ
+# Ogg Opusのpre-skipとMP3のLAMEタグはffmpegが書き込むため対象外
+GAPLESS_FORMATS = {"mp4"}
+
+# 検証でPCMが一致すれば元と同じとみなせるコーデック
+LOSSLESS_CODECS = {"alac", "flac"}
+
+# 検証でデコードしたPCMを読み込む大きさ
+DECODE_BLOCK_SIZE = 1024 * 1024
+
+def to_sample(seconds, sample_rate):
+    return int(round(seconds * sample_rate))
+
+# ジョブの区間（開始サンプル, 終了サンプル）
+def job_samples(job, sample_rate):
+    return to_sample(job["start"], sample_rate), to_sample(job["end"], sample_rate)
+
+# 入力の先頭からのサンプル数でタイムスタンプを振り直すフィルタ（atrimのstart_sample/end_sampleの基準になる）
+SAMPLE_PTS_FILTER = "asetpts=N/SR/TB"
+
+def sample_trim_filter(start, end):
+    return f"atrim=start_sample={start}:end_sample={end}"
+
+# 分割したm4aにエンコーダー遅延と詰め物の情報を書き込む（moovだけを書き換える）
+# 戻り値は書き込んだ出力の数
+def write_gapless_outputs(plan, output_files, log=None):
+    log = log or (lambda msg: None)
+    sample_rate = plan.sample_rate
+    if plan.mode != "encode" or not sample_rate:
+        return 0
+    output_files = set(output_files)
+    written = 0
+    with instrument.span("gapless"):
+        for job in plan.jobs:
+            start, end = job_samples(job, sample_rate)
+            if end <= start:
+                log(f"  ⚠️ {job['track']}: 長さが0のため、ギャップレス情報は書き込みません")
+                continue
+            for output in job["outputs"]:
+                output_file = output["output_file"]
+                if output_file not in output_files or not os.path.exists(output_file):
+                    continue
+                if get_profile(output["profile"])["format"] not in GAPLESS_FORMATS:
+                    continue
+                try:
+                    info = write_gapless_info(output_file, end - start, sample_rate)
+                except (OSError, ValueError) as e:
+                    log(f"  ⚠️ {os.path.basename(output_file)} - ギャップレス情報を書き込めませんでした: {e}")
+                    continue
+                instrument.add_bytes(written=info["bytes"])
+                written += 1
+    if written:
+        log(f"🔗 {written}個の出力にギャップレス情報（iTunSMPB/elst）を書き込みました")
+    return written
+
+def is_lossless(codec):
+    return bool(codec) and (codec in LOSSLESS_CODECS or codec.startswith("pcm_"))
+
+# 音声をPCM（s32le）にデコードし、digestに追加しながらサンプル数を数える
+def decode_samples(ffmpeg_path, media_path, sample_rate, channels, digest, filters=None, should_stop=None):
+    cmd = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-i", input_path(media_path), "-map", "0:a:0"]
+    if filters:
+        cmd.extend(["-af", filters])
+    cmd.extend(["-ac", str(channels), "-ar", str(sample_rate), "-f", "s32le", "pipe:1"])
+    total = 0
+
+    def on_block(block):
+        nonlocal total
+        digest.update(block)
+        total += len(block)
+
+    process = runner.run(
+        cmd, "ffmpeg verify", on_stdout=on_block, chunk_size=DECODE_BLOCK_SIZE,
+        idle_timeout=runner.STALL_TIMEOUT, should_stop=should_stop,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or f"{os.path.basename(media_path)}のデコードに失敗しました")
+    return total // (4 * channels)
+
+# 分割した出力がサンプル単位で元の音声と一致するかを確かめる
+# 各チャプターのデコード後のサンプル数を区間の長さと比べ、チャプターが連続している場合は
+# 出力をつなげたPCMのチェックサムを元の音声の同じ区間と比べる（可逆の出力のみ一致するはず）
+# 戻り値はプロファイルごとの {"profile", "chapters", "lossless", "checksum_match", "ok"} のリスト
+def verify_plan(plan, ffmpeg_path=None, log=None, should_stop=None):
+    log = log or (lambda msg: None)
+    ffmpeg_path = ffmpeg_path or get_ffmpeg_path()
+    sample_rate = plan.sample_rate
+    if not sample_rate:
+        raise ValueError("元の音声のサンプルレートを取得できませんでした")
+    channels = int(plan.probe.audio_stream.get("channels") or 2)
+    bounds = [job_samples(job, sample_rate) for job in plan.jobs]
+    contiguous = all(bounds[i][1] == bounds[i + 1][0] for i in range(len(bounds) - 1))
+
+    expected_checksum = None
+    if contiguous:
+        log(f"🔍 元の音声をデコード中（サンプル {bounds[0][0]}〜{bounds[-1][1]}）...")
+        digest = hashlib.sha256()
+        decode_samples(
+            ffmpeg_path, plan.media_path, sample_rate, channels, digest,
+            filters=f"{SAMPLE_PTS_FILTER},{sample_trim_filter(bounds[0][0], bounds[-1][1])}",
+            should_stop=should_stop,
+        )
+        expected_checksum = digest.hexdigest()
+    else:
+        log("ℹ️ チャプターが連続していないため、チェックサムは比較しません")
+
+    results = []
+    for k, first_output in enumerate(plan.jobs[0]["outputs"]):
+        label = first_output["profile"] or plan.mode
+        log(f"🔍 {label}: 出力をデコード中...")
+        digest = hashlib.sha256()
+        chapters = []
+        for job, (start, end) in zip(plan.jobs, bounds):
+            output_file = job["outputs"][k]["output_file"]
+            if not os.path.exists(output_file):
+                log(f"  ❌ {job['track']}: 出力がありません（{os.path.basename(output_file)}）")
+                chapters.append({"track": job["track"], "expected": end - start, "decoded": None})
+                continue
+            decoded = decode_samples(ffmpeg_path, output_file, sample_rate, channels, digest, should_stop=should_stop)
+            chapters.append({"track": job["track"], "expected": end - start, "decoded": decoded})
+            log(f"  {'✅' if decoded == end - start else '❌'} {job['track']}: {decoded}サンプル"
+                f"（区間 {end - start}、差 {decoded - (end - start):+d}）")
+
+        codec = None
+        if os.path.exists(first_output["output_file"]):
+            codec = MediaProbe.load(first_output["output_file"], use_cache=False).audio_codec
+        lossless = is_lossless(codec)
+        checksum_match = expected_checksum is not None and digest.hexdigest() == expected_checksum
+        lengths_match = all(chapter["decoded"] == chapter["expected"] for chapter in chapters)
+        if expected_checksum is None or codec is None:
+            pass
+        elif checksum_match:
+            log(f"  ✅ つなげたPCMが元の音声と一致しました（{codec}）")
+        elif lossless:
+            log(f"  ❌ つなげたPCMが元の音声と一致しません（{codec}）")
+        else:
+            log(f"  ℹ️ {codec}は非可逆圧縮のため、チェックサムではなくサンプル数で判定します")
+        results.append({
+            "profile": first_output["profile"],
+            "chapters": chapters,
+            "lossless": lossless,
+            "checksum_match": checksum_match,
+            "ok": lengths_match and (checksum_match or not lossless or expected_checksum is None),
+        })
+    return results
@@ -0,0 +1,154 @@
+import json
+import os
+
+from .ffmpeg import get_ffmpeg_path
+from .fingerprint import source_fingerprint
+from .mp4 import retag_mp4_in_place, unsupported_tags
+from .retag import RETAG_EXTENSIONS, break_hardlink
+from .split import (
+    SplitCancelled,
+    SplitFailed,
+    output_fingerprint,
+    output_tags,
+    retag_output,
+    split,
+)
+from .utils import write_json_atomic
+
+# 出力先ごとに、各出力ファイルのフィンガープリントを記録する
+STATE_FILENAME = ".chapter_split_state.json"
+
+def load_state(output_dir):
+    path = os.path.join(output_dir, STATE_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("outputs", {})
+    except (OSError, ValueError):
+        return {}
+
+def save_state(output_dir, outputs):
+    write_json_atomic(os.path.join(output_dir, STATE_FILENAME), {"version": 1, "outputs": outputs})
+
+# 出力ファイルの記録名（出力先からの相対パス）
+def output_name(plan, output_file):
+    return os.path.relpath(output_file, plan.output_dir).replace(os.sep, "/")
+
+# 前回の記録と比べて、各出力を「そのまま」「タグだけ書き換え」「再エンコード」に振り分ける
+# 戻り値の retag は (job, 出力, 元の出力ファイル) のリスト、encode は再エンコードが必要な出力だけを
+# 残したジョブのリスト、orphans は不要になった出力の記録名
+def plan_incremental(plan, state, source_id):
+    by_audio_key = {}
+    for name, entry in state.items():
+        if os.path.exists(os.path.join(plan.output_dir, name)):
+            by_audio_key.setdefault(entry["audio_key"], []).append(name)
+
+    unchanged, retag, encode = [], [], []
+    used = set()
+    fingerprints = {}
+    for job in plan.jobs:
+        pending = []
+        for output in job["outputs"]:
+            name = output_name(plan, output["output_file"])
+            audio_key, tag_key = output_fingerprint(source_id, plan, job, output["profile"])
+            fingerprints[name] = {"audio_key": audio_key, "tag_key": tag_key}
+
+            entry = state.get(name)
+            if (entry and entry["audio_key"] == audio_key and entry["tag_key"] == tag_key
+                    and name in by_audio_key.get(audio_key, [])):
+                unchanged.append(name)
+                used.add(name)
+                continue
+
+            # 同じ音声の出力が残っていれば、タグ（とファイル名）だけを更新する
+            candidates = [candidate for candidate in by_audio_key.get(audio_key, []) if candidate not in used]
+            if candidates:
+                source = name if name in candidates else candidates[0]
+                retag.append((job, output, os.path.join(plan.output_dir, source)))
+                used.add(source)
+            else:
+                pending.append(output)
+
+        if pending:
+            encode.append(dict(job, outputs=pending, output_file=pending[0]["output_file"]))
+
+    orphans = [name for name in state if name not in used and name not in fingerprints]
+    return unchanged, retag, encode, orphans, fingerprints
+
+# 変更のあったチャプターだけを処理する差分再分割
+# 区間やエンコード設定が変わった出力は再エンコード、タグだけの変更は書き換え、
+# 不要になった出力は削除する（複数プロファイルの場合は出力ごとに判定する）
+def incremental_split(plan, jobs=None, ffmpeg_path=None, log=None, on_chapter_done=None, should_stop=None,
+                      on_progress=None, use_cache=True):
+    log = log or (lambda msg: None)
+    ffmpeg_path = ffmpeg_path or get_ffmpeg_path()
+    os.makedirs(plan.output_dir, exist_ok=True)
+
+    state = load_state(plan.output_dir)
+    source_id = source_fingerprint(plan.media_path)
+    unchanged, retag, encode, orphans, fingerprints = plan_incremental(plan, state, source_id)
+    encode_count = sum(len(job["outputs"]) for job in encode)
+    log(f"🔁 変更なし {len(unchanged)} / タグ更新 {len(retag)} / 再エンコード {encode_count} / 削除 {len(orphans)}")
+
+    new_state = {name: fingerprints[name] for name in unchanged}
+
+    # 名前の変わらないm4aは、ilstだけをその場で書き換える（ilstに対応しないタグがある場合を除く）
+    # それ以外のタグの書き換えは一時ファイルに書き出し、元の出力を消してから置き換える
+    # （タイトル変更で名前が入れ替わる場合でも元の音声を失わないため）
+    temp_files = []
+    in_place_bytes = 0
+    for job, output, source_file in retag:
+        output_file = output["output_file"]
+        tags = output_tags(plan.metadata, job)
+        if (source_file == output_file and os.path.splitext(output_file)[1].lower() in RETAG_EXTENSIONS
+                and not unsupported_tags(tags)):
+            try:
+                break_hardlink(output_file)
+                in_place_bytes += retag_mp4_in_place(output_file, tags, clear=True)
+            except ValueError as e:
+                log(f"  ⚠️ {output_name(plan, output_file)} - その場での書き換えに失敗（ffmpegで書き換えます）: {e}")
+            else:
+                name = output_name(plan, output_file)
+                new_state[name] = fingerprints[name]
+                log(f"  🏷 {name}")
+                continue
+        temp_file = output_file + ".retag" + os.path.splitext(output_file)[1]
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        retag_output(ffmpeg_path, source_file, temp_file, plan.metadata, job, output["profile"])
+        temp_files.append((output_file, source_file, temp_file))
+
+    for name in orphans:
+        path = os.path.join(plan.output_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+            log(f"  🗑 {name}")
+    for output_file, source_file, temp_file in temp_files:
+        if source_file != output_file and os.path.exists(source_file):
+            os.remove(source_file)
+    for output_file, source_file, temp_file in temp_files:
+        os.replace(temp_file, output_file)
+        name = output_name(plan, output_file)
+        new_state[name] = fingerprints[name]
+        log(f"  🏷 {name}")
+    if in_place_bytes:
+        log(f"  ✏️ タグの書き換え: {in_place_bytes / 1024:.1f}KB")
+
+    if encode:
+        encode_plan = plan.subset(encode)
+        try:
+            split(encode_plan, jobs=jobs, ffmpeg_path=ffmpeg_path, log=log,
+                  on_chapter_done=on_chapter_done, should_stop=should_stop, on_progress=on_progress,
+                  use_cache=use_cache)
+        except (SplitFailed, SplitCancelled) as e:
+            for output_file in e.completed_outputs:
+                name = output_name(plan, output_file)
+                new_state[name] = fingerprints[name]
+            save_state(plan.output_dir, new_state)
+            raise
+        for output_file in encode_plan.output_files:
+            name = output_name(plan, output_file)
+            new_state[name] = fingerprints[name]
+
+    save_state(plan.output_dir, new_state)
+    return plan.output_files
@@ -0,0 +1,267 @@
+import collections
+import hashlib
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import urllib.parse
+
+# http(s)のURLと標準入力（パイプ）の入力
+# URLはRangeリクエストで必要な範囲だけを読み込む。ffprobe/ffmpegにはローカルの中継サーバーの
+# URLを渡し、中継サーバーは元のサーバーへの接続をプールして使い回す（並列のチャプター処理が
+# それぞれ接続を開き直さない）。読み込んだブロックはメモリにキャッシュするため、ヘッダやmoovは
+# ffprobeと各ffmpegの間で一度だけ取得される
+# http.client/http.server（とssl）はURLを扱うときに初めて読み込む（import chapter_splitterを軽く保つ）
+
+# 元のサーバーから一度に取得する大きさと、メモリに保持するブロック数（LRU）
+BLOCK_SIZE = 1024 * 1024
+CACHE_BLOCKS = 64
+# 元のサーバーへの接続数の上限と、タイムアウト（秒）
+POOL_SIZE = 8
+HTTP_TIMEOUT = 30
+MAX_REDIRECTS = 5
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+def is_url(path):
+    return isinstance(path, str) and path.lower().startswith(("http://", "https://"))
+
+# 表示や出力先の名前に使うファイル名（URLはクエリを除いたパスの末尾）
+def media_name(path):
+    if is_url(path):
+        name = os.path.basename(urllib.parse.unquote(urllib.parse.urlsplit(path).path))
+        return name or urllib.parse.urlsplit(path).hostname or "remote"
+    return os.path.basename(path)
+
+# Rangeリクエストで元のファイルを読む（接続プールとブロックキャッシュ付き）
+class RangeFetcher:
+    def __init__(self, url):
+        self.url = url
+        self.lock = threading.Lock()
+        self.pool = queue.LifoQueue()
+        self.blocks = collections.OrderedDict()
+        self.scheme = self.host = self.port = None
+        self.set_target(url)
+        self.size = None
+        self.etag = None
+        self.last_modified = None
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    # リダイレクトで接続先（スキーム・ホスト・ポート）が変わったら、プールの接続は使えないので閉じる
+    def set_target(self, url):
+        parts = urllib.parse.urlsplit(url)
+        target = (parts.scheme.lower(), parts.hostname, parts.port)
+        if target != (self.scheme, self.host, self.port):
+            self.close_pool()
+        self.scheme, self.host, self.port = target
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    def close_pool(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def connect(self):
+        import http.client
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            pass
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=HTTP_TIMEOUT)
+        return http.client.HTTPConnection(self.host, self.port, timeout=HTTP_TIMEOUT)
+
+    def release(self, connection):
+        if self.pool.qsize() < POOL_SIZE:
+            self.pool.put(connection)
+        else:
+            connection.close()
+
+    # プールの接続でリクエストを送り、(ステータス, ヘッダ, 本文)を返す
+    # 使い回した接続がサーバー側で閉じられていた場合は、新しい接続で一度だけやり直す
+    def request(self, method, headers=None):
+        import http.client
+        for attempt in range(2):
+            connection = self.connect()
+            try:
+                connection.request(method, self.path, headers=headers or {})
+                response = connection.getresponse()
+                # Rangeを無視して全体を返すサーバーからは本文を読まない
+                if response.status == 200 and headers and "Range" in headers:
+                    connection.close()
+                    return response.status, response.headers, b""
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                connection.close()
+            else:
+                self.release(connection)
+            with self.lock:
+                self.requests += 1
+                self.bytes_fetched += len(body)
+            return response.status, response.headers, body
+
+    # サイズと更新情報を取得する（リダイレクトをたどり、Range非対応のサーバーはエラー）
+    def open(self):
+        if self.size is not None:
+            return self
+        for _ in range(MAX_REDIRECTS + 1):
+            status, headers, _ = self.request("GET", {"Range": "bytes=0-0"})
+            if status in (301, 302, 303, 307, 308) and headers.get("Location"):
+                self.set_target(urllib.parse.urljoin(f"{self.scheme}://{self.host}{self.path}", headers["Location"]))
+                continue
+            break
+        if status != 206:
+            raise RuntimeError(f"{media_name(self.url)}はRangeリクエストに対応していません（HTTP {status}）")
+        match = re.match(r"bytes \d+-\d+/(\d+)", headers.get("Content-Range", ""))
+        if not match:
+            raise RuntimeError(f"{media_name(self.url)}のサイズを取得できませんでした")
+        self.size = int(match.group(1))
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+        return self
+
+    # 内容の識別子（キャッシュのキーに使う）
+    def identity(self):
+        self.open()
+        return [self.url, self.size, self.etag or self.last_modified]
+
+    def read_block(self, index):
+        with self.lock:
+            block = self.blocks.get(index)
+            if block is not None:
+                self.blocks.move_to_end(index)
+                return block
+        start = index * BLOCK_SIZE
+        end = min(self.size, start + BLOCK_SIZE) - 1
+        status, _, block = self.request("GET", {"Range": f"bytes={start}-{end}"})
+        if status != 206 or len(block) != end - start + 1:
+            raise RuntimeError(f"{media_name(self.url)}の読み込みに失敗しました（HTTP {status}）")
+        with self.lock:
+            self.blocks[index] = block
+            while len(self.blocks) > CACHE_BLOCKS:
+                self.blocks.popitem(last=False)
+        return block
+
+    # offsetからlengthバイトを返す（ファイル末尾を越える分は切り詰める）
+    def read(self, offset, length):
+        self.open()
+        end = min(self.size, offset + length)
+        chunks = []
+        while offset < end:
+            block = self.read_block(offset // BLOCK_SIZE)
+            start = offset % BLOCK_SIZE
+            chunk = block[start:start + end - offset]
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b"".join(chunks)
+
+fetchers = {}
+fetchers_lock = threading.Lock()
+
+# URLごとに共有するRangeFetcher
+def get_fetcher(url):
+    with fetchers_lock:
+        fetcher = fetchers.get(url)
+        if fetcher is None:
+            fetcher = fetchers[url] = RangeFetcher(url)
+    return fetcher.open()
+
+# ffprobe/ffmpegからのRangeリクエストを、共有のRangeFetcherで処理する（中継サーバーのハンドラから呼ばれる）
+def respond(handler, send_body):
+    fetcher = proxy_targets.get(handler.path.split("/")[1] if handler.path.count("/") >= 2 else "")
+    if fetcher is None:
+        handler.send_error(404)
+        return
+    start, end = 0, fetcher.size - 1
+    match = RANGE_PATTERN.fullmatch(handler.headers.get("Range", "").strip())
+    if match and (match.group(1) or match.group(2)):
+        if match.group(1):
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(end, int(match.group(2)))
+        else:
+            start = max(0, fetcher.size - int(match.group(2)))
+        if start >= fetcher.size:
+            handler.send_response(416)
+            handler.send_header("Content-Range", f"bytes */{fetcher.size}")
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        handler.send_response(206)
+        handler.send_header("Content-Range", f"bytes {start}-{end}/{fetcher.size}")
+    else:
+        handler.send_response(200)
+    handler.send_header("Accept-Ranges", "bytes")
+    handler.send_header("Content-Length", str(end - start + 1))
+    handler.end_headers()
+    if not send_body:
+        return
+
+    offset = start
+    try:
+        while offset <= end:
+            chunk = fetcher.read(offset, min(BLOCK_SIZE - offset % BLOCK_SIZE, end - offset + 1))
+            if not chunk:
+                break
+            handler.wfile.write(chunk)
+            offset += len(chunk)
+    except (BrokenPipeError, ConnectionResetError):
+        # ffmpegはシークのたびに接続を切る
+        handler.close_connection = True
+
+proxy_server = None
+proxy_targets = {}
+proxy_lock = threading.Lock()
+
+def start_proxy():
+    global proxy_server
+    with proxy_lock:
+        if proxy_server is None:
+            import http.server
+
+            class ProxyHandler(http.server.BaseHTTPRequestHandler):
+                protocol_version = "HTTP/1.1"
+
+                def do_HEAD(self):
+                    respond(self, send_body=False)
+
+                def do_GET(self):
+                    respond(self, send_body=True)
+
+                def log_message(self, format, *args):
+                    pass
+
+            proxy_server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ProxyHandler)
+            proxy_server.daemon_threads = True
+            threading.Thread(target=proxy_server.serve_forever, name="chapter_splitter.inputs", daemon=True).start()
+        return proxy_server
+
+# ffprobe/ffmpegに渡す入力（URLは中継サーバーのURL、ローカルファイルはそのまま）
+def input_path(path):
+    if not is_url(path):
+        return path
+    fetcher = get_fetcher(path)
+    token = hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+    server = start_proxy()
+    proxy_targets[token] = fetcher
+    name = urllib.parse.quote(media_name(path))
+    return f"http://127.0.0.1:{server.server_address[1]}/{token}/{name}"
+
+# 標準入力を一時ファイルに書き出す（シークできないパイプをffprobe/ffmpegで何度も読めるようにする）
+# 戻り値は一時ファイルのパスで、使い終わったら親ディレクトリごと削除する
+def spool_stdin(stream, name="stdin"):
+    work_dir = tempfile.mkdtemp(prefix="chapter_split_stdin_")
+    path = os.path.join(work_dir, name)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(stream, f, BLOCK_SIZE)
+    return path
@@ -0,0 +1,195 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+# 処理時間の計測（オプトイン）
+# start_recording()からstop_recording()までの間、各段階（ffprobe・分割・アートワークなど）と
+# チャプターごとの実時間・CPU時間、子プロセスのrusage、入出力バイト数を記録する
+# 入出力バイト数はこのプロセスが実際に読み書きした量（PCMの切り出し・タグの書き換えなど）で、
+# ffmpegの入出力は子プロセスのrusageのブロック入出力として別に集計する
+# 記録していないときはspan()などは何もしない
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.processes = []
+        self.totals = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    def add_span(self, name, category, start, end, cpu=None, args=None):
+        with self.lock:
+            self.spans.append({
+                "name": name,
+                "category": category,
+                "start": start,
+                "end": end,
+                "cpu": cpu,
+                "thread": threading.get_ident(),
+                "args": args or {},
+            })
+
+    # 子プロセスの実行時間とrusage（runnerがos.wait4で取得。取得できない環境ではNone）
+    def add_process(self, name, pid, start, end, usage, args=None):
+        entry = {"name": name, "pid": pid, "start": start, "end": end, "args": args or {}}
+        if usage is not None:
+            entry.update({
+                "cpu_user": usage.ru_utime,
+                "cpu_system": usage.ru_stime,
+                # ru_maxrssはLinuxではKB、macOSではバイト
+                "max_rss": usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024,
+                "block_read": usage.ru_inblock * 512,
+                "block_write": usage.ru_oublock * 512,
+            })
+        with self.lock:
+            self.processes.append(entry)
+
+    # 回数の多い処理（ログの表示など）は個別に記録せず、合計時間と回数だけを持つ
+    def add_total(self, name, seconds):
+        with self.lock:
+            count, total = self.totals.get(name, (0, 0.0))
+            self.totals[name] = (count + 1, total + seconds)
+
+    def add_bytes(self, read=0, written=0):
+        with self.lock:
+            self.bytes_read += read
+            self.bytes_written += written
+
+    # 段階ごとの集計：(名前, 回数, 実時間, CPU時間, 最大RSS)
+    # timed()の合計はCPU時間を測っていないため、CPU時間はNone
+    def summary(self):
+        rows = {}
+
+        def add(name, wall, cpu, rss=None):
+            count, total_wall, total_cpu, max_rss = rows.get(name, (0, 0.0, 0.0, None))
+            if rss is not None:
+                max_rss = max(max_rss or 0, rss)
+            rows[name] = (count + 1, total_wall + wall, total_cpu + (cpu or 0.0), max_rss)
+
+        with self.lock:
+            for span in self.spans:
+                if span["category"] == "stage":
+                    add(span["name"], span["end"] - span["start"], span["cpu"])
+            for process in self.processes:
+                add(process["name"], process["end"] - process["start"],
+                    process.get("cpu_user", 0.0) + process.get("cpu_system", 0.0), process.get("max_rss"))
+            for name, (count, total) in self.totals.items():
+                rows[name] = (count, total, None, None)
+        return [(name,) + values for name, values in sorted(rows.items())]
+
+    # 子プロセスのブロック入出力の合計：(読み込み, 書き出し)（バイト、rusageを取得できない環境では0）
+    # ページキャッシュから読んだ分は含まない
+    def process_blocks(self):
+        with self.lock:
+            return (sum(process.get("block_read", 0) for process in self.processes),
+                    sum(process.get("block_write", 0) for process in self.processes))
+
+    def format_summary(self):
+        lines = [f"{'段階':<24}{'回数':>6}{'実時間(s)':>12}{'CPU(s)':>10}{'最大RSS(MB)':>13}"]
+        for name, count, wall, cpu, max_rss in self.summary():
+            rss = f"{max_rss / (1024 * 1024):.1f}" if max_rss else "-"
+            cpu = f"{cpu:.3f}" if cpu is not None else "-"
+            lines.append(f"{name:<24}{count:>6}{wall:>12.3f}{cpu:>10}{rss:>13}")
+        block_read, block_write = self.process_blocks()
+        lines.append(f"読み込み {self.bytes_read / (1024 * 1024):.1f}MB / 書き出し {self.bytes_written / (1024 * 1024):.1f}MB"
+                     f"（子プロセスのブロック入出力 {block_read / (1024 * 1024):.1f}MB / {block_write / (1024 * 1024):.1f}MB）")
+        return "\n".join(lines)
+
+    # Chrome trace形式（chrome://tracing や Perfetto で開ける）
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        with self.lock:
+            for span in self.spans:
+                args = dict(span["args"])
+                if span["cpu"] is not None:
+                    args["cpu_s"] = span["cpu"]
+                events.append({
+                    "name": span["name"], "cat": span["category"], "ph": "X",
+                    "ts": span["start"] * 1e6, "dur": (span["end"] - span["start"]) * 1e6,
+                    "pid": pid, "tid": span["thread"], "args": args,
+                })
+            for process in self.processes:
+                args = {key: value for key, value in process.items() if key not in ("name", "pid", "start", "end", "args")}
+                args.update(process["args"])
+                events.append({
+                    "name": process["name"], "cat": "process", "ph": "X",
+                    "ts": process["start"] * 1e6, "dur": (process["end"] - process["start"]) * 1e6,
+                    "pid": pid, "tid": process["pid"], "args": args,
+                })
+                events.append({
+                    "name": "thread_name", "ph": "M", "pid": pid, "tid": process["pid"],
+                    "args": {"name": f"{process['name']} ({process['pid']})"},
+                })
+            totals = {name: {"count": count, "seconds": total} for name, (count, total) in self.totals.items()}
+        block_read, block_write = self.process_blocks()
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "summary": [
+                    {"name": name, "count": count, "wall_s": wall, "cpu_s": cpu, "max_rss": max_rss}
+                    for name, count, wall, cpu, max_rss in self.summary()
+                ],
+                "totals": totals,
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+                "process_block_read": block_read,
+                "process_block_write": block_write,
+            },
+        }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+current = None
+
+def start_recording():
+    global current
+    current = Recorder()
+    return current
+
+def stop_recording():
+    global current
+    recorder, current = current, None
+    return recorder
+
+# 段階の実時間と、その段階を実行したスレッドのCPU時間を記録する
+@contextlib.contextmanager
+def span(name, category="stage", **args):
+    recorder = current
+    if recorder is None:
+        yield
+        return
+    start = recorder.now()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        recorder.add_span(name, category, start, recorder.now(), time.thread_time() - cpu_start, args)
+
+# 回数の多い処理の合計時間を記録する
+@contextlib.contextmanager
+def timed(name):
+    recorder = current
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add_total(name, time.perf_counter() - start)
+
+def add_bytes(read=0, written=0):
+    if current is not None:
+        current.add_bytes(read, written)
@@ -0,0 +1,172 @@
+import json
+import os
+import re
+
+from . import instrument, runner
+from .ffmpeg import PROGRESS_ARGS, get_ffmpeg_path
+from .inputs import input_path, media_name
+from .utils import get_cache_dir, write_json_atomic
+
+# ラウドネスの正規化（EBU R128 / ITU-R BS.1770）
+# すべてのチャプターの区間を1回のデコードで測る：入力をasplitで分け、区間ごとにatrim→ebur128を通す
+# 最初のチャプターの開始から最後のチャプターの終了までの区間（アルバム全体）も同じパスで測る
+# 測定結果はffprobeのキャッシュと同じキーで保存し、次回からは測定しない
+# 正規化のゲインは分割時のフィルタ（volume）で掛けるため、エンコードは1回のまま
+
+NORMALIZE_MODES = ["track", "album"]
+
+# 目標の統合ラウドネス（LUFS）とトゥルーピークの上限（dBTP）
+DEFAULT_TARGET_LUFS = -16.0
+DEFAULT_MAX_TRUE_PEAK = -1.0
+
+# ebur128は無音のみの区間を-70 LUFSと報告する（ゲートで全ブロックが除かれる）
+SILENCE_LUFS = -70.0
+
+# ebur128の終了時のSummary（フィルタ名のParsed_ebur128_<番号>で区間を区別する）
+SUMMARY_PATTERN = re.compile(r"\[Parsed_ebur128_(\d+) @ [^\]]+\] Summary:")
+INTEGRATED_PATTERN = re.compile(r"^\s*I:\s*(-?[\d.]+|-inf|nan) LUFS")
+RANGE_PATTERN = re.compile(r"^\s*LRA:\s*(-?[\d.]+|-inf|nan) LU")
+PEAK_PATTERN = re.compile(r"^\s*Peak:\s*(-?[\d.]+|-inf|nan) dBFS")
+
+def range_key(start, end):
+    return f"{start:.6f}-{end:.6f}"
+
+def parse_level(value):
+    try:
+        level = float(value)
+    except ValueError:
+        return None
+    return level if level == level and level != float("-inf") else None
+
+# 区間ごとにebur128を通すコマンド
+# filter_complexのフィルタには先頭から番号が振られる（asplitが0、区間iのatrimが1+2i、ebur128が2+2i）
+def build_measure_command(ffmpeg_path, media_path, ranges, offset, duration):
+    labels = [f"[s{i}]" for i in range(len(ranges))]
+    filters = [f"[0:a:0]asplit={len(ranges)}" + "".join(labels)]
+    for i, (start, end) in enumerate(ranges):
+        filters.append(
+            f"[s{i}]atrim=start={start - offset:.6f}:end={end - offset:.6f},"
+            f"ebur128=peak=true:framelog=verbose[m{i}]"
+        )
+
+    cmd = [ffmpeg_path, "-hide_banner", "-loglevel", "info"] + PROGRESS_ARGS
+    if offset > 0:
+        cmd.extend(["-ss", f"{offset:.6f}"])
+    cmd.extend(["-t", f"{duration:.6f}", "-i", input_path(media_path), "-filter_complex", ";".join(filters)])
+    for i in range(len(ranges)):
+        cmd.extend(["-map", f"[m{i}]"])
+    cmd.extend(["-f", "null", "-"])
+    return cmd
+
+# 区間 [(開始秒, 終了秒), ...] の統合ラウドネス・ラウドネスレンジ・トゥルーピークを1回のデコードで測る
+# 戻り値は {range_key: {"integrated", "range", "true_peak"}}（無音の区間のintegratedはNone）
+def measure_ranges(media_path, ranges, ffmpeg_path=None, should_stop=None):
+    ffmpeg_path = ffmpeg_path or get_ffmpeg_path()
+    offset = min(start for start, _ in ranges)
+    duration = max(end for _, end in ranges) - offset
+    cmd = build_measure_command(ffmpeg_path, media_path, ranges, offset, duration)
+
+    results = {}
+    current = None
+    errors = []
+
+    def on_stderr(line):
+        nonlocal current
+        match = SUMMARY_PATTERN.search(line)
+        if match:
+            index = (int(match.group(1)) - 2) // 2
+            current = results.setdefault(index, {}) if 0 <= index < len(ranges) else None
+            return
+        if current is None:
+            if "error" in line.lower():
+                errors.append(line.strip())
+            return
+        for key, pattern in (("integrated", INTEGRATED_PATTERN), ("range", RANGE_PATTERN),
+                             ("true_peak", PEAK_PATTERN)):
+            match = pattern.match(line)
+            if match:
+                current[key] = parse_level(match.group(1))
+
+    process = runner.run(
+        cmd, "ffmpeg ebur128", on_stdout=lambda line: None, on_stderr=on_stderr,
+        idle_timeout=runner.STALL_TIMEOUT, should_stop=should_stop, args={"ranges": len(ranges)},
+    )
+    if process.returncode != 0 or len(results) < len(ranges):
+        raise RuntimeError("\n".join(errors[-5:]) or "ラウドネスの測定に失敗しました")
+
+    measurements = {}
+    for index, (start, end) in enumerate(ranges):
+        result = results[index]
+        integrated = result.get("integrated")
+        if integrated is not None and integrated <= SILENCE_LUFS:
+            integrated = None
+        measurements[range_key(start, end)] = {
+            "integrated": integrated,
+            "range": result.get("range"),
+            "true_peak": result.get("true_peak"),
+        }
+    return measurements
+
+def cache_path_for(probe):
+    if probe is None or not probe.cache_key:
+        return None
+    return os.path.join(get_cache_dir("probe"), probe.cache_key + ".loudness.json")
+
+def load_measurements(cache_path):
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+# 各チャプターとアルバム全体の区間を測る（キャッシュにない区間だけをまとめて1回で測る）
+# 戻り値は (チャプターごとの測定結果のリスト, アルバム全体の測定結果)
+def measure_loudness(media_path, split_jobs, probe=None, ffmpeg_path=None, use_cache=True, log=None,
+                     should_stop=None):
+    log = log or (lambda msg: None)
+    album_range = (min(job["start"] for job in split_jobs), max(job["end"] for job in split_jobs))
+    ranges = [(job["start"], job["end"]) for job in split_jobs] + [album_range]
+
+    cache_path = cache_path_for(probe) if use_cache else None
+    measurements = load_measurements(cache_path)
+    missing = list(dict.fromkeys(r for r in ranges if range_key(*r) not in measurements))
+    if missing:
+        log(f"🔊 ラウドネスを測定中（{len(missing)}区間を1回のデコードで測定）...")
+        with instrument.span("loudness", file=media_name(media_path), ranges=len(missing)):
+            measurements.update(measure_ranges(media_path, missing, ffmpeg_path, should_stop))
+        if cache_path:
+            try:
+                write_json_atomic(cache_path, measurements)
+            except OSError:
+                pass
+    else:
+        log("🔊 キャッシュのラウドネス測定結果を使います")
+
+    return [measurements[range_key(*r)] for r in ranges[:-1]], measurements[range_key(*album_range)]
+
+# 目標ラウドネスにするゲイン（dB）。トゥルーピークが上限を超えないように抑える
+def normalize_gain(measurement, target_lufs, max_true_peak):
+    if measurement.get("integrated") is None:
+        return 0.0
+    gain = target_lufs - measurement["integrated"]
+    if measurement.get("true_peak") is not None:
+        gain = min(gain, max_true_peak - measurement["true_peak"])
+    return gain
+
+# チャプターごとのゲイン（dB）
+# track: チャプターごとに目標に合わせる / album: アルバム全体を目標に合わせ、チャプター間の音量差は保つ
+def chapter_gains(chapter_measurements, album_measurement, mode="track", target_lufs=DEFAULT_TARGET_LUFS,
+                  max_true_peak=DEFAULT_MAX_TRUE_PEAK):
+    if mode not in NORMALIZE_MODES:
+        raise ValueError(f"不明な正規化モード: {mode}（{', '.join(NORMALIZE_MODES)}）")
+    if mode == "album":
+        # アルバムのゲインは、最もピークの高いチャプターでも上限を超えないようにする
+        peaks = [m["true_peak"] for m in chapter_measurements + [album_measurement] if m.get("true_peak") is not None]
+        album = dict(album_measurement, true_peak=max(peaks) if peaks else None)
+        return [normalize_gain(album, target_lufs, max_true_peak)] * len(chapter_measurements)
+    return [normalize_gain(m, target_lufs, max_true_peak) for m in chapter_measurements]
+
+def format_level(value, unit):
+    return f"{value:.1f} {unit}" if value is not None else f"- {unit}"
@@ -0,0 +1,45 @@
+# 継承するメタデータのマッピング定義
+METADATA_MAPPING = {
+    "album": ["album", "ALBUM", "Album", "©alb"],
+    "artist": ["artist", "ARTIST", "Artist", "©ART", "album_artist", "ALBUM_ARTIST"],
+    "album_artist": ["album_artist", "ALBUM_ARTIST", "albumartist"],
+    "genre": ["genre", "GENRE", "Genre", "©gen"],
+    "date": ["date", "DATE", "Date", "year", "YEAR", "©day"],
+    "composer": ["composer", "COMPOSER", "Composer", "©wrt"],
+    "comment": ["comment", "COMMENT", "Comment", "©cmt"],
+    "copyright": ["copyright", "COPYRIGHT", "Copyright", "©cpy"],
+    "publisher": ["publisher", "PUBLISHER", "Publisher", "label"],
+    "description": ["description", "DESCRIPTION", "Description"],
+}
+
+TITLE_KEYS = ["title", "TITLE", "Title", "©nam"]
+
+def find_tag(tags, possible_keys):
+    for key in possible_keys:
+        if key in tags and tags[key] and str(tags[key]).strip():
+            return str(tags[key]).strip()
+    return None
+
+# 元ファイルのタグから、分割後の各ファイルに継承するメタデータを選ぶ
+# 動画ファイルの場合は元のタイトル（なければファイル名）をアルバムタイトルにする
+def inherit_metadata(tags, is_video, media_filename, log=None):
+    log = log or (lambda msg: None)
+    metadata = {}
+
+    # 各メタデータを検索して取得
+    for meta_key, possible_keys in METADATA_MAPPING.items():
+        value = find_tag(tags, possible_keys)
+        if value:
+            metadata[meta_key] = value
+            log(f"  📌 {meta_key}: {value}")
+
+    if is_video:
+        video_title = find_tag(tags, TITLE_KEYS)
+        if video_title:
+            metadata["album"] = video_title
+            log(f"  🎬 動画タイトルをアルバムに設定: {video_title}")
+        else:
+            metadata["album"] = media_filename
+            log(f"  📁 ファイル名をアルバムに設定: {media_filename}")
+
+    return metadata
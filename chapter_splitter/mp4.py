@@ -0,0 +1,412 @@
+import os
+import struct
+
+# MP4アトム（ボックス）の簡易パーサ
+def iter_mp4_atoms(data, start=0, end=None):
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[offset:offset + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ValueError(f"不正なMP4アトム: {kind!r}")
+        yield offset, size, kind, header
+        offset += size
+
+def mp4_atom(kind, payload):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+# 指定パスのアトムを差し替えたバイト列を返す（パスの途中のアトムが無ければ作成）
+# metaはフルボックスのため、子アトムの前に4バイトのversion/flagsがある
+def replace_mp4_child(data, path, build):
+    kind = path[0]
+    skip = 4 if kind == b"meta" else 0
+    for offset, size, child_kind, header in iter_mp4_atoms(data):
+        if child_kind != kind:
+            continue
+        body = data[offset + header:offset + size]
+        if len(path) == 1:
+            new_atom = build(body)
+        else:
+            new_atom = mp4_atom(kind, body[:skip] + replace_mp4_child(body[skip:], path[1:], build))
+        return data[:offset] + new_atom + data[offset + size:]
+
+    # 見つからない場合は空のアトムから作る
+    if len(path) == 1:
+        return data + build(None)
+    empty = b""
+    if kind == b"meta":
+        # iTunes形式のメタデータにはhdlr(mdir)が必要
+        empty = b"\0\0\0\0" + mp4_atom(b"hdlr", b"\0" * 8 + b"mdirappl" + b"\0" * 9)
+        return data + mp4_atom(kind, empty[:4] + replace_mp4_child(empty[4:], path[1:], build))
+    return data + mp4_atom(kind, replace_mp4_child(empty, path[1:], build))
+
+# moovアトムの位置を調べる。moovがファイル末尾にない（faststart）場合はNone
+def find_trailing_moov(f):
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    offset = 0
+    moov = None
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = file_size - offset
+        if size < 8:
+            raise ValueError("不正なMP4ファイルです")
+        if kind == b"moov":
+            moov = (offset, size)
+        elif moov is not None and kind not in (b"free", b"skip"):
+            return None
+        offset += size
+    return moov
+
+# ilstのアイテムの種別（フリーフォームの----は(種別, name)で区別する）
+def item_key(atom):
+    kind = atom[4:8]
+    if kind != b"----":
+        return kind
+    for offset, size, child_kind, header in iter_mp4_atoms(atom, 8):
+        if child_kind == b"name":
+            return kind, atom[offset + header + 4:offset + size].decode("utf-8", errors="replace")
+    return kind
+
+# ilstのアイテムを差し替える（itemsはitem_keyの種別→アトム全体のバイト列、Noneなら削除）
+def replace_ilst_items(moov_body, items):
+    def build(ilst_body):
+        kept = []
+        if ilst_body:
+            for offset, size, _, _ in iter_mp4_atoms(ilst_body):
+                if item_key(ilst_body[offset:offset + size]) not in items:
+                    kept.append(ilst_body[offset:offset + size])
+        kept.extend(atom for atom in items.values() if atom is not None)
+        return mp4_atom(b"ilst", b"".join(kept))
+
+    return replace_mp4_child(moov_body, [b"udta", b"meta", b"ilst"], build)
+
+# 末尾のmoovだけを書き換えてアートワーク（covr）を格納する
+# 音声データ（mdat）には触れないため、コストはmoovとアートワークのサイズ分だけ
+# 書き換えられない構造の場合はFalseを返す
+def embed_artwork_in_place(path, artwork_path):
+    with open(artwork_path, "rb") as f:
+        image = f.read()
+    image_type = 14 if artwork_path.lower().endswith(".png") else 13
+    covr = mp4_atom(b"covr", mp4_atom(b"data", struct.pack(">II", image_type, 0) + image))
+
+    with open(path, "r+b") as f:
+        moov = find_trailing_moov(f)
+        if moov is None:
+            return False
+        offset, size = moov
+        f.seek(offset)
+        header = f.read(16)
+        header_size = 16 if struct.unpack(">I", header[:4])[0] == 1 else 8
+        f.seek(offset + header_size)
+        body = f.read(size - header_size)
+
+        new_moov = mp4_atom(b"moov", replace_ilst_items(body, {b"covr": covr}))
+        f.seek(offset)
+        f.write(new_moov)
+        f.truncate()
+    return True
+
+
+# ffmpegのメタデータ名とilstのアイテム（テキスト）
+ILST_TEXT_ITEMS = {
+    "title": b"\xa9nam",
+    "artist": b"\xa9ART",
+    "album": b"\xa9alb",
+    "album_artist": b"aART",
+    "genre": b"\xa9gen",
+    "date": b"\xa9day",
+    "composer": b"\xa9wrt",
+    "comment": b"\xa9cmt",
+    "copyright": b"cprt",
+    "description": b"desc",
+    "grouping": b"\xa9grp",
+    "lyrics": b"\xa9lyr",
+    "publisher": b"\xa9pub",
+}
+
+# フリーフォームのアイテム（mean・name・dataの子アトムを持つ）
+ITUNES_MEAN = "com.apple.iTunes"
+
+def freeform_item(name, text, mean=ITUNES_MEAN):
+    return mp4_atom(b"----", (
+        mp4_atom(b"mean", b"\0\0\0\0" + mean.encode("utf-8"))
+        + mp4_atom(b"name", b"\0\0\0\0" + name.encode("utf-8"))
+        + mp4_atom(b"data", struct.pack(">II", 1, 0) + text.encode("utf-8"))
+    ))
+
+def text_item(kind, text):
+    return mp4_atom(kind, mp4_atom(b"data", struct.pack(">II", 1, 0) + text.encode("utf-8")))
+
+# trkn/diskは「番号/総数」を2バイトずつの整数で持つ
+def number_item(kind, value):
+    number, _, total = str(value).partition("/")
+    try:
+        number = int(number or 0)
+        total = int(total or 0)
+    except ValueError:
+        return None
+    padding = b"\0\0" if kind == b"trkn" else b""
+    return mp4_atom(kind, mp4_atom(b"data", struct.pack(">IIHHH", 0, 0, 0, number, total) + padding))
+
+# ilstに対応するアイテムがないタグの名前（その場で書き換えると古い値が残るため、ffmpegで書き換える）
+def unsupported_tags(tags):
+    return sorted(key for key in tags if key not in ILST_TEXT_ITEMS and key not in ("track", "disc"))
+
+# タグ（ffmpegのメタデータ名→値、Noneなら削除）からilstのアイテムを作る
+# clear=Trueなら、指定のないテキストのアイテムとtrkn/diskも削除する（covrなどはそのまま）
+# ilstに対応しないタグがあればValueErrorを送出する
+def ilst_items(tags, clear=False):
+    unsupported = unsupported_tags(tags)
+    if unsupported:
+        raise ValueError(f"ilstに対応していないタグです: {', '.join(unsupported)}")
+    items = {}
+    if clear:
+        items.update({kind: None for kind in ILST_TEXT_ITEMS.values()})
+        items.update({b"trkn": None, b"disk": None})
+    for key, value in tags.items():
+        if key in ("track", "disc"):
+            kind = b"trkn" if key == "track" else b"disk"
+            items[kind] = number_item(kind, value) if value is not None else None
+        else:
+            kind = ILST_TEXT_ITEMS[key]
+            items[kind] = text_item(kind, str(value)) if value is not None else None
+    return items
+
+def read_atom_header(f, offset, file_size):
+    f.seek(offset)
+    size, kind = struct.unpack(">I4s", f.read(8))
+    header = 8
+    if size == 1:
+        size = struct.unpack(">Q", f.read(8))[0]
+        header = 16
+    elif size == 0:
+        size = file_size - offset
+    if size < header:
+        raise ValueError("不正なMP4ファイルです")
+    return size, kind, header
+
+# moovの中のilstだけを書き換える（音声データのmdatには触れない）
+# moovの大きさが変わる場合は、次の順に置き場所を決める
+#   縮む（8バイト以上）      : 新しいmoovの後ろの余りをfreeアトムにする
+#   直後にfree/skipがある    : その領域まで使い、余りをfreeアトムにする
+#   ファイル末尾にある        : そのまま書き込んでファイルの長さを合わせる
+#   それ以外（mdatの前など）   : 元のmoovをfreeアトムに変え、新しいmoovを末尾に追加する
+#                               （mdatの位置は変わらないため、stco/co64の書き換えは不要）
+# 戻り値は書き込んだバイト数
+def retag_mp4_in_place(path, tags, clear=False):
+    items = ilst_items(tags, clear)
+    return rewrite_moov_in_place(path, lambda body: replace_ilst_items(body, items))
+
+# moovの中身をbuild(元のmoovの中身)の結果に置き換える（置き場所の決め方はretag_mp4_in_placeと同じ）
+def rewrite_moov_in_place(path, build):
+    with open(path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        atoms = []
+        offset = 0
+        while offset + 8 <= file_size:
+            size, kind, header = read_atom_header(f, offset, file_size)
+            atoms.append((offset, size, kind, header))
+            offset += size
+        moov_index = next((i for i, atom in enumerate(atoms) if atom[2] == b"moov"), None)
+        if moov_index is None:
+            raise ValueError("moovアトムが見つかりません")
+        offset, size, _, header = atoms[moov_index]
+        f.seek(offset + header)
+        new_moov = mp4_atom(b"moov", build(f.read(size - header)))
+
+        # moovの直後に続くfree/skipの領域と、それより後ろにfree/skip以外のアトムがあるか
+        available = size
+        trailing = True
+        for _, next_size, next_kind, _ in atoms[moov_index + 1:]:
+            if next_kind not in (b"free", b"skip"):
+                trailing = False
+                break
+            available += next_size
+        if trailing:
+            available = file_size - offset
+
+        spare = available - len(new_moov)
+        if spare == 0 or spare >= 8:
+            f.seek(offset)
+            f.write(new_moov)
+            written = len(new_moov)
+            if spare:
+                f.write(struct.pack(">I4s", spare, b"free"))
+                written += 8
+            return written
+        if trailing:
+            f.seek(offset)
+            f.write(new_moov)
+            f.truncate()
+            return len(new_moov)
+
+        # 元のmoovは種別だけをfreeに変え、新しいmoovを末尾に置く
+        f.seek(offset + 4)
+        f.write(b"free")
+        f.seek(0, os.SEEK_END)
+        f.write(new_moov)
+        return 4 + len(new_moov)
+
+# 子アトムを種別で探す：(位置, サイズ, ヘッダ長)、なければNone
+def find_child(data, kind, start=0, end=None):
+    for offset, size, child_kind, header in iter_mp4_atoms(data, start, end):
+        if child_kind == kind:
+            return offset, size, header
+    return None
+
+# パスをたどって子アトムを探す（位置はdata全体の中の位置）
+def find_path(data, path, start=0, end=None):
+    atom = None
+    for kind in path:
+        atom = find_child(data, kind, start, end)
+        if atom is None:
+            return None
+        offset, size, header = atom
+        start, end = offset + header, offset + size
+    return atom
+
+# mvhd/tkhdの長さの欄の位置（versionが0なら32ビット、1なら64ビット）
+MVHD_DURATION = (16, 24)
+TKHD_DURATION = (20, 28)
+
+# フルボックスの長さの欄：(位置, structの形式)
+def duration_field(data, atom, positions):
+    offset, _, header = atom
+    if data[offset + header]:
+        return offset + header + positions[1], ">Q"
+    return offset + header + positions[0], ">I"
+
+def read_duration(data, atom, positions):
+    position, fmt = duration_field(data, atom, positions)
+    return struct.unpack_from(fmt, data, position)[0]
+
+def write_duration(data, atom, positions, value):
+    position, fmt = duration_field(data, atom, positions)
+    struct.pack_into(fmt, data, position, value)
+
+# 音声トラックの情報（moovの中身から読む）
+#   timescale / duration  mdhdのタイムスケールと長さ（エンコーダーの遅延と詰め物を含む）
+#   movie_timescale       mvhdのタイムスケール（elstの長さの単位）
+#   samples / frame_size  stszのサンプル（AACのフレーム）数と、sttsの最大の長さ（1フレームのサンプル数）
+#   elst                  elstの最初の有効なエントリの(位置, バージョン)とmedia_time（なければNone）
+#   tkhd                  tkhdの(位置, サイズ, ヘッダ長)（なければNone）
+def audio_track_info(moov_body):
+    mvhd = find_child(moov_body, b"mvhd")
+    if mvhd is None:
+        raise ValueError("mvhdアトムが見つかりません")
+    offset, _, header = mvhd
+    version = moov_body[offset + header]
+    movie_timescale = struct.unpack(">I", moov_body[offset + header + (20 if version else 12):][:4])[0]
+
+    for trak_offset, trak_size, kind, trak_header in iter_mp4_atoms(moov_body):
+        if kind != b"trak":
+            continue
+        trak_start, trak_end = trak_offset + trak_header, trak_offset + trak_size
+        hdlr = find_path(moov_body, [b"mdia", b"hdlr"], trak_start, trak_end)
+        if hdlr is None or moov_body[hdlr[0] + hdlr[2] + 8:hdlr[0] + hdlr[2] + 12] != b"soun":
+            continue
+
+        offset, _, header = find_path(moov_body, [b"mdia", b"mdhd"], trak_start, trak_end)
+        body = offset + header
+        if moov_body[body]:
+            timescale, duration = struct.unpack(">IQ", moov_body[body + 20:body + 32])
+        else:
+            timescale, duration = struct.unpack(">II", moov_body[body + 12:body + 20])
+
+        stbl = [b"mdia", b"minf", b"stbl"]
+        offset, _, header = find_path(moov_body, stbl + [b"stsz"], trak_start, trak_end)
+        samples = struct.unpack(">I", moov_body[offset + header + 8:offset + header + 12])[0]
+        offset, _, header = find_path(moov_body, stbl + [b"stts"], trak_start, trak_end)
+        entries = struct.unpack(">I", moov_body[offset + header + 4:offset + header + 8])[0]
+        deltas = struct.unpack(f">{entries * 2}I", moov_body[offset + header + 8:offset + header + 8 + entries * 8])
+        frame_size = max(deltas[1::2], default=0)
+
+        elst = None
+        media_time = None
+        atom = find_path(moov_body, [b"edts", b"elst"], trak_start, trak_end)
+        if atom is not None:
+            offset, _, header = atom
+            version = moov_body[offset + header]
+            entries = struct.unpack(">I", moov_body[offset + header + 4:offset + header + 8])[0]
+            entry_size = 20 if version else 12
+            for i in range(entries):
+                entry = offset + header + 8 + i * entry_size
+                if version:
+                    time = struct.unpack(">q", moov_body[entry + 8:entry + 16])[0]
+                else:
+                    time = struct.unpack(">i", moov_body[entry + 4:entry + 8])[0]
+                # media_timeが-1のエントリは空の区間
+                if time >= 0:
+                    elst = (entry, version)
+                    media_time = time
+                    break
+
+        return {
+            "timescale": timescale,
+            "duration": duration,
+            "movie_timescale": movie_timescale,
+            "samples": samples,
+            "frame_size": frame_size,
+            "elst": elst,
+            "media_time": media_time,
+            "tkhd": find_child(moov_body, b"tkhd", trak_start, trak_end),
+        }
+    raise ValueError("音声トラックが見つかりません")
+
+# elstがない場合のAACのエンコーダー遅延（ffmpegのaacエンコーダーの値）
+AAC_PRIMING = 1024
+
+# iTunes形式のギャップレス情報：遅延・詰め物・元のサンプル数（16進数）と、使わない8つの欄
+def itunsmpb(priming, padding, valid):
+    return " " + " ".join([f"{0:08X}", f"{priming:08X}", f"{padding:08X}", f"{valid:016X}"] + [f"{0:08X}"] * 8)
+
+# 音声トラックのエンコーダー遅延と末尾の詰め物を書き込む（iTunSMPBとelst）
+# tkhdとmvhdの長さも詰め物を除いた長さにする（mvhdはすべてのトラックのうち最長）
+# samplesは元の音声のサンプル数（sample_rateのサンプル単位）で、mdhdのタイムスケールに換算する
+# 遅延はelstのmedia_time（なければAAC_PRIMING）、詰め物は最後のフレームの余りのサンプル数
+# 戻り値は {"priming", "padding", "valid", "bytes"}
+def write_gapless_info(path, samples, sample_rate):
+    if samples <= 0:
+        raise ValueError("長さが0の音声にはギャップレス情報を書き込めません")
+    result = {}
+
+    def build(body):
+        info = audio_track_info(body)
+        valid = samples * info["timescale"] // sample_rate
+        priming = info["media_time"] if info["media_time"] is not None else AAC_PRIMING
+        total = info["samples"] * info["frame_size"] or info["duration"]
+        padding = max(0, total - priming - valid)
+        result.update(priming=priming, padding=padding, valid=valid)
+
+        # elstの区間を元の長さに合わせる（再生時に先頭の遅延と末尾の詰め物を除く）
+        body = bytearray(body)
+        duration = valid * info["movie_timescale"] // info["timescale"]
+        if info["elst"] is not None:
+            entry, version = info["elst"]
+            if version:
+                body[entry:entry + 16] = struct.pack(">Qq", duration, priming)
+            else:
+                body[entry:entry + 8] = struct.pack(">Ii", duration, priming)
+        if info["tkhd"] is not None:
+            write_duration(body, info["tkhd"], TKHD_DURATION, duration)
+        tracks = [find_child(body, b"tkhd", offset + header, offset + size)
+                  for offset, size, kind, header in iter_mp4_atoms(body) if kind == b"trak"]
+        longest = max((read_duration(body, tkhd, TKHD_DURATION) for tkhd in tracks if tkhd), default=duration)
+        write_duration(body, find_child(body, b"mvhd"), MVHD_DURATION, longest)
+        item = freeform_item("iTunSMPB", itunsmpb(priming, padding, valid))
+        return replace_ilst_items(bytes(body), {(b"----", "iTunSMPB"): item})
+
+    result["bytes"] = rewrite_moov_in_place(path, build)
+    return result
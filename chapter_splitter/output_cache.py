@@ -0,0 +1,138 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+
+from .utils import get_cache_dir
+
+# 分割済み出力のキャッシュ（内容アドレス）
+# 元ファイルのフィンガープリント・区間・エンコード設定から作る音声キーと、タグのキーで出力を保存する
+# ファイル名や出力先が変わっても同じ内容なら再エンコードせず、キャッシュから出力を作る
+#   <キャッシュ>/outputs/<音声キーの先頭2文字>/<音声キー>.<タグキー><拡張子>
+# 最終利用日時（mtime）の古い順に削除し、合計サイズを上限以下に保つ（LRU）
+
+# キャッシュの上限（MB、CHAPTER_SPLIT_OUTPUT_CACHE_MBで変更可能）
+DEFAULT_LIMIT_MB = 10 * 1024
+
+# LinuxのFICLONE ioctl（Btrfs/XFSなどでデータを共有するコピー）
+FICLONE = 0x40049409
+
+def cache_limit():
+    try:
+        return int(float(os.environ.get("CHAPTER_SPLIT_OUTPUT_CACHE_MB", DEFAULT_LIMIT_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_LIMIT_MB * 1024 * 1024
+
+def entry_path(audio_key, tag_key, extension):
+    return os.path.join(get_cache_dir("outputs", audio_key[:2]), f"{audio_key}.{tag_key}{extension}")
+
+# 同じ音声の出力を探す：(パス, タグも一致するか)、なければ(None, False)
+def find_entry(audio_key, tag_key, extension):
+    path = entry_path(audio_key, tag_key, extension)
+    if os.path.exists(path):
+        return path, True
+    directory = os.path.dirname(path)
+    for name in sorted(os.listdir(directory)):
+        if name.startswith(audio_key + ".") and name.endswith(extension):
+            return os.path.join(directory, name), False
+    return None, False
+
+def reflink(source, dest):
+    import fcntl
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+# reflink → ハードリンク → コピーの順に、使える方法でdestを作る（使った方法を返す）
+# ハードリンクした出力はキャッシュと同じファイルになるため、キャッシュは読み取り専用で保存し、
+# 出力の書き換えでキャッシュが壊れないようにする
+def link_or_copy(source, dest, hardlink=True):
+    # バッチのワーカーは同じプロセスのスレッドなので、一時ファイル名にスレッドも含める
+    temp_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            reflink(source, temp_path)
+            method = "reflink"
+        except (ImportError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            method = "copy"
+            if hardlink:
+                try:
+                    os.link(source, temp_path)
+                    method = "hardlink"
+                except OSError as e:
+                    # 別のファイルシステムやリンク非対応の場合はコピーする
+                    if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+                        raise
+            if method == "copy":
+                shutil.copyfile(source, temp_path)
+        os.replace(temp_path, dest)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return method
+
+# キャッシュから出力を作り、最終利用日時を更新する
+def restore(path, dest):
+    method = link_or_copy(path, dest)
+    os.utime(path)
+    return method
+
+# 出力をキャッシュに保存する（同じキーのものがあれば何もしない）
+# 新しく作った出力は書き換えられるように、ハードリンクではなくreflinkかコピーで保存する
+def store(output_file, audio_key, tag_key):
+    path = entry_path(audio_key, tag_key, os.path.splitext(output_file)[1])
+    if os.path.exists(path):
+        return path
+    link_or_copy(output_file, path, hardlink=False)
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return path
+
+def iter_entries():
+    root = get_cache_dir("outputs")
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            yield path, info.st_size, info.st_mtime
+
+# 件数・合計サイズ・上限・最終利用日時の範囲
+def cache_stats():
+    entries = list(iter_entries())
+    return {
+        "path": get_cache_dir("outputs"),
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "limit": cache_limit(),
+        "oldest": min((mtime for _, _, mtime in entries), default=None),
+        "newest": max((mtime for _, _, mtime in entries), default=None),
+    }
+
+# 最終利用日時の古いものから削除して、合計サイズをlimit以下にする
+# max_ageを指定すると、それより長く使われていないものも削除する（秒）
+def prune(limit=None, max_age=None):
+    limit = cache_limit() if limit is None else limit
+    entries = sorted(iter_entries(), key=lambda entry: entry[2])
+    total = sum(size for _, size, _ in entries)
+    now = time.time()
+    removed = 0
+    removed_bytes = 0
+    for path, size, mtime in entries:
+        if total <= limit and (max_age is None or now - mtime <= max_age):
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        removed_bytes += size
+    return removed, removed_bytes
@@ -0,0 +1,320 @@
+import io
+import itertools
+import re
+
+from .chapters import Chapter, chapters_to_json, clean_title, load_chapters_json, to_chapter_list
+
+# チャプターテキストの読み込み
+# 対応形式：
+#   text      「タイトル H:MM:SS」（従来の形式、「END H:MM:SS」で最終チャプターの終了時刻）
+#             「0:00 タイトル」「1. [00:00] - タイトル」などのYouTube概要欄形式
+#             いずれも「H:MM:SS.mmm」のミリ秒付きの時刻も使える
+#   cue       CUEシート（TRACK / TITLE / PERFORMER / INDEX 01）
+#   ffmetadata  ffmpegのメタデータ形式（[CHAPTER]ブロック）
+# 行を1回だけ順に読み、エラーは行番号付きですべてまとめて報告する
+PARSE_FORMATS = ["auto", "text", "cue", "ffmetadata"]
+
+# エラー表示で列挙する最大件数
+MAX_REPORTED_ERRORS = 20
+
+class ChapterParseError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        lines = [f"{line_no}行目: {message}" if line_no else message for line_no, message in errors]
+        if len(lines) > MAX_REPORTED_ERRORS:
+            lines = lines[:MAX_REPORTED_ERRORS] + [f"...ほか{len(lines) - MAX_REPORTED_ERRORS}件"]
+        super().__init__("\n".join(lines))
+
+# 時刻：H:MM:SS / M:SS（分は2桁以上も可）、末尾に.mmmまたは,mmmのミリ秒
+TIME = r"\d+:\d{2}(?::\d{2})?(?:[.,]\d{1,3})?"
+TIME_PATTERN = re.compile(r"^(\d+):(\d{2})(?::(\d{2}))?(?:[.,](\d{1,3}))?$")
+# 「タイトル 0:00」（従来の形式）
+TIME_LAST_PATTERN = re.compile(rf"^(?P<title>.*?)\s*(?:[-–—|:]\s*)?[\[(]?(?P<start>{TIME})[\])]?$")
+# 「0:00 タイトル」「1. [0:00 - 3:15] タイトル」（YouTube形式）
+TIME_FIRST_PATTERN = re.compile(
+    rf"^(?:\d+[.)]\s*)?[\[(]?(?P<start>{TIME})(?:\s*[-–~]\s*(?P<end>{TIME}))?[\])]?\s*(?:[-–—|:]\s*)?(?P<title>.*)$"
+)
+# 「0:00 タイトル - 3:15」（終了時刻が行末にある範囲形式）
+TIME_RANGE_PATTERN = re.compile(
+    rf"^(?:\d+[.)]\s*)?[\[(]?(?P<start>{TIME})[\])]?\s*(?:[-–—|:]\s*)?(?P<title>.*?)\s*[-–~]\s*[\[(]?(?P<end>{TIME})[\])]?$"
+)
+# 行頭が時刻（番号付きも含む）かどうか
+LEADING_TIME_PATTERN = re.compile(rf"^(?:\d+[.)]\s*)?[\[(]?{TIME}(?!\d)")
+
+def parse_timestamp_ms(text):
+    match = TIME_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"不正な時間形式: {text}")
+    first, second, third, fraction = match.groups()
+    if third is None:
+        minutes, seconds = int(first), int(second)
+        hours = 0
+    else:
+        hours, minutes, seconds = int(first), int(second), int(third)
+        if minutes >= 60:
+            raise ValueError(f"不正な時間形式: {text}")
+    if seconds >= 60:
+        raise ValueError(f"不正な時間形式: {text}")
+    ms = int(fraction.ljust(3, "0")) if fraction else 0
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + ms
+
+# テキスト形式：1行1チャプター（時刻は行末または行頭）
+# (行番号, タイトル, 開始ms, 終了msまたはNone) を順に返し、「END」行は終了時刻として扱う
+def iter_text_entries(lines, errors, state):
+    for line_no, line in lines:
+        text = line.strip()
+        if not text:
+            continue
+        # 行頭が時刻なら範囲形式・時刻が先の形式を優先する（「0:00 Intro - 1:00」を「0:00 Intro」と誤読しない）
+        if LEADING_TIME_PATTERN.match(text):
+            match = TIME_RANGE_PATTERN.match(text) or TIME_FIRST_PATTERN.match(text)
+        else:
+            match = TIME_LAST_PATTERN.match(text) or TIME_FIRST_PATTERN.match(text)
+        if not match:
+            errors.append((line_no, f"無効な行の形式: {text}"))
+            continue
+        try:
+            start_ms = parse_timestamp_ms(match.group("start"))
+            end = match.groupdict().get("end")
+            end_ms = parse_timestamp_ms(end) if end else None
+        except ValueError as e:
+            errors.append((line_no, str(e)))
+            continue
+
+        title = match.group("title").strip()
+        if title.upper() == "END":
+            state["final_end"] = (line_no, start_ms)
+            continue
+        if not title:
+            errors.append((line_no, f"タイトルがありません: {text}"))
+            continue
+        yield line_no, title, start_ms, end_ms
+
+CUE_COMMAND_PATTERN = re.compile(r"^(\w+)\s*(.*)$")
+CUE_INDEX_PATTERN = re.compile(r"^(\d+)\s+(\d+):(\d{2}):(\d{2})$")
+
+def cue_value(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+# CUEシート：TRACKごとのTITLE/PERFORMERとINDEX 01（MM:SS:FF、1秒=75フレーム）
+def iter_cue_entries(lines, errors, state):
+    track = None
+
+    def finish(track):
+        if track["start"] is None:
+            errors.append((track["line_no"], f"TRACK {track['number']}にINDEX 01がありません"))
+            return None
+        title = track["title"] or f"Track {track['number']}"
+        if track["performer"]:
+            title = f"{track['performer']} - {title}"
+        return track["line_no"], title, track["start"], None
+
+    for line_no, line in lines:
+        match = CUE_COMMAND_PATTERN.match(line.strip())
+        if not match:
+            continue
+        command, value = match.group(1).upper(), match.group(2)
+        if command == "TRACK":
+            if track is not None:
+                entry = finish(track)
+                if entry:
+                    yield entry
+            track = {"number": value.split()[0] if value.split() else "?", "line_no": line_no,
+                     "title": None, "performer": None, "start": None}
+        elif track is None:
+            # アルバム全体のTITLE/PERFORMER/FILE/REMは使わない
+            continue
+        elif command == "TITLE":
+            track["title"] = cue_value(value)
+        elif command == "PERFORMER":
+            track["performer"] = cue_value(value)
+        elif command == "INDEX":
+            index = CUE_INDEX_PATTERN.match(value.strip())
+            if not index:
+                errors.append((line_no, f"不正なINDEX: {value.strip()}"))
+                continue
+            number, minutes, seconds, frames = (int(part) for part in index.groups())
+            if seconds >= 60 or frames >= 75:
+                errors.append((line_no, f"不正なINDEX: {value.strip()}"))
+                continue
+            if number == 1:
+                track["start"] = (minutes * 60 + seconds) * 1000 + round(frames * 1000 / 75)
+    if track is not None:
+        entry = finish(track)
+        if entry:
+            yield entry
+
+FFMETADATA_ESCAPE_PATTERN = re.compile(r"\\(.)")
+
+# ffmetadata形式の論理行（末尾の\で次の行に続く）を返す
+def iter_ffmetadata_lines(lines):
+    pending = None
+    for line_no, line in lines:
+        line = line.rstrip("\r\n")
+        if pending is not None:
+            start_no, text = pending
+            line = text + "\n" + line
+            line_no = start_no
+        trailing = len(line) - len(line.rstrip("\\"))
+        if trailing % 2 == 1:
+            pending = (line_no, line[:-1])
+            continue
+        pending = None
+        yield line_no, line
+    if pending is not None:
+        yield pending
+
+# ffmetadata形式：[CHAPTER]ごとのTIMEBASE/START/END/title
+def iter_ffmetadata_entries(lines, errors, state):
+    chapter = None
+
+    def finish(chapter):
+        try:
+            num, den = (int(part) for part in chapter.get("TIMEBASE", "1/1000").split("/"))
+            start = int(chapter["START"])
+            end = int(chapter["END"]) if "END" in chapter else None
+        except (KeyError, ValueError):
+            errors.append((chapter["line_no"], "[CHAPTER]のTIMEBASE/START/ENDが不正です"))
+            return None
+        if den == 0:
+            errors.append((chapter["line_no"], "[CHAPTER]のTIMEBASEが不正です"))
+            return None
+        start_ms = round(start * num * 1000 / den)
+        end_ms = round(end * num * 1000 / den) if end is not None else None
+        title = chapter.get("title") or f"Chapter {chapter['number']}"
+        return chapter["line_no"], title, start_ms, end_ms
+
+    number = 0
+    for line_no, line in iter_ffmetadata_lines(lines):
+        text = line.strip()
+        if not text or text[0] in ";#":
+            continue
+        if text.startswith("["):
+            if chapter is not None:
+                entry = finish(chapter)
+                if entry:
+                    yield entry
+                chapter = None
+            if text.upper() == "[CHAPTER]":
+                number += 1
+                chapter = {"line_no": line_no, "number": number}
+            continue
+        if chapter is None:
+            continue
+        key, sep, value = text.partition("=")
+        if not sep:
+            errors.append((line_no, f"無効な行の形式: {text}"))
+            continue
+        key = key.strip()
+        if key.upper() in ("TIMEBASE", "START", "END"):
+            key = key.upper()
+        else:
+            key = key.lower()
+        chapter[key] = FFMETADATA_ESCAPE_PATTERN.sub(r"\1", value)
+    if chapter is not None:
+        entry = finish(chapter)
+        if entry:
+            yield entry
+
+ENTRY_PARSERS = {
+    "text": iter_text_entries,
+    "cue": iter_cue_entries,
+    "ffmetadata": iter_ffmetadata_entries,
+}
+
+CUE_COMMANDS = {"REM", "FILE", "TRACK", "PERFORMER", "TITLE", "CATALOG", "SONGWRITER", "CDTEXTFILE"}
+
+# 最初の意味のある行から形式を判定する
+def detect_format(line):
+    text = line.strip().lstrip("\ufeff")
+    if text.upper().startswith(";FFMETADATA") or text.upper() == "[CHAPTER]":
+        return "ffmetadata"
+    command = text.split(None, 1)[0].upper() if text else ""
+    if command in CUE_COMMANDS and not TIME_LAST_PATTERN.match(text):
+        return "cue"
+    return "text"
+
+def numbered_lines(source):
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    for line_no, line in enumerate(source, 1):
+        yield line_no, line.rstrip("\r\n")
+
+# テキスト（文字列または行のイテラブル/ファイル）をChapterのリストに変換する
+# 終了時刻のないチャプターは次のチャプターの開始まで、最後のチャプターはEND行・duration_ms・
+# 開始時刻の順で決める。開始時刻の順序・区間の重なりも検証する
+def parse_chapter_list(source, fmt="auto", duration_ms=None):
+    lines = numbered_lines(source)
+    if fmt == "auto":
+        # 空行を読み飛ばして形式を判定し、読んだ行は改めて渡す
+        skipped = []
+        for line_no, line in lines:
+            skipped.append((line_no, line))
+            if line.strip():
+                fmt = detect_format(line)
+                break
+        else:
+            raise ChapterParseError([(None, "テキストを入力してください。")])
+        lines = itertools.chain(skipped, lines)
+    elif fmt not in ENTRY_PARSERS:
+        raise ValueError(f"未対応の形式: {fmt}")
+
+    errors = []
+    state = {}
+    chapters = []
+    previous = None
+    for line_no, title, start_ms, end_ms in ENTRY_PARSERS[fmt](lines, errors, state):
+        if previous is not None:
+            prev_line, prev_title, prev_start, prev_end = previous
+            if start_ms <= prev_start:
+                errors.append((line_no, f"開始時刻が前のチャプター（{prev_line}行目）より前です"))
+                continue
+            if prev_end is None:
+                prev_end = start_ms
+            elif prev_end > start_ms:
+                errors.append((line_no, f"前のチャプター（{prev_line}行目）と区間が重なっています"))
+            chapters.append(Chapter(len(chapters), clean_title(prev_title), prev_start, prev_end))
+        if end_ms is not None and end_ms <= start_ms:
+            errors.append((line_no, "終了時刻が開始時刻より前です"))
+        previous = (line_no, title, start_ms, end_ms)
+
+    if previous is not None:
+        prev_line, prev_title, prev_start, prev_end = previous
+        if prev_end is None:
+            final_end = state.get("final_end")
+            if final_end is not None:
+                if final_end[1] <= prev_start:
+                    errors.append((final_end[0], "END の時刻が最後のチャプターの開始時刻より前です"))
+                prev_end = final_end[1]
+            else:
+                prev_end = duration_ms if duration_ms and duration_ms > prev_start else prev_start
+        chapters.append(Chapter(len(chapters), clean_title(prev_title), prev_start, prev_end))
+
+    if not chapters and not errors:
+        errors.append((None, "チャプターが見つかりませんでした。"))
+    if errors:
+        errors.sort(key=lambda error: error[0] or 0)
+        raise ChapterParseError(errors)
+    return chapters
+
+# {"chapters": [...]}形式（チャプターJSON）で返す
+def parse_chapters(source, fmt="auto", duration_ms=None):
+    return chapters_to_json(parse_chapter_list(source, fmt, duration_ms))
+
+# 「タイトル H:MM:SS」形式などのテキストを{"chapters": [...]}に変換する
+def parse_chapter_text(text):
+    if not text.strip():
+        raise ChapterParseError([(None, "テキストを入力してください。")])
+    return parse_chapters(text)
+
+# チャプターファイルをChapterのリストとして読み込む（.jsonはチャプターJSON、それ以外はテキストを1行ずつ解析）
+def load_chapters_file(path, fmt="auto", duration_ms=None):
+    if path.lower().endswith(".json"):
+        return to_chapter_list(load_chapters_json(path))
+    if fmt == "auto" and path.lower().endswith(".cue"):
+        fmt = "cue"
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        return parse_chapter_list(f, fmt, duration_ms)
@@ -0,0 +1,263 @@
+import mmap
+import os
+import struct
+
+# 非圧縮PCM（WAV / RF64 / AIFF）の高速分割
+# ヘッダを解析してデータチャンクの位置を求め、各チャプターをサンプル境界のバイト範囲として
+# そのまま書き出す（デコード・エンコードを行わない）
+# コピーはcopy_file_range → sendfile → mmapのmemoryviewの順に、使えるものを使う
+
+# 1回のコピーの大きさ（この単位で進捗の通知と中断の確認を行う）
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+# AIFCで扱える非圧縮の形式（sowtはリトルエンディアン）
+AIFC_PCM_TYPES = {b"NONE", b"twos", b"sowt", b"raw "}
+
+# WAVのフォーマット：1は整数PCM、3は浮動小数点、0xFFFEはWAVE_FORMAT_EXTENSIBLE（SubFormatのGUIDで判定）
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# KSDATAFORMAT_SUBTYPE_PCM / _IEEE_FLOAT（先頭2バイトがフォーマット、残りは共通）
+KSDATAFORMAT_SUBTYPES = {
+    struct.pack("<H", code) + b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+    for code in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT)
+}
+
+class PcmInfo:
+    def __init__(self, container, channels, sample_rate, bits, block_align, data_offset, data_size, format_chunk):
+        self.container = container
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits = bits
+        self.block_align = block_align
+        self.data_offset = data_offset
+        self.data_size = data_size
+        # 出力ヘッダにそのまま使うフォーマット情報（WAVはfmt、AIFFはCOMMの中身）
+        self.format_chunk = format_chunk
+
+    @property
+    def extension(self):
+        return ".aiff" if self.container in ("aiff", "aifc") else ".wav"
+
+    @property
+    def frames(self):
+        return self.data_size // self.block_align
+
+    # 秒をサンプル境界のバイト位置（データチャンク内）に変換する
+    def byte_offset(self, seconds):
+        frame = min(max(0, round(seconds * self.sample_rate)), self.frames)
+        return frame * self.block_align
+
+def iter_chunks(f, start, end, byte_order):
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        kind, size = struct.unpack(byte_order + "4sI", f.read(8))
+        yield offset + 8, size, kind
+        # チャンクは2バイト境界に揃えられる
+        offset += 8 + size + (size & 1)
+
+def parse_wav(f, file_size, container):
+    ds64_data_size = None
+    format_chunk = None
+    data = None
+    for body, size, kind in iter_chunks(f, 12, file_size, "<"):
+        if kind == b"ds64":
+            f.seek(body)
+            _, ds64_data_size = struct.unpack("<QQ", f.read(16))
+        elif kind == b"fmt ":
+            f.seek(body)
+            format_chunk = f.read(size)
+        elif kind == b"data":
+            if size == 0xFFFFFFFF and ds64_data_size is not None:
+                size = ds64_data_size
+            data = (body, min(size, file_size - body))
+            break
+    if format_chunk is None or data is None or len(format_chunk) < 16:
+        raise ValueError("WAVのfmt/dataチャンクが見つかりません")
+
+    audio_format, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", format_chunk[:16])
+    if audio_format == WAVE_FORMAT_EXTENSIBLE:
+        # SubFormatがPCM/浮動小数点でなければffmpegで処理する（fmtはそのまま出力に引き継ぐ）
+        if format_chunk[24:40] not in KSDATAFORMAT_SUBTYPES:
+            raise ValueError("非圧縮PCMではありません（WAVE_FORMAT_EXTENSIBLEのSubFormat）")
+    elif audio_format not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        raise ValueError(f"非圧縮PCMではありません（format {audio_format:#x}）")
+    if block_align == 0:
+        raise ValueError("WAVのfmtチャンクが不正です")
+    return PcmInfo(container, channels, sample_rate, bits, block_align, data[0], data[1], format_chunk)
+
+# 80ビット拡張精度浮動小数点（AIFFのサンプルレート）
+def read_extended(data):
+    exponent, mantissa = struct.unpack(">HQ", data[:10])
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return sign * mantissa * 2.0 ** (exponent - 16383 - 63)
+
+def parse_aiff(f, file_size, container):
+    format_chunk = None
+    data = None
+    for body, size, kind in iter_chunks(f, 12, file_size, ">"):
+        if kind == b"COMM":
+            f.seek(body)
+            format_chunk = f.read(size)
+        elif kind == b"SSND":
+            f.seek(body)
+            offset, _ = struct.unpack(">II", f.read(8))
+            data = (body + 8 + offset, min(size - 8 - offset, file_size - body - 8 - offset))
+    if format_chunk is None or data is None or len(format_chunk) < 18:
+        raise ValueError("AIFFのCOMM/SSNDチャンクが見つかりません")
+
+    channels, _, bits = struct.unpack(">hIh", format_chunk[:8])
+    sample_rate = read_extended(format_chunk[8:18])
+    if container == "aifc" and format_chunk[18:22] not in AIFC_PCM_TYPES:
+        raise ValueError(f"非圧縮PCMではありません（{format_chunk[18:22]!r}）")
+    block_align = channels * ((bits + 7) // 8)
+    if block_align <= 0 or sample_rate <= 0:
+        raise ValueError("AIFFのCOMMチャンクが不正です")
+    return PcmInfo(container, channels, int(round(sample_rate)), bits, block_align, data[0], data[1], format_chunk)
+
+# WAV / RF64 / AIFF / AIFCのヘッダを解析する（非圧縮PCMでなければValueError）
+def parse_pcm_header(path):
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        header = f.read(12)
+        if len(header) < 12:
+            raise ValueError("ファイルが短すぎます")
+        if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+            return parse_wav(f, file_size, "wav")
+        if header[:4] in (b"RF64", b"BW64") and header[8:12] == b"WAVE":
+            return parse_wav(f, file_size, "rf64")
+        if header[:4] == b"FORM" and header[8:12] in (b"AIFF", b"AIFC"):
+            return parse_aiff(f, file_size, header[8:12].decode("ascii").lower())
+    raise ValueError("WAV/AIFFファイルではありません")
+
+def info_chunk(tags, byte_order):
+    # WAVはLIST/INFO、AIFFはNAME/AUTHチャンクにタイトルなどを書き込む
+    def chunk(kind, text):
+        payload = text.encode("utf-8")
+        if byte_order == "<":
+            payload += b"\0"
+        if len(payload) & 1:
+            payload += b"\0"
+        return struct.pack(byte_order + "4sI", kind, len(payload)) + payload
+
+    if byte_order == "<":
+        keys = [("title", b"INAM"), ("artist", b"IART"), ("album", b"IPRD"), ("track", b"ITRK"),
+                ("genre", b"IGNR"), ("date", b"ICRD"), ("comment", b"ICMT")]
+        items = b"".join(chunk(kind, tags[key]) for key, kind in keys if tags.get(key))
+        if not items:
+            return b""
+        return struct.pack("<4sI", b"LIST", 4 + len(items)) + b"INFO" + items
+    keys = [("title", b"NAME"), ("artist", b"AUTH")]
+    return b"".join(chunk(kind, tags[key]) for key, kind in keys if tags.get(key))
+
+# 出力ファイルのヘッダ（データ本体の直前まで）
+def build_header(info, data_size, tags):
+    if info.container in ("aiff", "aifc"):
+        frames = data_size // info.block_align
+        # COMMのサンプルフレーム数だけを書き換える（AIFCの圧縮形式名などはそのまま）
+        comm = info.format_chunk[:2] + struct.pack(">I", frames) + info.format_chunk[6:]
+        chunks = struct.pack(">4sI", b"COMM", len(comm)) + comm + (b"\0" if len(comm) & 1 else b"")
+        if info.container == "aifc":
+            # FVER（AIFC Version 1）
+            chunks = struct.pack(">4sII", b"FVER", 4, 0xA2805140) + chunks
+        chunks += info_chunk(tags, ">")
+        ssnd = struct.pack(">4sIII", b"SSND", 8 + data_size, 0, 0)
+        form_size = 4 + len(chunks) + len(ssnd) + data_size + (data_size & 1)
+        return struct.pack(">4sI4s", b"FORM", form_size, info.container.upper().encode("ascii")) + chunks + ssnd
+
+    fmt = struct.pack("<4sI", b"fmt ", len(info.format_chunk)) + info.format_chunk
+    if len(info.format_chunk) & 1:
+        fmt += b"\0"
+    chunks = fmt + info_chunk(tags, "<")
+    riff_size = 4 + len(chunks) + 8 + data_size + (data_size & 1)
+    if riff_size + 36 <= 0xFFFFFFFF:
+        return struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE") + chunks + struct.pack("<4sI", b"data", data_size)
+    # 4GBを超える場合はRF64（サイズはds64チャンクに記録する）
+    ds64 = struct.pack("<4sIQQQI", b"ds64", 28, riff_size + 36, data_size, data_size // info.block_align, 0)
+    return (struct.pack("<4sI4s", b"RF64", 0xFFFFFFFF, b"WAVE") + ds64 + chunks
+            + struct.pack("<4sI", b"data", 0xFFFFFFFF))
+
+# srcのoffsetからlengthバイトをdstの現在位置に書き出す
+# on_copiedはコピーしたバイト数を受け取り、Falseを返すと中断する
+def copy_range(src, dst, mapped, offset, length, on_copied=None):
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append(lambda count: os.copy_file_range(src_fd, dst_fd, count, offset))
+    if hasattr(os, "sendfile"):
+        methods.append(lambda count: os.sendfile(dst_fd, src_fd, offset, count))
+    # mmapのスライスはmemoryview経由でコピーせずに書き込む
+    methods.append(lambda count: os.write(dst_fd, memoryview(mapped)[offset:offset + count]))
+
+    while length > 0:
+        count = min(length, COPY_CHUNK_SIZE)
+        try:
+            written = methods[0](count)
+        except OSError:
+            # ファイルシステムや環境が対応していない場合は次の方法に切り替える
+            if len(methods) == 1:
+                raise
+            methods.pop(0)
+            continue
+        if written <= 0:
+            if len(methods) == 1:
+                raise OSError("PCMデータの書き出しに失敗しました")
+            methods.pop(0)
+            continue
+        offset += written
+        length -= written
+        if on_copied and on_copied(written) is False:
+            return False
+    return True
+
+# チャプターごとにPCMデータの範囲を書き出す
+# 失敗・中断時は書きかけの出力を削除し、完了した出力をcompleted_outputsに入れて例外を送出する
+def split_pcm(info, media_path, split_jobs, metadata, output_tags, on_chapter_done=None, should_stop=None,
+              on_progress=None, cancelled=None):
+    completed = []
+    with open(media_path, "rb") as src:
+        mapped = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) if info.data_size else None
+        try:
+            for index, job in enumerate(split_jobs):
+                start = info.byte_offset(job["start"])
+                end = info.byte_offset(job["end"])
+                length = max(0, end - start)
+                output_file = job["output_file"]
+                copied = [0]
+
+                def on_copied(count):
+                    copied[0] += count
+                    if on_progress and length:
+                        on_progress(index, job, copied[0] / length)
+                    return not (should_stop and should_stop())
+
+                try:
+                    with open(output_file, "wb") as dst:
+                        dst.write(build_header(info, length, output_tags(metadata, job)))
+                        dst.flush()
+                        finished = copy_range(src, dst, mapped, info.data_offset + start, length, on_copied)
+                        if finished and length & 1:
+                            dst.write(b"\0")
+                except BaseException:
+                    if os.path.exists(output_file):
+                        os.remove(output_file)
+                    raise
+                if not finished:
+                    os.remove(output_file)
+                    error = cancelled()
+                    error.completed_outputs = completed
+                    raise error
+
+                completed.append(output_file)
+                if on_progress:
+                    on_progress(index, job, 1.0)
+                if on_chapter_done:
+                    on_chapter_done(index, job)
+        finally:
+            if mapped is not None:
+                mapped.close()
+    return completed
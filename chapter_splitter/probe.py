@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+
+from . import instrument, runner
+from .ffmpeg import get_ffprobe_path, get_ffprobe_version
+from .inputs import get_fetcher, input_path, is_url, media_name
+from .utils import get_cache_dir, write_json_atomic
+
+# メディア情報（チャプター・タグ・ストリーム）を1回のffprobeで取得して保持する
+# 結果はパス・サイズ・更新日時・ffprobeのバージョンをキーにディスクへキャッシュされる
+class MediaProbe:
+    def __init__(self, media_path, data, cache_key=None):
+        self.media_path = media_path
+        self.data = data
+        self.cache_key = cache_key
+        self.format = data.get("format", {})
+        self.streams = data.get("streams", [])
+        self.chapters = data.get("chapters", [])
+
+        self.audio_stream = None
+        self.artwork_stream = None
+        for stream in self.streams:
+            if stream.get("codec_type") == "audio" and self.audio_stream is None:
+                self.audio_stream = stream
+            elif (stream.get("codec_type") == "video" and self.artwork_stream is None
+                    and stream.get("disposition", {}).get("attached_pic")):
+                self.artwork_stream = stream
+
+        # formatタグとストリームタグの両方を確認（特に音声ストリーム）
+        self.tags = {}
+        self.tags.update(self.format.get("tags", {}))
+        if self.audio_stream is not None:
+            self.tags.update(self.audio_stream.get("tags", {}))
+
+    @property
+    def audio_codec(self):
+        return self.audio_stream.get("codec_name") if self.audio_stream else None
+
+    @property
+    def duration(self):
+        try:
+            return float(self.format.get("duration"))
+        except (TypeError, ValueError):
+            return None
+
+    # URLはサイズとETag（なければLast-Modified）で識別する
+    @classmethod
+    def cache_key_for(cls, media_path, ffprobe_path):
+        if is_url(media_path):
+            identity = get_fetcher(media_path).identity()
+        else:
+            stat = os.stat(media_path)
+            identity = [os.path.abspath(media_path), stat.st_size, stat.st_mtime_ns]
+        key = json.dumps(identity + [get_ffprobe_version(ffprobe_path)])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls, media_path, ffprobe_path=None, use_cache=True):
+        ffprobe_path = ffprobe_path or get_ffprobe_path()
+        cache_key = cls.cache_key_for(media_path, ffprobe_path)
+        cache_path = os.path.join(get_cache_dir("probe"), cache_key + ".json")
+
+        if use_cache and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    return cls(media_path, json.load(f), cache_key)
+            except (OSError, ValueError):
+                pass
+
+        # URLの場合、ffprobeはヘッダ（とmoov）の範囲だけを中継サーバー経由で読む
+        cmd = [
+            ffprobe_path, "-i", input_path(media_path),
+            "-print_format", "json",
+            "-show_format",
+            "-show_streams",
+            "-show_chapters",
+            "-loglevel", "error"
+        ]
+        with instrument.span("probe", file=media_name(media_path)):
+            process = runner.run(cmd, "ffprobe", timeout=runner.COMMAND_TIMEOUT)
+        if process.returncode != 0:
+            raise RuntimeError(process.stderr.strip() if process.stderr else "エラーが発生しました")
+
+        data = json.loads(process.stdout)
+        if use_cache:
+            try:
+                write_json_atomic(cache_path, data)
+            except OSError:
+                pass
+        return cls(media_path, data, cache_key)
+
+    # 音声パケットの開始時刻（コピー分割のカット計画用）。同じキーでキャッシュする
+    def packet_times(self, ffprobe_path=None, use_cache=True):
+        cache_path = os.path.join(get_cache_dir("probe"), self.cache_key + ".packets.json") if self.cache_key else None
+        if use_cache and cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        with instrument.span("packet_times", file=media_name(self.media_path)):
+            times = probe_packet_times(ffprobe_path or get_ffprobe_path(), self.media_path)
+        if use_cache and cache_path:
+            try:
+                write_json_atomic(cache_path, times)
+            except OSError:
+                pass
+        return times
+
+# 音声パケットの開始時刻（秒）を昇順で取得
+def probe_packet_times(ffprobe_path, media_path):
+    cmd = [
+        ffprobe_path, "-i", input_path(media_path),
+        "-select_streams", "a:0",
+        "-show_entries", "packet=pts_time",
+        "-print_format", "csv=p=0",
+        "-loglevel", "error"
+    ]
+    # パケットは出力されるそばから読み取る（長いファイルでも出力が続く限りタイムアウトしない）
+    times = []
+
+    def on_line(line):
+        value = line.strip().rstrip(",")
+        if value and value != "N/A":
+            times.append(float(value))
+
+    process = runner.run(cmd, "ffprobe packets", on_stdout=on_line, idle_timeout=runner.STALL_TIMEOUT)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or "パケット情報の取得に失敗しました")
+    times.sort()
+    return times
+
+# 入力ファイルの情報を取得する（キャッシュがあればffprobeを実行しない）
+def probe(media_path, ffprobe_path=None, use_cache=True):
+    return MediaProbe.load(media_path, ffprobe_path, use_cache)
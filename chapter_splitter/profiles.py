@@ -0,0 +1,46 @@
+# 名前付きのエンコードプロファイル
+# 1回の分割で複数指定でき、各チャプターは一度だけデコードしてすべてのエンコーダーに渡す
+#   extension  出力ファイルの拡張子
+#   format     ffmpegの出力フォーマット（-f）
+#   codec      音声のエンコード設定
+#   options    フォーマット固有のオプション
+#   artwork    アートワーク（attached_pic）を格納できるか
+ENCODER_PROFILES = {
+    # ストア配信用：再エンコードで正確な分割、高品質ビットレート
+    "aac256": {
+        "extension": ".m4a",
+        "format": "mp4",
+        "codec": ["-c:a", "aac", "-b:a", "256k"],
+        "options": [],
+        "artwork": True,
+    },
+    # ストリーミング用（Oggのカバー画像はffmpegで書き込めないため格納しない）
+    "opus64": {
+        "extension": ".opus",
+        "format": "opus",
+        "codec": ["-c:a", "libopus", "-b:a", "64k"],
+        "options": [],
+        "artwork": False,
+    },
+    # 古いプレーヤー向け（ID3v2.3で書き込む）
+    "mp3_128": {
+        "extension": ".mp3",
+        "format": "mp3",
+        "codec": ["-c:a", "libmp3lame", "-b:a", "128k"],
+        "options": ["-id3v2_version", "3"],
+        "artwork": True,
+    },
+}
+
+DEFAULT_PROFILE = "aac256"
+
+def get_profile(name):
+    try:
+        return ENCODER_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"不明なエンコードプロファイル: {name}（{', '.join(ENCODER_PROFILES)}）")
+
+# 出力の音声内容を決めるエンコード設定（差分再分割やキャッシュのキーに使う）
+def profile_settings(name):
+    profile = get_profile(name)
+    return profile["codec"] + ["-f", profile["format"]] + profile["options"]
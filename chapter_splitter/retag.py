@@ -0,0 +1,75 @@
+import glob
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import instrument
+from .mp4 import retag_mp4_in_place
+from .output_cache import link_or_copy
+
+# 分割済みのm4aのタグだけを一括で書き換える（再エンコードも音声データの書き換えもしない）
+RETAG_EXTENSIONS = [".m4a", ".m4b", ".mp4"]
+
+# ディレクトリ（再帰）またはglobパターンから書き換え対象のファイルを集める
+def find_retag_files(inputs):
+    files = []
+    seen = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            candidates = sorted(glob.glob(os.path.join(glob.escape(pattern), "**", "*"), recursive=True))
+        else:
+            candidates = sorted(glob.glob(pattern, recursive=True))
+        for path in candidates:
+            path = os.path.abspath(path)
+            if path in seen or not os.path.isfile(path):
+                continue
+            if os.path.splitext(path)[1].lower() in RETAG_EXTENSIONS:
+                seen.add(path)
+                files.append(path)
+    return files
+
+# 出力キャッシュとハードリンクで共有しているファイルは、書き換える前に別のファイルにする
+# 戻り値は複製したバイト数（reflinkできる場合もファイルサイズを数える）
+def break_hardlink(path):
+    info = os.stat(path)
+    if info.st_nlink <= 1:
+        return 0
+    temp_path = path + ".unlink"
+    link_or_copy(path, temp_path, hardlink=False)
+    os.chmod(temp_path, stat.S_IMODE(info.st_mode) | stat.S_IWUSR)
+    os.replace(temp_path, path)
+    return info.st_size
+
+# ファイルごとのタグでilstを書き換える
+# tags_forはパスを受け取り、書き込むタグ（値がNoneなら削除）を返す
+# 戻り値は {"done": [...], "failed": [(パス, エラー), ...], "bytes": 書き込んだバイト数, "copied": 複製したバイト数}
+def retag_files(paths, tags_for, workers=None, clear=False, log=None):
+    log = log or (lambda msg: None)
+    results = {"done": [], "failed": [], "bytes": 0, "copied": 0}
+    lock = threading.Lock()
+
+    def process(path):
+        try:
+            with instrument.span("retag_in_place", file=os.path.basename(path)):
+                copied = break_hardlink(path)
+                written = retag_mp4_in_place(path, tags_for(path), clear)
+        except (OSError, ValueError) as e:
+            log(f"❌ {os.path.basename(path)}: {e}")
+            with lock:
+                results["failed"].append((path, str(e)))
+            return
+        instrument.add_bytes(written=written)
+        with lock:
+            results["done"].append(path)
+            results["bytes"] += written
+            results["copied"] += copied
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or os.cpu_count() or 1)) as executor:
+        list(executor.map(process, paths))
+
+    log(f"🏷 {len(results['done'])}個のファイルのタグを書き換えました"
+        f"（書き込み {results['bytes'] / 1024:.1f}KB、失敗 {len(results['failed'])}）")
+    if results["copied"]:
+        log(f"  🔗 キャッシュと共有していたファイルを複製しました（{results['copied'] / (1024 * 1024):.1f}MB）")
+    return results
@@ -0,0 +1,247 @@
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+
+from . import instrument
+
+# ffmpeg/ffprobeの実行（asyncio）
+# すべての子プロセスはバックグラウンドスレッドで動く1つのイベントループ上で実行し、
+# 標準出力と標準エラーを同時に読みながら、タイムアウト・中断を監視する
+# 中断やタイムアウトの際はSIGTERMを送り、TERMINATE_GRACE秒以内に終了しなければSIGKILLで止める
+# 子プロセスはos.wait4で回収し、プロセスごとのCPU時間・最大RSSを計測に記録する
+
+# should_stopを確認する間隔（秒）
+STOP_POLL_INTERVAL = 0.1
+# SIGTERMからSIGKILLまでの猶予（秒）
+TERMINATE_GRACE = 5.0
+
+# 既定のタイムアウト（秒）
+# COMMAND_TIMEOUTはffprobeやタグの書き換えなど短いコマンドの全体の時間、
+# STALL_TIMEOUTは分割・解析のffmpegの出力が途絶えてからの時間（-progressは0.5秒ごとに出力される）
+COMMAND_TIMEOUT = 300.0
+STALL_TIMEOUT = 300.0
+
+class ProcessTimeout(RuntimeError):
+    def __init__(self, name, timeout):
+        super().__init__(f"{name}が{timeout:.0f}秒以内に応答しなかったため終了しました")
+        self.name = name
+        self.timeout = timeout
+
+class ProcessCancelled(Exception):
+    pass
+
+loop = None
+loop_lock = threading.Lock()
+running = set()
+
+# 共有のイベントループ（初回の呼び出しでバックグラウンドスレッドを起動する）
+def get_loop():
+    global loop
+    with loop_lock:
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="chapter_splitter.runner", daemon=True).start()
+        return loop
+
+# コルーチンを共有ループで実行し、concurrent.futures.Futureを返す
+def submit(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+# 同期処理（チャプターの解析や分割計画など）を共有ループのワーカーで実行する
+def spawn(func, *args):
+    return submit(asyncio.to_thread(func, *args))
+
+# os.wait4で回収する子プロセス（asyncio.subprocess.Processと同じように使える）
+# asyncioの子プロセスはイベントループ側でwaitpidされてrusageが残らないため、
+# プロセスごとのスレッドでwait4し、終了コードとrusageをループに渡す
+class Process:
+    def __init__(self, popen, pipes):
+        self.popen = popen
+        self.pid = popen.pid
+        self.pipes = pipes
+        self.stdout = pipes[0][0]
+        self.stderr = pipes[1][0] if len(pipes) > 1 else None
+        self.returncode = None
+        self.rusage = None
+        current_loop = asyncio.get_running_loop()
+        self.exited = current_loop.create_future()
+        threading.Thread(target=self.reap, args=(current_loop,), name=f"wait4 {self.pid}", daemon=True).start()
+
+    def reap(self, current_loop):
+        try:
+            _, status, usage = os.wait4(self.pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            usage, returncode = None, 255
+        current_loop.call_soon_threadsafe(self.set_exited, returncode, usage)
+
+    def set_exited(self, returncode, usage):
+        # Popen側にも終了コードを入れ、Popenがwaitpidで回収し直さないようにする
+        self.returncode = self.popen.returncode = returncode
+        self.rusage = usage
+        self.exited.set_result(returncode)
+
+    async def wait(self):
+        return await asyncio.shield(self.exited)
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    # 読み込みを打ち切る（止めた子プロセスの子がパイプを開いたままでも待たない）
+    def close_pipes(self):
+        for _, transport in self.pipes:
+            transport.close()
+
+async def pipe_reader(pipe):
+    reader = asyncio.StreamReader()
+    transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), pipe
+    )
+    return reader, transport
+
+# 子プロセスを起動する（wait4のない環境ではasyncioの子プロセスを使い、rusageは記録しない）
+async def start_process(cmd, stderr):
+    if not hasattr(os, "wait4"):
+        return await asyncio.create_subprocess_exec(
+            *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr
+        )
+    popen = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr)
+    pipes = [await pipe_reader(pipe) for pipe in (popen.stdout, popen.stderr) if pipe is not None]
+    return Process(popen, pipes)
+
+# SIGTERMで終了を求め、猶予を過ぎたらSIGKILLで止める
+async def stop_process(process, grace=None):
+    if process.returncode is not None:
+        return
+    grace = TERMINATE_GRACE if grace is None else grace
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), grace)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+async def read_lines(stream, callback, encoding):
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        callback(line.decode(encoding, errors="replace") if encoding else line)
+
+# sizeバイトずつ（最後だけ端数）のbytesを渡す（デコードしたPCMなど行に分かれない出力）
+async def read_chunks(stream, callback, size):
+    while True:
+        try:
+            chunk = await stream.readexactly(size)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                callback(e.partial)
+            break
+        callback(chunk)
+
+# コマンドを実行して終了を待つ
+#   on_stdout/on_stderr  行ごとに呼ばれる（ループのスレッドから呼ばれる）。省略した出力は結果にまとめて返す
+#   timeout              全体の制限時間（秒）
+#   idle_timeout         出力が途絶えてからの制限時間（秒）
+#   should_stop          Trueを返すと中断してProcessCancelledを送出する
+#   partial_files        中断・タイムアウト時に削除する書きかけの出力
+#   stderr               subprocess.STDOUTを指定すると標準エラーを標準出力にまとめる
+#   chunk_size           指定するとon_stdoutには行ではなくchunk_sizeバイトずつのbytesを渡す
+# 戻り値のCompletedProcessのrusageは子プロセスのrusage（取得できない環境ではNone）
+async def run_process(cmd, name, on_stdout=None, on_stderr=None, timeout=None, idle_timeout=None,
+                      should_stop=None, partial_files=(), stderr=subprocess.PIPE, encoding="utf-8", args=None,
+                      chunk_size=None):
+    recorder = instrument.current
+    started = recorder.now() if recorder else None
+    process = await start_process(cmd, stderr)
+    running.add(process)
+
+    current_loop = asyncio.get_running_loop()
+    last_output = [current_loop.time()]
+
+    def touch(callback):
+        def on_line(line):
+            last_output[0] = current_loop.time()
+            callback(line)
+        return on_line
+
+    stdout_chunks, stderr_chunks = [], []
+    if chunk_size:
+        readers = [read_chunks(process.stdout, touch(on_stdout or stdout_chunks.append), chunk_size)]
+    else:
+        readers = [read_lines(process.stdout, touch(on_stdout or stdout_chunks.append), encoding)]
+    if process.stderr is not None:
+        readers.append(read_lines(process.stderr, touch(on_stderr or stderr_chunks.append), encoding))
+    finished = asyncio.ensure_future(asyncio.gather(*readers, process.wait()))
+
+    deadline = current_loop.time() + timeout if timeout else None
+    error = None
+    try:
+        while not finished.done():
+            await asyncio.wait([finished], timeout=STOP_POLL_INTERVAL)
+            if finished.done():
+                break
+            now = current_loop.time()
+            if should_stop and should_stop():
+                error = ProcessCancelled()
+            elif deadline is not None and now > deadline:
+                error = ProcessTimeout(name, timeout)
+            elif idle_timeout and now - last_output[0] > idle_timeout:
+                error = ProcessTimeout(name, idle_timeout)
+            if error is not None:
+                break
+        # 出力の処理（コールバック）で例外が起きた場合もプロセスを止める
+        if error is None and finished.exception() is not None:
+            error = finished.exception()
+    except asyncio.CancelledError:
+        error = ProcessCancelled()
+        raise
+    finally:
+        if error is not None:
+            await stop_process(process)
+            if isinstance(process, Process):
+                process.close_pipes()
+            finished.cancel()
+            finished.add_done_callback(lambda future: future.cancelled() or future.exception())
+            for path in partial_files:
+                if os.path.exists(path):
+                    os.remove(path)
+        running.discard(process)
+        if recorder:
+            recorder.add_process(name, process.pid, started, recorder.now(), getattr(process, "rusage", None),
+                                 dict(args or {}, returncode=process.returncode))
+    if error is not None:
+        raise error
+
+    empty = "" if encoding else b""
+    result = subprocess.CompletedProcess(cmd, process.returncode, empty.join(stdout_chunks), empty.join(stderr_chunks))
+    result.rusage = getattr(process, "rusage", None)
+    return result
+
+# run_processの同期版（呼び出し元のスレッドで終了を待つ）
+def run(cmd, name, **kwargs):
+    return submit(run_process(cmd, name, **kwargs)).result()
+
+# 実行中のすべての子プロセスを止める（アプリ終了時など）
+def shutdown():
+    if loop is None:
+        return
+
+    async def stop_all():
+        await asyncio.gather(*(stop_process(process) for process in list(running)), return_exceptions=True)
+
+    submit(stop_all()).result()
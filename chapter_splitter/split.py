@@ -0,0 +1,831 @@
+import asyncio
+import bisect
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from . import instrument, output_cache, runner
+from .chapters import to_chapter_list
+from .ffmpeg import PROGRESS_ARGS, get_ffmpeg_path, get_ffprobe_path, parse_progress_line, progress_position
+from .fingerprint import source_fingerprint, stable_key
+from .gapless import SAMPLE_PTS_FILTER, job_samples, sample_trim_filter, to_sample, write_gapless_outputs
+from .inputs import input_path, media_name
+from .loudness import DEFAULT_MAX_TRUE_PEAK, DEFAULT_TARGET_LUFS, chapter_gains, format_level, measure_loudness
+from .metadata import inherit_metadata
+from .mp4 import embed_artwork_in_place, retag_mp4_in_place, unsupported_tags
+from .pcm import parse_pcm_header, split_pcm
+from .probe import MediaProbe
+from .profiles import DEFAULT_PROFILE, get_profile, profile_settings
+from .retag import RETAG_EXTENSIONS
+
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv', '.flv', '.webm', '.m4v']
+
+# ファイルの拡張子で動画か音声かを判定（URLはパスの拡張子）
+def is_video_file(media_path):
+    return os.path.splitext(media_name(media_path))[1].lower() in VIDEO_EXTENSIONS
+
+# 既定の出力先：<output_root>/<ファイル名>（output_rootの既定は~/Desktop）
+def default_output_dir(media_path, output_root=None):
+    media_filename = os.path.splitext(media_name(media_path))[0]
+    output_root = output_root or os.path.join(os.path.expanduser("~"), "Desktop")
+    return os.path.join(output_root, media_filename)
+
+def safe_filename(title):
+    return title.replace(" ", "_").replace("/", "_")[:50]
+
+# ジョブの出力ファイル（プロファイルごと）
+def job_output_files(job):
+    return [output["output_file"] for output in job["outputs"]]
+
+# チャプター群を1回のffmpeg実行で書き出すコマンドを組み立てる
+# 入力は一度だけデコードし、asplit/atrimで各チャプターに振り分ける
+# チャプターに複数のプロファイルがある場合は、切り出したPCMをさらにasplitで各エンコーダーに渡す
+# offset/durationを指定すると入力側でシークし、その範囲だけをデコードする
+# artwork_pathを指定すると、抽出済みのアートワークを同じパスで各出力に格納する
+# ジョブにgain（dB、ラウドネスの正規化）があれば、切り出したPCMにvolumeで掛けてからエンコードする
+# sample_rateを指定すると、境界を元の音声のサンプル番号で切り出す（offsetもサンプルの位置に合わせる）
+# 各出力はチャプターの先頭を0にするため、-progressの位置は切り出していない分岐（null出力）から取る
+def build_split_command(ffmpeg_path, media_path, split_jobs, metadata, artwork_path=None, offset=0.0, duration=None,
+                        sample_rate=None):
+    labels = [f"[s{i}]" for i in range(len(split_jobs))] + ["[pos]"]
+    if sample_rate:
+        offset_sample = to_sample(offset, sample_rate)
+        offset = offset_sample / sample_rate
+        filters = [f"[0:a:0]{SAMPLE_PTS_FILTER},asplit={len(labels)}" + "".join(labels)]
+    else:
+        filters = [f"[0:a:0]asplit={len(labels)}" + "".join(labels)]
+    for i, job in enumerate(split_jobs):
+        if sample_rate:
+            start, end = job_samples(job, sample_rate)
+            trim = sample_trim_filter(start - offset_sample, end - offset_sample)
+        else:
+            trim = f"atrim=start={job['start'] - offset:.6f}:end={job['end'] - offset:.6f}"
+        outputs = [f"[c{i}_{k}]" for k in range(len(job["outputs"]))]
+        volume = f",{volume_filter(job['gain'])}" if job.get("gain") else ""
+        fanout = f",asplit={len(outputs)}" if len(outputs) > 1 else ""
+        filters.append(f"[s{i}]{trim},asetpts=PTS-STARTPTS{volume}{fanout}" + "".join(outputs))
+
+    cmd = [ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error"] + PROGRESS_ARGS
+    if offset > 0:
+        cmd.extend(["-ss", f"{offset:.6f}"])
+    if duration is not None:
+        # サンプル単位で切り出す場合は、最後の境界のサンプルが-tで落ちないように少し長めに読む
+        cmd.extend(["-t", f"{duration + (GROUP_TAIL if sample_rate else 0):.6f}"])
+    cmd.extend(["-i", input_path(media_path)])
+    if artwork_path:
+        cmd.extend(["-i", artwork_path])
+    cmd.extend(["-filter_complex", ";".join(filters)])
+
+    for i, job in enumerate(split_jobs):
+        for k, output in enumerate(job["outputs"]):
+            profile = get_profile(output["profile"])
+            # 音声ストリームのマッピングとプロファイルのエンコード設定
+            cmd.extend(["-map", f"[c{i}_{k}]"])
+            cmd.extend(profile["codec"])
+
+            # アートワークは画像入力からコピー（元ファイルを再度開かない）
+            if artwork_path and profile["artwork"]:
+                cmd.extend([
+                    "-map", "1:v:0",
+                    "-c:v", "copy",  # アートワークをコピー
+                    "-disposition:v:0", "attached_pic",  # アートワークとして設定
+                ])
+
+            cmd.extend(["-f", profile["format"]])  # コンテナを明示
+            cmd.extend(profile["options"])
+            cmd.extend(output_metadata_args(metadata, job))
+            cmd.append(output["output_file"])
+
+    cmd.extend(["-map", "[pos]"] + POSITION_OUTPUT)
+    return cmd
+
+# 処理位置を取るための出力（入力側のタイムスタンプのまま捨てる）
+POSITION_OUTPUT = ["-f", "null", "-"]
+
+# サンプル単位の分割でグループの終わりより余分に読む長さ（秒）
+GROUP_TAIL = 0.05
+
+def volume_filter(gain):
+    return f"volume={gain:.2f}dB"
+
+# 無劣化分割：音声パケットをそのままコピーする（再エンコードなし）
+# 出力側の-ss/-toで切り出すため、入力は1回だけ読み込まれる
+# -ssより前の画像パケットは捨てられるため、アートワークは分割後にembed_artwork_in_placeで格納する
+# 各出力は-ssで先頭が0になるため、-progressの位置は入力全体をコピーするnull出力から取る
+def build_copy_command(ffmpeg_path, media_path, split_jobs, metadata):
+    cmd = [ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error"] + PROGRESS_ARGS
+    cmd.extend(["-i", input_path(media_path)])
+
+    for job in split_jobs:
+        cmd.extend([
+            "-map", "0:a:0",
+            "-c:a", "copy",
+            "-ss", f"{job['start']:.6f}",
+            "-to", f"{job['end']:.6f}",
+            "-f", "mp4",
+        ])
+        cmd.extend(output_metadata_args(metadata, job))
+        cmd.append(job["output_file"])
+
+    cmd.extend(["-map", "0:a:0", "-c:a", "copy"] + POSITION_OUTPUT)
+    return cmd
+
+# 元ファイルのattached_pic（カバー画像）を一度だけ画像ファイルとして取り出す
+# 画像パケットはファイル先頭側にあるため、音声データは読み込まない
+ARTWORK_EXTENSIONS = {"mjpeg": ".jpg", "png": ".png", "bmp": ".bmp"}
+
+def extract_artwork(ffmpeg_path, media_path, stream, work_dir, should_stop=None):
+    ext = ARTWORK_EXTENSIONS.get(stream.get("codec_name"), ".jpg")
+    artwork_path = os.path.join(work_dir, "cover" + ext)
+    cmd = [
+        ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error",
+        "-i", input_path(media_path),
+        "-map", f"0:{stream['index']}",
+        "-c", "copy",
+        "-frames:v", "1",
+        "-f", "image2",
+        artwork_path
+    ]
+    process = runner.run(
+        cmd, "ffmpeg artwork", stderr=subprocess.STDOUT, timeout=runner.COMMAND_TIMEOUT,
+        should_stop=should_stop, partial_files=[artwork_path],
+    )
+    if process.returncode != 0 or not os.path.exists(artwork_path):
+        raise RuntimeError(process.stdout.strip() or "アートワークの抽出に失敗しました")
+    return artwork_path
+
+# 出力ファイルに書き込むタグ：継承したメタデータ＋チャプターごとのタイトルとトラック番号
+def output_tags(metadata, job):
+    tags = dict(metadata)
+    tags["title"] = job["title"]
+    tags["track"] = str(job["track"])
+    return tags
+
+# 出力ファイルごとのメタデータ指定
+def output_metadata_args(metadata, job):
+    # メタデータとチャプターをクリアしてから設定
+    args = ["-map_metadata", "-1", "-map_chapters", "-1"]
+
+    # 取得したメタデータとチャプターごとのタイトル・トラック番号を明示的に設定
+    for meta_key, meta_value in output_tags(metadata, job).items():
+        args.extend(["-metadata", f"{meta_key}={meta_value}"])
+    return args
+
+# 出力の音声内容を決めるエンコード設定（差分再分割やキャッシュのキーに使う）
+def encode_settings(mode, profile=DEFAULT_PROFILE):
+    if mode == "copy":
+        return ["-c:a", "copy", "-f", "mp4"]
+    if mode == "pcm":
+        return ["-c:a", "copy", "-f", "pcm"]
+    return profile_settings(profile)
+
+# 音声の内容を決めるキー（元ファイル・区間・エンコード設定・正規化のゲイン）とタグのキー
+def output_fingerprint(source_id, plan, job, profile):
+    settings = encode_settings(plan.mode, profile)
+    if job.get("gain"):
+        settings = settings + ["-af", volume_filter(job["gain"])]
+    audio_key = stable_key(source_id, job["start"], job["end"], settings)
+    tag_key = stable_key(sorted(output_tags(plan.metadata, job).items()))
+    return audio_key, tag_key
+
+PCM_RETAG_FORMATS = {
+    ".wav": ["-f", "wav", "-rf64", "auto"],
+    ".aiff": ["-f", "aiff"],
+}
+
+# 音声はコピーのまま、タグだけを書き換えた一時ファイルを作る
+def retag_output(ffmpeg_path, source_file, temp_file, metadata, job, profile=None):
+    if profile is None:
+        # コピー分割の出力（PCMの分割はWAV/AIFF、それ以外はm4a）
+        container = PCM_RETAG_FORMATS.get(os.path.splitext(source_file)[1].lower(), ["-f", "mp4"])
+    else:
+        container = ["-f", get_profile(profile)["format"]] + get_profile(profile)["options"]
+    cmd = [
+        ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error",
+        "-i", source_file,
+        "-map", "0",
+        "-c", "copy",
+    ] + container
+    cmd.extend(output_metadata_args(metadata, job))
+    cmd.append(temp_file)
+    with instrument.span("retag", file=os.path.basename(temp_file)):
+        process = runner.run(cmd, "ffmpeg retag", timeout=runner.COMMAND_TIMEOUT, partial_files=[temp_file])
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or f"{os.path.basename(source_file)}のタグ更新に失敗しました")
+
+# コピー分割できる音声コーデック（m4aにそのまま格納できるもの）
+COPY_CODECS = {"aac", "alac"}
+
+# 指定時刻に最も近いパケット境界を返す
+def snap_to_packet(packet_times, seconds):
+    index = bisect.bisect_left(packet_times, seconds)
+    candidates = packet_times[max(0, index - 1):index + 1]
+    if not candidates:
+        return seconds
+    return min(candidates, key=lambda t: abs(t - seconds))
+
+# コピー分割用のカット計画：チャプター境界をパケット境界に合わせ、ずれ（秒）を記録する
+# 最終チャプターの終端がファイル末尾以降の場合はそのまま残す
+def plan_copy_cuts(split_jobs, packet_times):
+    planned = []
+    for job in split_jobs:
+        start = job["start"]
+        end = job["end"]
+        snapped_start = snap_to_packet(packet_times, start)
+        snapped_end = snap_to_packet(packet_times, end) if packet_times and end <= packet_times[-1] else end
+        planned.append(dict(
+            job,
+            start=snapped_start,
+            end=snapped_end,
+            start_drift=snapped_start - start,
+            end_drift=snapped_end - end,
+        ))
+    return planned
+
+# チャプターを再生時間がほぼ均等な連続グループに分ける（グループ数は最大jobs）
+def plan_split_groups(split_jobs, jobs):
+    jobs = max(1, min(jobs, len(split_jobs)))
+    total = sum(job["end"] - job["start"] for job in split_jobs)
+    target = total / jobs
+
+    groups = [[]]
+    elapsed = 0.0
+    for index, job in enumerate(split_jobs):
+        groups[-1].append(index)
+        elapsed += job["end"] - job["start"]
+        remaining = len(split_jobs) - index - 1
+        if len(groups) < jobs and remaining and elapsed >= target * len(groups):
+            groups.append([])
+    return groups
+
+# 入力側の処理位置（グループの先頭からの秒）までに書き出し終わったチャプターの数
+# boundsはグループ内の各チャプターの区間（グループの先頭からの秒）
+def chapters_done(bounds, position):
+    done = 0
+    while done < len(bounds) and bounds[done][1] <= position:
+        done += 1
+    return done
+
+# 処理中のチャプターの進捗（0〜1）。処理位置がそのチャプターの区間にない（チャプター間の隙間や
+# 書き出し済み）ならNone
+def chapter_fraction(bounds, done, position):
+    if done >= len(bounds):
+        return None
+    start, end = bounds[done]
+    if end <= start or not start <= position < end:
+        return None
+    return (position - start) / (end - start)
+
+class SplitFailed(Exception):
+    completed_outputs = []
+
+    def __init__(self, track, returncode):
+        super().__init__(f"チャプター{track}の処理に失敗しました（ffmpeg終了コード{returncode}）")
+        self.track = track
+        self.returncode = returncode
+
+class SplitCancelled(Exception):
+    completed_outputs = []
+
+# グループ内の各チャプターの実時間（-progressの位置がチャプター終端を越えた時刻の差）を記録する
+# CPU時間はグループのffmpegのrusageをチャプターの長さで按分した推定値
+def record_chapter_spans(recorder, usage, group_jobs, chapter_times):
+    chapter_times = chapter_times + [recorder.now()] * (len(group_jobs) + 1 - len(chapter_times))
+    cpu = usage.ru_utime + usage.ru_stime if usage else None
+    total = sum(job["end"] - job["start"] for job in group_jobs)
+    for i, job in enumerate(group_jobs):
+        share = (job["end"] - job["start"]) / total if total > 0 else 0.0
+        recorder.add_span(
+            f"chapter {job['track']:02d}", "chapter", chapter_times[i], chapter_times[i + 1],
+            cpu * share if cpu is not None else None, {"title": job["title"], "cpu_estimated": True},
+        )
+
+# グループごとのffmpegを共有のイベントループ（runner）で並列実行する
+# on_progressは処理中のチャプターの進捗（0〜1）をffmpegの-progress出力から通知する
+# on_chapter_doneはエンコードの進捗に合わせてチャプター順に呼ばれるが、MP4の出力は
+# グループのffmpegが終了した時点で確定する。失敗・中断時は実行中のffmpegを止め（SIGTERM、
+# 応答がなければSIGKILL）、確定していない出力を削除してから例外を送出する
+# （例外のcompleted_outputsは確定済みの出力）。出力がSTALL_TIMEOUT秒途絶えたffmpegは失敗として扱う
+# mode="copy"のときは無劣化コピーで、入力を1回読むだけなので並列化しない
+def run_parallel_split(ffmpeg_path, media_path, split_jobs, metadata, jobs, artwork_path=None,
+                       on_chapter_done=None, on_log=None, should_stop=None, mode="encode", on_progress=None,
+                       sample_rate=None):
+    if mode == "copy":
+        groups = [list(range(len(split_jobs)))]
+    else:
+        groups = plan_split_groups(split_jobs, jobs)
+    events = queue.Queue()
+    finalized = set()
+    aborted = threading.Event()
+
+    async def run_group(indices):
+        if mode == "copy":
+            offset = 0.0
+            cmd = build_copy_command(ffmpeg_path, media_path, [split_jobs[i] for i in indices], metadata)
+        else:
+            offset = split_jobs[indices[0]]["start"]
+            duration = split_jobs[indices[-1]]["end"] - offset
+            cmd = build_split_command(
+                ffmpeg_path, media_path, [split_jobs[i] for i in indices],
+                metadata, artwork_path=artwork_path, offset=offset, duration=duration, sample_rate=sample_rate,
+            )
+        if aborted.is_set():
+            return
+
+        bounds = [(split_jobs[i]["start"] - offset, split_jobs[i]["end"] - offset) for i in indices]
+        recorder = instrument.current
+        chapter_times = [recorder.now()] if recorder else None
+        done = 0
+        result = None
+
+        def on_line(line):
+            nonlocal done
+            progress = parse_progress_line(line)
+            if progress is None:
+                if line.strip():
+                    events.put(("log", line.strip()))
+                return
+            position = progress_position(*progress)
+            if position is None:
+                return
+            # 処理位置を過ぎたチャプターは書き出し済み（最後のチャプターはffmpegの終了で確定する）
+            while done < min(chapters_done(bounds, position), len(indices) - 1):
+                events.put(("done", indices[done]))
+                done += 1
+                if recorder:
+                    chapter_times.append(recorder.now())
+            fraction = chapter_fraction(bounds, done, position)
+            if fraction is not None:
+                events.put(("progress", indices[done], fraction))
+
+        try:
+            result = await runner.run_process(
+                cmd, "ffmpeg split", on_stdout=on_line, stderr=subprocess.STDOUT,
+                idle_timeout=runner.STALL_TIMEOUT, should_stop=aborted.is_set, args={"chapters": len(indices)},
+            )
+        except runner.ProcessCancelled:
+            return
+        except runner.ProcessTimeout as e:
+            events.put(("log", f"⚠️ {e}"))
+            events.put(("failed", indices[done], -1))
+            return
+        except Exception:
+            aborted.set()
+            raise
+        finally:
+            if recorder:
+                record_chapter_spans(
+                    recorder, result.rusage if result else None, [split_jobs[i] for i in indices], chapter_times
+                )
+
+        if result.returncode != 0:
+            events.put(("failed", indices[done], result.returncode))
+            return
+        finalized.update(indices)
+        for index in indices[done:]:
+            events.put(("done", index))
+
+    # ワーカー内の例外（ffmpegが見つからない等）は、すべてのグループが終わってからそのまま伝える
+    async def run_groups():
+        results = await asyncio.gather(*(run_group(indices) for indices in groups), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    completed = set()
+    next_index = 0
+    error = None
+
+    future = runner.submit(run_groups())
+    while next_index < len(split_jobs):
+        if should_stop and should_stop():
+            error = SplitCancelled()
+            break
+        if future.done() and events.empty():
+            break
+        try:
+            event = events.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        if event[0] == "log":
+            if on_log:
+                with instrument.timed("callback: log"):
+                    on_log(event[1])
+        elif event[0] == "progress":
+            if on_progress and event[1] not in completed:
+                with instrument.timed("callback: progress"):
+                    on_progress(event[1], split_jobs[event[1]], event[2])
+        elif event[0] == "failed":
+            error = SplitFailed(split_jobs[event[1]]["track"], event[2])
+            break
+        elif event[0] == "done":
+            completed.add(event[1])
+            if on_progress:
+                on_progress(event[1], split_jobs[event[1]], 1.0)
+            while next_index in completed:
+                if on_chapter_done:
+                    with instrument.timed("callback: chapter_done"):
+                        on_chapter_done(next_index, split_jobs[next_index])
+                next_index += 1
+
+    # 中断・失敗時は実行中のffmpegを止め、終了を待ってから出力を片付ける
+    if error is not None:
+        aborted.set()
+    future.result()
+
+    if error is None and next_index < len(split_jobs):
+        error = SplitFailed(split_jobs[next_index]["track"], -1)
+
+    if error is not None:
+        for index in range(len(split_jobs)):
+            if index in finalized:
+                continue
+            for output_file in job_output_files(split_jobs[index]):
+                if os.path.exists(output_file):
+                    os.remove(output_file)
+        error.completed_outputs = [
+            output_file for index in sorted(finalized) for output_file in job_output_files(split_jobs[index])
+        ]
+        raise error
+
+# 分割計画：チャプターごとの出力ファイル・区間・メタデータ
+# 各ジョブのoutputsはプロファイルごとの出力（{"profile", "output_file"}）で、
+# output_fileは最初のプロファイルの出力
+class SplitPlan:
+    def __init__(self, media_path, output_dir, jobs, metadata, mode="encode", probe=None, profiles=None):
+        self.media_path = media_path
+        self.output_dir = output_dir
+        self.jobs = jobs
+        self.metadata = metadata
+        self.mode = mode
+        self.probe = probe
+        self.profiles = profiles or [DEFAULT_PROFILE]
+
+    @property
+    def artwork_stream(self):
+        return self.probe.artwork_stream if self.probe else None
+
+    # 元の音声のサンプルレート（サンプル単位の境界に使う。不明ならNone）
+    @property
+    def sample_rate(self):
+        stream = self.probe.audio_stream if self.probe else None
+        try:
+            return int(stream["sample_rate"]) if stream else None
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @property
+    def output_files(self):
+        return [output_file for job in self.jobs for output_file in job_output_files(job)]
+
+    # 一部のチャプターだけを対象にした計画
+    def subset(self, jobs):
+        return SplitPlan(self.media_path, self.output_dir, jobs, self.metadata, self.mode, self.probe, self.profiles)
+
+# 入力ファイルとチャプターから分割計画を立てる
+# chaptersはChapterまたはffprobe形式の辞書のリストで、省略すると入力ファイル自身のチャプター情報を使う
+# 各ジョブのstart/endは秒（float）
+# profilesは出力するエンコードプロファイル名のリスト（複数指定時はプロファイルごとのサブフォルダに出力）
+# normalizeに"track"/"album"を指定すると、ラウドネスを測ってtarget_lufsに合わせるゲインを各ジョブのgainに入れる
+# （トゥルーピークはmax_true_peak以下に抑える。コピー分割では音量を変えられないため再エンコードになる）
+def plan_split(media_path, chapters=None, output_dir=None, mode="encode", probe=None,
+               ffprobe_path=None, log=None, profiles=None, normalize=None,
+               target_lufs=DEFAULT_TARGET_LUFS, max_true_peak=DEFAULT_MAX_TRUE_PEAK):
+    with instrument.span("plan", file=media_name(media_path)):
+        plan = build_plan(media_path, chapters, output_dir, mode, probe, ffprobe_path, log, profiles, normalize)
+    if normalize:
+        apply_loudness(plan, normalize, target_lufs, max_true_peak, log)
+    return plan
+
+def build_plan(media_path, chapters, output_dir, mode, probe, ffprobe_path, log, profiles, normalize=None):
+    log = log or (lambda msg: None)
+    profiles = list(dict.fromkeys(profiles or [DEFAULT_PROFILE]))
+    for name in profiles:
+        get_profile(name)
+    is_video = is_video_file(media_path)
+    media_filename = os.path.splitext(media_name(media_path))[0]
+
+    # チャプター・タグ・ストリーム情報を1回のffprobeで取得（キャッシュがあれば再利用）
+    if probe is None:
+        try:
+            probe = MediaProbe.load(media_path, ffprobe_path or get_ffprobe_path())
+        except (RuntimeError, ValueError) as e:
+            if chapters is None:
+                raise
+            log(f"⚠️ メタデータの取得に失敗（継続します）: {e}")
+
+    if chapters is None:
+        chapters = probe.chapters
+        if not chapters:
+            raise ValueError("このファイルにはチャプター情報が含まれていません。")
+        log(f"✅ {len(chapters)}個のチャプターを検出しました")
+
+    output_dir = output_dir or default_output_dir(media_path)
+    log(f"💾 出力先: {output_dir}")
+
+    # 元のファイルからメタデータを取得
+    metadata = {}
+    if probe is not None:
+        log(f"🔍 検出されたメタデータタグ: {list(probe.tags.keys())}")
+        metadata = inherit_metadata(probe.tags, is_video, media_filename, log)
+        if metadata:
+            log(f"📋 継承するメタデータ: {list(metadata.keys())}")
+        else:
+            log(f"⚠️ メタデータが見つかりませんでした")
+
+    if normalize and mode == "copy":
+        log("⚠️ コピー分割では音量を調整できないため、正規化のために再エンコードします")
+        mode = "encode"
+
+    # 非圧縮PCM（WAV/RF64/AIFF）はデコードせず、データチャンクをサンプル単位で切り出す
+    pcm_info = None
+    if mode == "copy":
+        try:
+            pcm_info = parse_pcm_header(media_path)
+            mode = "pcm"
+        except (OSError, ValueError):
+            pass
+
+    audio_codec = probe.audio_codec if probe else None
+    if mode == "copy" and audio_codec not in COPY_CODECS:
+        log(f"⚠️ 音声コーデック {audio_codec} はコピー分割できないため再エンコードします")
+        mode = "encode"
+
+    # コピー分割は元の音声をそのままm4a（PCMは元と同じ形式）に格納するため、プロファイルは使わない
+    if mode in ("copy", "pcm"):
+        if profiles != [DEFAULT_PROFILE]:
+            log("⚠️ コピー分割ではエンコードプロファイルは使われません")
+        outputs = [(None, "", pcm_info.extension if pcm_info else ".m4a")]
+    elif len(profiles) == 1:
+        outputs = [(profiles[0], "", get_profile(profiles[0])["extension"])]
+    else:
+        outputs = [(name, name, get_profile(name)["extension"]) for name in profiles]
+
+    split_jobs = []
+    for chapter in to_chapter_list(chapters):
+        title = chapter.title
+        track_number = chapter.index + 1
+
+        filename = f"{track_number:02d}_{safe_filename(title)}"
+        job_outputs = [
+            {"profile": name, "output_file": os.path.join(output_dir, subdir, filename + extension)}
+            for name, subdir, extension in outputs
+        ]
+        split_jobs.append({
+            "start": chapter.start_ms / 1000,
+            "end": chapter.end_ms / 1000,
+            "title": title,
+            "track": track_number,
+            "output_file": job_outputs[0]["output_file"],
+            "outputs": job_outputs,
+        })
+
+    if not split_jobs:
+        raise ValueError("チャプターがありません。")
+
+    # 終了時刻が分からなかった最後のチャプター（END行もduration_msもないテキスト）はファイルの終わりまで
+    last = split_jobs[-1]
+    duration = probe.duration if probe is not None else None
+    if last["end"] <= last["start"]:
+        if not duration or duration <= last["start"]:
+            raise ValueError(f"最後のチャプター（{last['title']}）の終了時刻を決められません。END行を追加してください。")
+        last["end"] = duration
+        log(f"📏 最後のチャプターはファイルの終わり（{duration:.3f}秒）までとします")
+
+    if mode == "copy":
+        # パケット境界に合わせてカット位置を決める
+        log("📐 パケット境界を解析中...")
+        split_jobs = plan_copy_cuts(split_jobs, probe.packet_times(ffprobe_path))
+        for job in split_jobs:
+            log(f"  ↔ {job['track']}: 開始 {job['start_drift'] * 1000:+.1f}ms / 終了 {job['end_drift'] * 1000:+.1f}ms")
+
+    if mode == "pcm":
+        log(f"📐 PCM {pcm_info.container.upper()} {pcm_info.sample_rate}Hz / {pcm_info.channels}ch / "
+            f"{pcm_info.bits}bit：サンプル単位で切り出します")
+
+    if mode == "encode" and len(profiles) > 1:
+        log(f"🎚 エンコードプロファイル: {', '.join(profiles)}")
+    return SplitPlan(media_path, output_dir, split_jobs, metadata, mode, probe, profiles)
+
+# 各チャプター（とアルバム全体）のラウドネスを1回のデコードで測り、正規化のゲインをジョブに入れる
+def apply_loudness(plan, normalize, target_lufs, max_true_peak, log=None):
+    log = log or (lambda msg: None)
+    chapter_measurements, album_measurement = measure_loudness(plan.media_path, plan.jobs, plan.probe, log=log)
+    gains = chapter_gains(chapter_measurements, album_measurement, normalize, target_lufs, max_true_peak)
+    label = "アルバム全体で" if normalize == "album" else "チャプターごとに"
+    log(f"🔊 {label}{target_lufs:.1f} LUFSへ正規化します（トゥルーピーク上限 {max_true_peak:.1f} dBTP）")
+    log(f"  全体: {format_level(album_measurement['integrated'], 'LUFS')} / "
+        f"{format_level(album_measurement['true_peak'], 'dBTP')}")
+    for job, measurement, gain in zip(plan.jobs, chapter_measurements, gains):
+        job["gain"] = round(gain, 2)
+        log(f"  🔊 {job['track']}: {format_level(measurement['integrated'], 'LUFS')} / "
+            f"{format_level(measurement['true_peak'], 'dBTP')} → {gain:+.2f}dB")
+    return plan
+
+# キャッシュにある出力を出力先に作る
+# タグだけが違う場合は、キャッシュの音声をコピーしたままタグを書き換える
+# 戻り値は (作った出力, 残りの出力だけにしたジョブ, そのジョブの元の番号)
+def restore_cached_outputs(plan, source_id, ffmpeg_path, log, on_chapter_done=None, on_progress=None):
+    restored = []
+    methods = {}
+    pending_jobs = []
+    pending_indices = []
+    for index, job in enumerate(plan.jobs):
+        pending = []
+        for output in job["outputs"]:
+            output_file = output["output_file"]
+            audio_key, tag_key = output_fingerprint(source_id, plan, job, output["profile"])
+            extension = os.path.splitext(output_file)[1]
+            path, exact = output_cache.find_entry(audio_key, tag_key, extension)
+            if path is None:
+                pending.append(output)
+                continue
+            temp_file = output_file + ".retag" + extension
+            try:
+                if exact:
+                    method = output_cache.restore(path, output_file)
+                else:
+                    tags = output_tags(plan.metadata, job)
+                    if extension in RETAG_EXTENSIONS and not unsupported_tags(tags):
+                        # m4aはmoovのタグだけを書き換える（ギャップレス情報などのフリーフォームのタグは残る）
+                        output_cache.link_or_copy(path, temp_file, hardlink=False)
+                        os.chmod(temp_file, 0o644)
+                        retag_mp4_in_place(temp_file, tags, clear=True)
+                    else:
+                        retag_output(ffmpeg_path, path, temp_file, plan.metadata, job, output["profile"])
+                    os.replace(temp_file, output_file)
+                    os.utime(path)
+                    output_cache.store(output_file, audio_key, tag_key)
+                    method = "retag"
+            except (OSError, RuntimeError, ValueError) as e:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                log(f"⚠️ {os.path.basename(output_file)} - キャッシュから作成できませんでした（再エンコードします）: {e}")
+                pending.append(output)
+                continue
+            restored.append(output_file)
+            methods[method] = methods.get(method, 0) + 1
+
+        if pending:
+            pending_jobs.append(dict(job, outputs=pending, output_file=pending[0]["output_file"]))
+            pending_indices.append(index)
+            continue
+        if on_progress:
+            on_progress(index, job, 1.0)
+        if on_chapter_done:
+            on_chapter_done(index, job)
+
+    if restored:
+        detail = ", ".join(f"{method} {count}" for method, count in sorted(methods.items()))
+        log(f"♻️ キャッシュから{len(restored)}個の出力を作成しました（{detail}）")
+    return restored, pending_jobs, pending_indices
+
+# 新しく作った出力をキャッシュに保存し、上限を超えた分を古いものから削除する
+def store_cached_outputs(plan, source_id, output_files, log):
+    output_files = set(output_files)
+    with instrument.span("output_cache_store"):
+        try:
+            for job in plan.jobs:
+                for output in job["outputs"]:
+                    if output["output_file"] not in output_files or not os.path.exists(output["output_file"]):
+                        continue
+                    audio_key, tag_key = output_fingerprint(source_id, plan, job, output["profile"])
+                    output_cache.store(output["output_file"], audio_key, tag_key)
+            removed, removed_bytes = output_cache.prune()
+        except OSError as e:
+            log(f"⚠️ 出力をキャッシュに保存できませんでした: {e}")
+            return
+    if removed:
+        log(f"🧹 キャッシュから古い出力を{removed}個（{removed_bytes / (1024 * 1024):.1f}MB）削除しました")
+
+# 分割計画を実行し、出力ファイルの一覧を返す
+# 失敗時はSplitFailed、中断時はSplitCancelledを送出する
+# use_cacheがTrueなら、同じ内容の出力がキャッシュにあれば再エンコードせずに使い、
+# 新しく作った出力はキャッシュに保存する（PCMの切り出しはキャッシュしない）
+def split(plan, jobs=None, ffmpeg_path=None, log=None, on_chapter_done=None, should_stop=None,
+          on_progress=None, use_cache=True):
+    log = log or (lambda msg: None)
+    ffmpeg_path = ffmpeg_path or get_ffmpeg_path()
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    for output_dir in {os.path.dirname(output_file) for output_file in plan.output_files}:
+        os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(plan.output_dir, exist_ok=True)
+
+    if plan.mode == "pcm":
+        return split_pcm_plan(plan, log, on_chapter_done, should_stop, on_progress)
+    if not use_cache:
+        run_split(plan, jobs, ffmpeg_path, log, on_chapter_done, should_stop, on_progress)
+        return plan.output_files
+
+    source_id = source_fingerprint(plan.media_path)
+    with instrument.span("output_cache"):
+        restored, pending_jobs, pending_indices = restore_cached_outputs(
+            plan, source_id, ffmpeg_path, log, on_chapter_done, on_progress
+        )
+    if not pending_jobs:
+        return plan.output_files
+
+    # チャプター番号とジョブは元の計画のものに戻して通知する
+    pending_plan = plan.subset(pending_jobs)
+
+    def pending_chapter_done(index, job):
+        if on_chapter_done:
+            on_chapter_done(pending_indices[index], plan.jobs[pending_indices[index]])
+
+    def pending_progress(index, job, fraction):
+        if on_progress:
+            on_progress(pending_indices[index], plan.jobs[pending_indices[index]], fraction)
+
+    try:
+        run_split(pending_plan, jobs, ffmpeg_path, log, pending_chapter_done, should_stop, pending_progress)
+    except (SplitFailed, SplitCancelled) as e:
+        store_cached_outputs(pending_plan, source_id, e.completed_outputs, log)
+        e.completed_outputs = restored + e.completed_outputs
+        raise
+    store_cached_outputs(pending_plan, source_id, pending_plan.output_files, log)
+    return plan.output_files
+
+# 分割計画をffmpegで実行する
+def run_split(plan, jobs, ffmpeg_path, log, on_chapter_done=None, should_stop=None, on_progress=None):
+    # キャッシュとハードリンクで共有している出力は、上書きする前にリンクを外す
+    for output_file in plan.output_files:
+        if os.path.exists(output_file) and os.stat(output_file).st_nlink > 1:
+            os.remove(output_file)
+
+    # アートワークを一度だけ取り出し、分割パスの中で各出力に格納する
+    work_dir = tempfile.mkdtemp(prefix="chapter_split_")
+    try:
+        artwork_path = None
+        if plan.artwork_stream is not None:
+            try:
+                with instrument.span("artwork_extract"):
+                    artwork_path = extract_artwork(
+                        ffmpeg_path, plan.media_path, plan.artwork_stream, work_dir, should_stop
+                    )
+                log(f"🎨 アートワークを抽出しました: {os.path.basename(artwork_path)}")
+            except runner.ProcessCancelled:
+                raise SplitCancelled()
+            except Exception as e:
+                log(f"⚠️ アートワークの抽出に失敗（継続します）: {e}")
+
+        if plan.mode == "copy":
+            log(f"▶️ {len(plan.jobs)}チャプターを無劣化コピーで分割します")
+        else:
+            # チャプターをグループに分け、各グループを1回のデコードで並列に書き出す
+            log(f"▶️ {len(plan.jobs)}チャプターを並列数{jobs}で分割します")
+
+        # 確定した出力には、失敗・中断した場合もギャップレス情報を書き込んでおく（キャッシュに保存されるため）
+        try:
+            with instrument.span("split", mode=plan.mode, chapters=len(plan.jobs), jobs=jobs):
+                run_parallel_split(
+                    ffmpeg_path, plan.media_path, plan.jobs, plan.metadata, jobs,
+                    artwork_path=artwork_path if plan.mode == "encode" else None,
+                    on_chapter_done=on_chapter_done, on_log=log, should_stop=should_stop,
+                    mode=plan.mode, on_progress=on_progress, sample_rate=plan.sample_rate,
+                )
+        except (SplitFailed, SplitCancelled) as e:
+            write_gapless_outputs(plan, e.completed_outputs, log)
+            raise
+        write_gapless_outputs(plan, plan.output_files, log)
+
+        # コピー分割の場合は、各出力のmoovにアートワークを直接書き込む（音声データは再書き込みしない）
+        if plan.mode == "copy" and artwork_path:
+            log("🎨 アートワークを追加中...")
+            for job in plan.jobs:
+                try:
+                    with instrument.span("artwork_embed"):
+                        embedded = embed_artwork_in_place(job["output_file"], artwork_path)
+                except (OSError, ValueError) as e:
+                    log(f"  ⚠️ {os.path.basename(job['output_file'])} - アートワーク追加失敗: {e}")
+                    continue
+                if not embedded:
+                    log(f"  ⚠️ {os.path.basename(job['output_file'])} - moovが末尾にないため追加できません")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # ffmpegの読み書きは子プロセスのrusage（ブロック入出力）として記録される
+    return plan.output_files
+
+# 非圧縮PCMの分割：ffmpegを使わず、データチャンクの範囲をそのまま書き出す
+# WAV/AIFFにはカバー画像を格納しないため、アートワークは扱わない
+def split_pcm_plan(plan, log, on_chapter_done=None, should_stop=None, on_progress=None):
+    info = parse_pcm_header(plan.media_path)
+    log(f"▶️ {len(plan.jobs)}チャプターをPCMのまま切り出します")
+    with instrument.span("split", mode=plan.mode, chapters=len(plan.jobs), jobs=1):
+        split_pcm(
+            info, plan.media_path, plan.jobs, plan.metadata, output_tags,
+            on_chapter_done=on_chapter_done, should_stop=should_stop, on_progress=on_progress,
+            cancelled=SplitCancelled,
+        )
+
+    # 読み込んだのはヘッダとチャプターのデータの範囲だけ
+    read = info.data_offset + sum(
+        max(0, info.byte_offset(job["end"]) - info.byte_offset(job["start"])) for job in plan.jobs
+    )
+    written = sum(os.path.getsize(path) for path in plan.output_files if os.path.exists(path))
+    instrument.add_bytes(read=read, written=written)
+    return plan.output_files
@@ -0,0 +1,26 @@
+import json
+import os
+import sys
+import threading
+
+# キャッシュの保存先（CHAPTER_SPLIT_CACHE_DIRで変更可能）
+def get_cache_dir(*parts):
+    base = os.environ.get("CHAPTER_SPLIT_CACHE_DIR")
+    if not base:
+        if sys.platform == "darwin":
+            base = os.path.join(os.path.expanduser("~"), "Library", "Caches", "AudioChapterSplitter")
+        else:
+            base = os.path.join(
+                os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                "audio_chapter_splitter",
+            )
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# JSONを一時ファイル経由で書き込む（途中で中断されても壊れたキャッシュを残さない）
+def write_json_atomic(path, data):
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
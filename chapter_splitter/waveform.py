@@ -0,0 +1,231 @@
+import json
+import math
+import mmap
+import os
+import sys
+import threading
+from array import array
+
+from . import instrument, runner
+from .analysis import decode_pcm_command
+from .ffmpeg import get_ffmpeg_path, get_ffplay_path
+from .fingerprint import source_fingerprint, stable_key
+from .inputs import input_path, media_name
+from .probe import MediaProbe
+from .utils import get_cache_dir
+
+# NumPyがあればブロックごとの最小・最大をまとめて計算し、キャッシュをmemmapで開く
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 波形の概要（ピーク）：境界の確認用に、ブロックごとの最小・最大を何段階かの解像度で持つ
+# 1回のデコード（低いサンプルレートのモノラル）で一番細かい段を作り、そこから粗い段を順に作る
+# 元ファイルの内容（フィンガープリント）ごとにキャッシュし、2回目以降は開くだけで表示できる
+#   <キャッシュ>/waveform/<キーの先頭2文字>/<キー>.peaks  各段の(最小, 最大)をint16（リトルエンディアン）で連結
+#   <キャッシュ>/waveform/<キーの先頭2文字>/<キー>.json   サンプルレート・長さ・各段の位置（.peaksの後に書く）
+
+WAVEFORM_SAMPLE_RATE = 8000
+# 一番細かい段の1ブロックのサンプル数（10ms）と、段ごとに粗くする倍率
+BASE_BLOCK = 80
+LEVEL_FACTOR = 4
+# ブロック数がこれより少なくなったら、それ以上粗い段は作らない
+MIN_LEVEL_BLOCKS = 512
+# 一度に読み込むブロック数
+READ_BLOCKS = 4096
+
+# 試聴する範囲（クリックした位置の前後の秒数）
+PREVIEW_BEFORE = 2.0
+PREVIEW_AFTER = 2.0
+
+def cache_paths(media_path):
+    key = stable_key(source_fingerprint(media_path), WAVEFORM_SAMPLE_RATE, BASE_BLOCK, LEVEL_FACTOR)
+    directory = get_cache_dir("waveform", key[:2])
+    return os.path.join(directory, key + ".peaks"), os.path.join(directory, key + ".json")
+
+# PCM（s16le）をblockサンプルずつに分け、(最小, 最大)を交互に並べたarrayで返す
+def block_peaks(data, block):
+    if np is not None:
+        samples = np.frombuffer(data, dtype="<i2")
+        count = -(-len(samples) // block)
+        starts = np.arange(count) * block
+        peaks = np.empty(count * 2, dtype=np.int16)
+        peaks[0::2] = np.minimum.reduceat(samples, starts)
+        peaks[1::2] = np.maximum.reduceat(samples, starts)
+        result = array("h")
+        result.frombytes(peaks.tobytes())
+        return result
+
+    samples = array("h")
+    samples.frombytes(data)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    result = array("h")
+    for start in range(0, len(samples), block):
+        chunk = samples[start:start + block]
+        result.append(min(chunk))
+        result.append(max(chunk))
+    return result
+
+# 1つ前の段の(最小, 最大)をfactorブロックずつまとめた段を作る
+def reduce_peaks(peaks, factor):
+    if np is not None:
+        pairs = np.frombuffer(peaks, dtype=np.int16).reshape(-1, 2)
+        starts = np.arange(0, len(pairs), factor)
+        reduced = np.empty(len(starts) * 2, dtype=np.int16)
+        reduced[0::2] = np.minimum.reduceat(pairs[:, 0], starts)
+        reduced[1::2] = np.maximum.reduceat(pairs[:, 1], starts)
+        result = array("h")
+        result.frombytes(reduced.tobytes())
+        return result
+
+    result = array("h")
+    for start in range(0, len(peaks), factor * 2):
+        chunk = peaks[start:start + factor * 2]
+        result.append(min(chunk[0::2]))
+        result.append(max(chunk[1::2]))
+    return result
+
+# 音声を1回デコードして各段のピークを作る（段のリストを細かい順に返す）
+# 中断するとrunner.ProcessCancelled、出力が途絶えたffmpegはrunner.ProcessTimeoutになる
+def build_levels(media_path, ffmpeg_path=None, should_stop=None, on_progress=None):
+    ffmpeg_path = ffmpeg_path or get_ffmpeg_path()
+    duration = None
+    if on_progress:
+        try:
+            duration = MediaProbe.load(media_path).duration
+        except (RuntimeError, ValueError):
+            pass
+
+    base = array("h")
+
+    # 受け取るのはブロックの倍数なので、端数は最後にだけ出る
+    def on_data(data):
+        base.extend(block_peaks(data[:len(data) // 2 * 2], BASE_BLOCK))
+        if duration:
+            on_progress(min(1.0, len(base) // 2 * BASE_BLOCK / WAVEFORM_SAMPLE_RATE / duration))
+
+    process = runner.run(
+        decode_pcm_command(ffmpeg_path, media_path, WAVEFORM_SAMPLE_RATE), "ffmpeg waveform",
+        on_stdout=on_data, chunk_size=BASE_BLOCK * 2 * READ_BLOCKS,
+        idle_timeout=runner.STALL_TIMEOUT, should_stop=should_stop,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or "音声のデコードに失敗しました")
+    if not base:
+        raise ValueError("音声がありません")
+
+    levels = [base]
+    while len(levels[-1]) // 2 > MIN_LEVEL_BLOCKS:
+        levels.append(reduce_peaks(levels[-1], LEVEL_FACTOR))
+    return levels
+
+# 各段を.peaksに、位置と長さを.jsonに書き込む（一時ファイル経由）
+def save_levels(levels, data_path, meta_path, duration):
+    meta = {
+        "version": 1,
+        "sample_rate": WAVEFORM_SAMPLE_RATE,
+        "duration": duration,
+        "levels": [],
+    }
+    offset = 0
+    temp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        for index, level in enumerate(levels):
+            meta["levels"].append({"block": BASE_BLOCK * LEVEL_FACTOR ** index, "offset": offset, "count": len(level) // 2})
+            if sys.byteorder == "big":
+                level = array("h", level)
+                level.byteswap()
+            level.tofile(f)
+            offset += len(level)
+    os.replace(temp_path, data_path)
+
+    temp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(temp_path, meta_path)
+    return meta
+
+# キャッシュした波形の概要（ファイルはmmapで開くため、長いファイルでも読み込みを待たない）
+class WaveformOverview:
+    def __init__(self, meta, data_path):
+        self.sample_rate = meta["sample_rate"]
+        self.duration = meta["duration"]
+        self.levels = meta["levels"]
+        if np is not None:
+            self.mmap = None
+            self.values = np.memmap(data_path, dtype="<i2", mode="r")
+        elif sys.byteorder == "little":
+            with open(data_path, "rb") as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.values = memoryview(self.mmap).cast("h")
+        else:
+            # ビッグエンディアンではバイト順を入れ替える必要があるため、読み込んでから並べ替える
+            self.mmap = None
+            self.values = array("h")
+            with open(data_path, "rb") as f:
+                self.values.frombytes(f.read())
+            self.values.byteswap()
+
+    def close(self):
+        if self.mmap is not None:
+            self.values.release()
+            self.mmap.close()
+        self.values = None
+
+    # start〜end秒をwidth列に分けた各列の(最小, 最大)（-1〜1）。音声の範囲外の列はNone
+    # 1列に1ブロック以上が入る最も粗い段を使うため、拡大率によらず読み込む量はほぼ一定
+    def peaks(self, start, end, width):
+        width = max(1, int(width))
+        column_seconds = max(end - start, 1e-9) / width
+        level = self.levels[0]
+        for candidate in self.levels[1:]:
+            if candidate["block"] / self.sample_rate > column_seconds:
+                break
+            level = candidate
+
+        block_seconds = level["block"] / self.sample_rate
+        columns = []
+        for x in range(width):
+            first = max(0, int((start + x * column_seconds) / block_seconds))
+            last = min(level["count"], max(first + 1, math.ceil((start + (x + 1) * column_seconds) / block_seconds)))
+            if first >= level["count"] or start + x * column_seconds < 0:
+                columns.append(None)
+                continue
+            values = self.values[level["offset"] + first * 2:level["offset"] + last * 2]
+            columns.append((int(min(values[0::2])) / 32768.0, int(max(values[1::2])) / 32768.0))
+        return columns
+
+# 波形の概要をキャッシュから開く（なければ1回のデコードで作ってから開く）
+def load_overview(media_path, ffmpeg_path=None, use_cache=True, log=None, should_stop=None, on_progress=None):
+    log = log or (lambda msg: None)
+    data_path, meta_path = cache_paths(media_path)
+    if use_cache and os.path.exists(meta_path) and os.path.exists(data_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return WaveformOverview(json.load(f), data_path)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    log(f"🌊 波形を解析中: {media_name(media_path)}")
+    with instrument.span("waveform", file=media_name(media_path)):
+        levels = build_levels(media_path, ffmpeg_path, should_stop, on_progress)
+        duration = len(levels[0]) // 2 * BASE_BLOCK / WAVEFORM_SAMPLE_RATE
+        meta = save_levels(levels, data_path, meta_path, duration)
+    log(f"🌊 波形の概要を保存しました（{len(levels)}段、{os.path.getsize(data_path) / 1024:.0f}KB）")
+    return WaveformOverview(meta, data_path)
+
+# secondsの前後を試聴する（ffplayの入力側のシークで、その範囲だけをデコードする）
+# 再生は共有のrunnerで実行し、待たずにconcurrent.futures.Futureを返す
+# （cancel()で再生を止める。runner.shutdown()でも止まる）
+def play_snippet(media_path, seconds, before=PREVIEW_BEFORE, after=PREVIEW_AFTER, ffplay_path=None):
+    start = max(0.0, seconds - before)
+    cmd = [
+        ffplay_path or get_ffplay_path(), "-hide_banner", "-loglevel", "error",
+        "-nodisp", "-autoexit",
+        "-ss", f"{start:.3f}",
+        "-t", f"{seconds + after - start:.3f}",
+        input_path(media_path),
+    ]
+    return runner.submit(runner.run_process(cmd, "ffplay", timeout=runner.COMMAND_TIMEOUT))
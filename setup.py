@@ -17,6 +17,11 @@ OPTIONS = {
 setup(
     app=APP,
     name='AudioChapterSplitter',
+    version='1.0.0',
+    packages=['chapter_splitter'],
+    entry_points={
+        'console_scripts': ['chapter-split=chapter_splitter.cli:main'],
+    },
     data_files=DATA_FILES,
     options={'py2app': OPTIONS},
     setup_requires=['py2app'],
@@ -1,50 +1,61 @@
+import argparse
 import json
 import os
-import subprocess
+import queue
 import sys
-import threading
 import traceback
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, ttk
-import re
-
-def clean_title(title):
-    return re.sub(r"^\d+\.\s*", "", title)
-
-def parse_time_to_ms(time_str):
-    if not re.match(r'^\d{1,2}:\d{2}(:\d{2})?$', time_str):
-        raise ValueError(f"不正な時間形式: {time_str}")
-    parts = list(map(int, time_str.split(":")))
-    if len(parts) == 3:
-        return (parts[0] * 3600 + parts[1] * 60 + parts[2]) * 1000
-    elif len(parts) == 2:
-        return (parts[0] * 60 + parts[1]) * 1000
-    return 0
-
-def format_ms(ms):
-    return f"{ms / 1000.0:.6f}"
-
-def get_ffmpeg_path():
-    for path in ["/usr/local/bin/ffmpeg", "/opt/homebrew/bin/ffmpeg", "ffmpeg"]:
-        if os.path.exists(path) and os.access(path, os.X_OK):
-            return path
-    return "ffmpeg"
-
-def get_ffprobe_path():
-    for path in ["/usr/local/bin/ffprobe", "/opt/homebrew/bin/ffprobe", "ffprobe"]:
-        if os.path.exists(path) and os.access(path, os.X_OK):
-            return path
-    return "ffprobe"
+from tkinter import filedialog, messagebox, scrolledtext, simpledialog, ttk
+
+from chapter_splitter import (
+    DEFAULT_PROFILE,
+    ENCODER_PROFILES,
+    MediaProbe,
+    SplitCancelled,
+    SplitFailed,
+    default_output_dir,
+    detect_chapter_list,
+    get_ffmpeg_path,
+    get_ffprobe_path,
+    incremental_split,
+    instrument,
+    is_url,
+    is_video_file,
+    load_chapters_file,
+    load_overview,
+    media_name,
+    parse_chapter_list,
+    parse_chapter_text,
+    plan_split,
+    play_snippet,
+    run_batch,
+    runner,
+    save_chapters_json,
+    split,
+    to_chapter_list,
+)
+
+# ワーカーからのイベントを反映する間隔、1回に処理するイベント数、ログの最大行数
+DRAIN_INTERVAL_MS = 50
+MAX_EVENTS_PER_DRAIN = 2000
+MAX_LOG_LINES = 5000
+
+# 計測結果（Chrome trace形式）のファイル名
+TRACE_FILENAME = "chapter_split_trace.json"
+
+# 波形ウィンドウ：境界をクリックとみなす距離（ピクセル）と、拡大の上限（表示する最短の秒数）
+MARKER_HIT_PX = 6
+MIN_VIEW_SECONDS = 1.0
 
 # アプリケーションのエラーハンドリング
 def handle_exception(exc_type, exc_value, exc_traceback):
     if issubclass(exc_type, KeyboardInterrupt):
         sys.__excepthook__(exc_type, exc_value, exc_traceback)
         return
-    
+
     error_msg = ''.join(traceback.format_exception(exc_type, exc_value, exc_traceback))
     print(f"エラーが発生しました:\n{error_msg}", file=sys.stderr)
-    
+
     # GUIが利用可能な場合は、エラーダイアログを表示
     try:
         import tkinter.messagebox as mb
@@ -52,118 +63,204 @@ def handle_exception(exc_type, exc_value, exc_traceback):
     except:
         pass
 
-sys.excepthook = handle_exception
-
-try:
-    root = tk.Tk()
-    root.title("チャプター分割ツール")
-    root.geometry("600x750")
-except Exception as e:
-    print(f"GUIの初期化に失敗しました: {e}", file=sys.stderr)
-    import tkinter.messagebox as mb
-    mb.showerror("エラー", f"アプリケーションの起動に失敗しました:\n{e}")
-    sys.exit(1)
-
-# macOSでウィンドウを前面に表示
-root.lift()
-root.attributes('-topmost', True)
-root.after_idle(root.attributes, '-topmost', False)
-
-# 処理停止フラグ
-stop_flag = False
-
-def stop_processing():
-    global stop_flag
-    stop_flag = True
-    log("⚠️ 処理を中断します...")
-
-progress_var = tk.DoubleVar()
-progress_bar = ttk.Progressbar(root, variable=progress_var, maximum=100)
-progress_bar.pack(fill="x", padx=10, pady=10)
-
-current_label = tk.Label(root, text="現在のチャプター: 未処理")
-current_label.pack(padx=10, pady=(0, 5))
-
-output_box = scrolledtext.ScrolledText(root, wrap="word", height=12)
-output_box.pack(padx=10, pady=10, fill="both", expand=True)
+def ask_save_json_path():
+    # JSONファイルの保存先を選択
+    desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
+    return filedialog.asksaveasfilename(
+        title="JSONファイルを保存",
+        initialdir=desktop_path,
+        initialfile="chapters.json",
+        defaultextension=".json",
+        filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+    )
 
-text_input = scrolledtext.ScrolledText(root, wrap="word", height=12)
-text_input.pack(padx=10, pady=(10, 5), fill="both", expand=True)
+# 処理はすべてchapter_splitterに委ね、ここではダイアログと表示だけを扱う
+class ChapterSplitterApp:
+    def __init__(self, root, jobs, mode):
+        self.root = root
 
-def log(msg):
-    output_box.insert(tk.END, msg + "\n")
-    output_box.see(tk.END)
-    root.update_idletasks()
+        # 処理停止フラグ
+        self.stop_flag = False
+
+        # ワーカースレッドからのログ・進捗・ダイアログのキュー
+        self.events = queue.Queue()
+
+        self.progress_var = tk.DoubleVar()
+        progress_bar = ttk.Progressbar(root, variable=self.progress_var, maximum=100)
+        progress_bar.pack(fill="x", padx=10, pady=10)
+
+        self.current_label = tk.Label(root, text="現在のチャプター: 未処理")
+        self.current_label.pack(padx=10, pady=(0, 5))
+
+        self.output_box = scrolledtext.ScrolledText(root, wrap="word", height=12)
+        self.output_box.pack(padx=10, pady=10, fill="both", expand=True)
+
+        self.text_input = scrolledtext.ScrolledText(root, wrap="word", height=12)
+        self.text_input.pack(padx=10, pady=(10, 5), fill="both", expand=True)
+
+        jobs_frame = tk.Frame(root)
+        jobs_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(jobs_frame, text="並列数:").pack(side="left")
+        self.jobs_var = tk.IntVar(value=max(1, jobs))
+        tk.Spinbox(jobs_frame, from_=1, to=256, textvariable=self.jobs_var, width=5).pack(side="left")
+
+        # 分割モード：正確（再エンコード）／高速（無劣化コピー）
+        mode_frame = tk.Frame(root)
+        mode_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(mode_frame, text="分割モード:").pack(side="left")
+        self.mode_var = tk.StringVar(value=mode)
+        tk.Radiobutton(mode_frame, text="正確（再エンコード）", variable=self.mode_var, value="encode").pack(side="left")
+        tk.Radiobutton(mode_frame, text="高速（コピー）", variable=self.mode_var, value="copy").pack(side="left")
+
+        # 出力するエンコードプロファイル（複数選択すると1回のデコードでまとめて書き出す）
+        profile_frame = tk.Frame(root)
+        profile_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(profile_frame, text="出力形式:").pack(side="left")
+        self.profile_vars = {}
+        for name in ENCODER_PROFILES:
+            self.profile_vars[name] = tk.BooleanVar(value=name == DEFAULT_PROFILE)
+            tk.Checkbutton(profile_frame, text=name, variable=self.profile_vars[name]).pack(side="left")
+
+        # ラウドネスの正規化：チャプターごと／アルバム全体で目標ラウドネスに合わせる
+        normalize_frame = tk.Frame(root)
+        normalize_frame.pack(fill="x", padx=10, pady=5)
+        tk.Label(normalize_frame, text="音量の正規化:").pack(side="left")
+        self.normalize_var = tk.StringVar(value="")
+        tk.Radiobutton(normalize_frame, text="なし", variable=self.normalize_var, value="").pack(side="left")
+        tk.Radiobutton(normalize_frame, text="チャプターごと", variable=self.normalize_var, value="track").pack(side="left")
+        tk.Radiobutton(normalize_frame, text="アルバム全体", variable=self.normalize_var, value="album").pack(side="left")
+
+        # 差分のみ再分割：変更のあったチャプターだけを処理する
+        self.incremental_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(root, text="変更のあったチャプターだけを再分割", variable=self.incremental_var).pack(anchor="w", padx=10)
+
+        # 処理時間の計測（段階ごとの時間・ffmpegのリソース使用量）
+        self.trace_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(root, text="処理時間を計測する", variable=self.trace_var).pack(anchor="w", padx=10)
+
+        btn_convert = tk.Button(root, text="📝 テキスト → JSON変換", command=self.convert_text_to_json)
+        btn_convert.pack(fill="x", padx=10, pady=5)
+
+        btn_extract = tk.Button(root, text="🎬 動画からチャプター抽出", command=self.extract_chapters_from_video)
+        btn_extract.pack(fill="x", padx=10, pady=5)
+
+        btn_detect = tk.Button(root, text="🔇 無音からチャプター自動生成", command=self.detect_chapters_from_silence)
+        btn_detect.pack(fill="x", padx=10, pady=5)
+
+        btn_waveform = tk.Button(root, text="🌊 波形でチャプター境界を確認", command=self.show_waveform)
+        btn_waveform.pack(fill="x", padx=10, pady=5)
+
+        btn_split = tk.Button(root, text="🎬 動画/音声 → 分割", command=self.split_audio_fast)
+        btn_split.pack(fill="x", padx=10, pady=5)
+
+        btn_url = tk.Button(root, text="🌐 URLを開いて分割", command=self.split_url)
+        btn_url.pack(fill="x", padx=10, pady=5)
+
+        btn_batch = tk.Button(root, text="📁 フォルダを一括分割", command=self.split_folder)
+        btn_batch.pack(fill="x", padx=10, pady=5)
+
+        btn_stop = tk.Button(root, text="⛔ 処理を中断", command=self.stop_processing)
+        btn_stop.pack(fill="x", padx=10, pady=5)
+
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_events)
+
+    def selected_profiles(self):
+        return [name for name, var in self.profile_vars.items() if var.get()] or [DEFAULT_PROFILE]
+
+    def stop_processing(self):
+        self.stop_flag = True
+        self.log("⚠️ 処理を中断します...")
+
+    # 処理は共有のイベントループ（runner）のワーカーで実行する
+    # 実行中のffmpegは停止フラグを0.1秒ごとに確認し、中断時はすぐに終了させられる
+    def run_in_background(self, func):
+        future = runner.spawn(func)
+        future.add_done_callback(self.on_background_done)
+        return future
+
+    # ワーカーで捕捉されなかった例外をログに出す
+    def on_background_done(self, future):
+        if future.cancelled() or future.exception() is None:
+            return
+        error = future.exception()
+        self.log(f"❌ エラー: {error}")
+        self.on_main(handle_exception, type(error), error, error.__traceback__)
 
-def convert_text_to_json():
-    input_text = text_input.get("1.0", tk.END).strip()
-    lines = [line for line in input_text.splitlines() if line.strip()]
+    # ワーカースレッドはTkに直接触らず、イベントをキューに積むだけにする
+    def post(self, kind, *args):
+        self.events.put((kind,) + args)
 
-    if not lines:
-        messagebox.showwarning("警告", "テキストを入力してください。")
-        return
+    def log(self, msg):
+        self.post("log", msg)
 
-    final_end = None
-    final_end_line = None
+    def set_status(self, text=None, progress=None):
+        self.post("status", text, progress)
 
-    try:
-        for i, line in enumerate(lines):
-            words = line.strip().split()
-            if len(words) >= 2 and words[-2].upper() == "END":
-                time_part = words[-1]
-                final_end = parse_time_to_ms(time_part)
-                final_end_line = i
-                break
+    # ダイアログなどTkの呼び出しはメインスレッドで実行する
+    def on_main(self, func, *args):
+        self.post("call", func, args)
 
-        parsed = []
-        for idx, line in enumerate(lines):
-            if idx == final_end_line:
-                continue
-            parts = line.strip().rsplit(" ", 1)
-            if len(parts) != 2:
-                raise ValueError(f"無効な行の形式: {line}")
-            title, time_str = parts
-            start_ms = parse_time_to_ms(time_str)
-            parsed.append((idx, title.strip(), start_ms))
-    except ValueError as ve:
-        messagebox.showerror("エラー", f"テキストの形式が正しくありません:\n{ve}")
-        return
+    # キューに溜まったイベントを一定間隔でまとめて反映する
+    # ログは一度の挿入にまとめ、ラベルと進捗は最新の値だけを使う
+    def drain_events(self):
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_events)
 
-    chapters = []
-    for i, (cid, title, start_ms) in enumerate(parsed):
-        end_ms = parsed[i + 1][2] if i + 1 < len(parsed) else final_end or start_ms
-        chapters.append({
-            "id": cid,
-            "time_base": "1/1000",
-            "start": start_ms,
-            "start_time": format_ms(start_ms),
-            "end": end_ms,
-            "end_time": format_ms(end_ms),
-            "tags": {"title": clean_title(title)}
-        })
-
-    output = {"chapters": chapters}
+        lines = []
+        status_text = None
+        progress = None
+        calls = []
+        try:
+            for _ in range(MAX_EVENTS_PER_DRAIN):
+                event = self.events.get_nowait()
+                kind = event[0]
+                if kind == "log":
+                    lines.append(event[1])
+                elif kind == "status":
+                    if event[1] is not None:
+                        status_text = event[1]
+                    if event[2] is not None:
+                        progress = event[2]
+                elif kind == "call":
+                    calls.append(event[1:])
+        except queue.Empty:
+            pass
+
+        if lines:
+            self.output_box.insert(tk.END, "\n".join(lines) + "\n")
+            # 古い行を捨ててスクロールバックを一定に保つ
+            line_count = int(self.output_box.index("end-1c").split(".")[0])
+            if line_count > MAX_LOG_LINES:
+                self.output_box.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
+            self.output_box.see(tk.END)
+        if status_text is not None:
+            self.current_label.config(text=status_text)
+        if progress is not None:
+            self.progress_var.set(progress)
+        for func, args in calls:
+            func(*args)
+
+    def convert_text_to_json(self):
+        input_text = self.text_input.get("1.0", tk.END).strip()
+        if not input_text:
+            messagebox.showwarning("警告", "テキストを入力してください。")
+            return
 
-    # JSONファイルの保存先を選択
-    desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-    json_path = filedialog.asksaveasfilename(
-        title="JSONファイルを保存",
-        initialdir=desktop_path,
-        initialfile="chapters.json",
-        defaultextension=".json",
-        filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-    )
+        try:
+            output = parse_chapter_text(input_text)
+        except ValueError as ve:
+            messagebox.showerror("エラー", f"テキストの形式が正しくありません:\n{ve}")
+            return
 
-    if not json_path:
-        return
+        json_path = ask_save_json_path()
+        if not json_path:
+            return
 
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
-    messagebox.showinfo("成功", f"JSONを保存しました:\n{os.path.basename(json_path)}")
-    log(f"✅ JSON書き出し成功: {json_path}")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        messagebox.showinfo("成功", f"JSONを保存しました:\n{os.path.basename(json_path)}")
+        self.log(f"✅ JSON書き出し成功: {json_path}")
 
-def extract_chapters_from_video():
-    def run():
+    def extract_chapters_from_video(self):
         video_path = filedialog.askopenfilename(
             title="動画ファイルを選択",
             filetypes=[
@@ -174,72 +271,96 @@ def extract_chapters_from_video():
         if not video_path:
             return
 
-        ffprobe_path = get_ffprobe_path()
-        log(f"▶ ffprobe path: {ffprobe_path}")
-        log(f"📹 動画ファイル: {video_path}")
+        def run():
+            ffprobe_path = get_ffprobe_path()
+            self.log(f"▶ ffprobe path: {ffprobe_path}")
+            self.log(f"📹 動画ファイル: {video_path}")
 
-        # ffprobeでチャプター情報を抽出
-        cmd = [
-            ffprobe_path, "-i", video_path,
-            "-print_format", "json",
-            "-show_chapters",
-            "-loglevel", "error"
-        ]
+            # ffprobeでチャプター情報を抽出（キャッシュがあれば再利用）
+            try:
+                probe = MediaProbe.load(video_path, ffprobe_path)
+                chapters = probe.chapters
 
-        try:
-            process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', errors='replace'
-            )
-            stdout, stderr = process.communicate()
+                if not chapters:
+                    self.on_main(messagebox.showwarning, "警告", "この動画ファイルにはチャプター情報が含まれていません。")
+                    self.log("⚠️ チャプター情報が見つかりませんでした")
+                    return
 
-            if process.returncode != 0:
-                error_msg = stderr.strip() if stderr else "エラーが発生しました"
-                messagebox.showerror("エラー", f"ffprobeの実行に失敗しました:\n{error_msg}")
-                log(f"❌ エラー: {error_msg}")
-                return
+                self.log(f"✅ {len(chapters)}個のチャプターを検出しました")
+                self.on_main(self.save_extracted_chapters, chapters)
+
+            except RuntimeError as e:
+                self.on_main(messagebox.showerror, "エラー", f"ffprobeの実行に失敗しました:\n{e}")
+                self.log(f"❌ エラー: {e}")
+            except json.JSONDecodeError as e:
+                self.on_main(messagebox.showerror, "エラー", f"JSONの解析に失敗しました:\n{e}")
+                self.log(f"❌ JSON解析エラー: {e}")
+            except Exception as e:
+                self.on_main(messagebox.showerror, "エラー", f"エラーが発生しました:\n{e}")
+                self.log(f"❌ エラー: {e}")
 
-            # JSONをパース
-            data = json.loads(stdout)
-            chapters = data.get("chapters", [])
+        self.run_in_background(run)
+
+    # チャプター情報がないファイルは、無音区間からチャプターを作ってJSONに保存する
+    def detect_chapters_from_silence(self):
+        media_path = filedialog.askopenfilename(
+            title="音声ファイルまたは動画ファイルを選択",
+            filetypes=[
+                ("Audio files", "*.m4a *.mp3 *.wav"),
+                ("Video files", "*.mp4 *.mov *.avi *.mkv"),
+                ("All files", "*.*")
+            ]
+        )
+        if not media_path:
+            return
 
-            if not chapters:
-                messagebox.showwarning("警告", "この動画ファイルにはチャプター情報が含まれていません。")
-                log("⚠️ チャプター情報が見つかりませんでした")
+        def run():
+            self.log(f"📹 選択されたファイル: {media_path}")
+            try:
+                chapters = detect_chapter_list(media_path, log=self.log, should_stop=lambda: self.stop_flag)
+            except runner.ProcessCancelled:
+                self.log("❌ 処理が中断されました")
+                self.stop_flag = False
+                return
+            except Exception as e:
+                self.on_main(messagebox.showerror, "エラー", f"無音区間の解析に失敗しました:\n{e}")
+                self.log(f"❌ エラー: {e}")
                 return
+            self.on_main(self.save_extracted_chapters, chapters)
 
-            log(f"✅ {len(chapters)}個のチャプターを検出しました")
+        self.run_in_background(run)
 
-            # JSONファイルの保存先を選択
-            desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-            json_path = filedialog.asksaveasfilename(
-                title="JSONファイルを保存",
-                initialdir=desktop_path,
-                initialfile="chapters.json",
-                defaultextension=".json",
-                filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-            )
+    def save_extracted_chapters(self, chapters):
+        json_path = ask_save_json_path()
+        if not json_path:
+            return
 
-            if not json_path:
-                return
+        save_chapters_json(json_path, chapters)
 
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+        messagebox.showinfo("成功", f"チャプター情報を保存しました:\n{os.path.basename(json_path)}\n（{len(chapters)}個のチャプター）")
+        self.log(f"✅ JSON書き出し成功: {json_path}")
+        self.log(f"📊 チャプター数: {len(chapters)}")
 
-            messagebox.showinfo("成功", f"チャプター情報を保存しました:\n{os.path.basename(json_path)}\n（{len(chapters)}個のチャプター）")
-            log(f"✅ JSON書き出し成功: {json_path}")
-            log(f"📊 チャプター数: {len(chapters)}")
+    # 入力欄のチャプター（空ならファイル自身のチャプター）をワーカーで読み込み、
+    # Chapterのリストをメインスレッドでcallbackに渡す（ffprobeの実行中もUIを止めない）
+    def load_current_chapters(self, media_path, callback):
+        chapter_text = self.text_input.get("1.0", tk.END).strip()
 
-        except json.JSONDecodeError as e:
-            messagebox.showerror("エラー", f"JSONの解析に失敗しました:\n{e}")
-            log(f"❌ JSON解析エラー: {e}")
-        except Exception as e:
-            messagebox.showerror("エラー", f"エラーが発生しました:\n{e}")
-            log(f"❌ エラー: {e}")
+        def run():
+            try:
+                if chapter_text:
+                    chapters = to_chapter_list(parse_chapter_list(chapter_text))
+                else:
+                    chapters = to_chapter_list(MediaProbe.load(media_path).chapters)
+            except (RuntimeError, ValueError) as e:
+                self.log(f"⚠️ チャプターを読み込めませんでした: {e}")
+                chapters = []
+            self.on_main(callback, chapters)
 
-    threading.Thread(target=run).start()
+        self.run_in_background(run)
 
-def split_audio_fast():
-    def run():
+    # 波形の概要（キャッシュがなければ1回のデコードで作成）を開き、チャプターの境界と一緒に表示する
+    def show_waveform(self):
         media_path = filedialog.askopenfilename(
             title="音声ファイルまたは動画ファイルを選択",
             filetypes=[
@@ -251,321 +372,391 @@ def split_audio_fast():
         if not media_path:
             return
 
-        # ファイルの拡張子で動画か音声かを判定
-        ext = os.path.splitext(media_path)[1].lower()
-        is_video = ext in ['.mp4', '.mov', '.avi', '.mkv', '.flv', '.webm', '.m4v']
-
-        log(f"📹 選択されたファイル: {media_path}")
-        log(f"📋 ファイルタイプ: {'動画' if is_video else '音声'}")
-
-        # 動画ファイルの場合は、動画からチャプター情報を自動抽出
-        if is_video:
-            ffprobe_path = get_ffprobe_path()
-            log(f"▶ ffprobe path: {ffprobe_path}")
-            log("📊 動画からチャプター情報を抽出中...")
-
-            cmd = [
-                ffprobe_path, "-i", media_path,
-                "-print_format", "json",
-                "-show_chapters",
-                "-loglevel", "error"
-            ]
-
+        def run():
             try:
-                process = subprocess.Popen(
-                    cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', errors='replace'
+                overview = load_overview(
+                    media_path, log=self.log, should_stop=lambda: self.stop_flag,
+                    on_progress=lambda fraction: self.set_status(progress=fraction * 100),
                 )
-                stdout, stderr = process.communicate()
+            except runner.ProcessCancelled:
+                self.log("❌ 処理が中断されました")
+                self.stop_flag = False
+                return
+            except Exception as e:
+                self.on_main(messagebox.showerror, "エラー", f"波形の解析に失敗しました:\n{e}")
+                self.log(f"❌ エラー: {e}")
+                return
+            self.set_status(progress=0)
+            self.on_main(WaveformWindow, self, media_path, overview)
 
-                if process.returncode != 0:
-                    error_msg = stderr.strip() if stderr else "エラーが発生しました"
-                    messagebox.showerror("エラー", f"チャプター情報の抽出に失敗しました:\n{error_msg}")
-                    log(f"❌ エラー: {error_msg}")
-                    return
+        self.run_in_background(run)
 
-                # JSONをパース
-                data = json.loads(stdout)
-                chapters = data.get("chapters", [])
+    def split_audio_fast(self):
+        # ファイル選択はメインスレッドで済ませてからワーカーを起動する
+        media_path = filedialog.askopenfilename(
+            title="音声ファイルまたは動画ファイルを選択",
+            filetypes=[
+                ("Audio files", "*.m4a *.mp3 *.wav"),
+                ("Video files", "*.mp4 *.mov *.avi *.mkv"),
+                ("All files", "*.*")
+            ]
+        )
+        if not media_path:
+            return
+        self.split_media(media_path)
 
-                if not chapters:
-                    messagebox.showerror("エラー", "この動画ファイルにはチャプター情報が含まれていません。")
-                    log("❌ チャプター情報が見つかりませんでした")
+    # http(s)のURLを分割する（ファイル全体はダウンロードせず、必要な範囲だけを読み込む）
+    def split_url(self):
+        url = simpledialog.askstring("URLを開く", "音声・動画のURL（http/https）:", parent=self.root)
+        if not url:
+            return
+        url = url.strip()
+        if not is_url(url):
+            messagebox.showerror("エラー", "http:// または https:// で始まるURLを入力してください。")
+            return
+        self.split_media(url)
+
+    def split_media(self, media_path):
+        # 動画ファイルの場合は動画からチャプター情報を自動抽出する
+        # 音声ファイルの場合は入力欄のテキストをそのまま使い、空ならチャプターファイルを選択
+        is_video = is_video_file(media_path)
+        chapter_text = None
+        chapter_path = None
+        if not is_video:
+            chapter_text = self.text_input.get("1.0", tk.END).strip() or None
+            if chapter_text is None:
+                chapter_path = filedialog.askopenfilename(
+                    title="チャプターファイルを選択",
+                    filetypes=[
+                        ("Chapter files", "*.json *.cue *.txt"),
+                        ("All files", "*.*")
+                    ],
+                    initialdir=os.path.join(os.path.expanduser("~"), "Desktop")
+                )
+                if not chapter_path:
                     return
 
-                log(f"✅ {len(chapters)}個のチャプターを検出しました")
+        mode = self.mode_var.get()
+        jobs = max(1, self.jobs_var.get())
+        profiles = self.selected_profiles()
+        normalize = self.normalize_var.get() or None
+        split_func = incremental_split if self.incremental_var.get() else split
+        trace = self.trace_var.get()
+
+        # 計測する場合は、終了時に集計をログに出し、出力先にChrome trace形式のJSONを保存する
+        def run():
+            if not trace:
+                run_split()
+                return
+            instrument.start_recording()
+            try:
+                run_split()
+            finally:
+                recorder = instrument.stop_recording()
+                for line in recorder.format_summary().splitlines():
+                    self.log(line)
+                output_dir = default_output_dir(media_path)
+                if os.path.isdir(output_dir):
+                    trace_path = os.path.join(output_dir, TRACE_FILENAME)
+                    recorder.save(trace_path)
+                    self.log(f"📈 計測結果を保存しました: {trace_path}")
+
+        def run_split():
+            self.log(f"📹 選択されたファイル: {media_path}")
+            self.log(f"📋 ファイルタイプ: {'動画' if is_video else '音声'}")
+            self.log(f"▶ ffprobe path: {get_ffprobe_path()}")
+            self.log(f"▶ ffmpeg path: {get_ffmpeg_path()}")
 
+            try:
+                chapters = None
+                if is_video:
+                    self.log("📊 動画からチャプター情報を抽出中...")
+                elif chapter_text is not None:
+                    self.log("📝 入力欄のチャプターを使用します")
+                    chapters = parse_chapter_list(chapter_text)
+                else:
+                    self.log(f"📄 チャプターファイル: {chapter_path}")
+                    chapters = load_chapters_file(chapter_path)
+                plan = plan_split(
+                    media_path, chapters, mode=mode, log=self.log, profiles=profiles, normalize=normalize,
+                )
             except json.JSONDecodeError as e:
-                messagebox.showerror("エラー", f"JSONの解析に失敗しました:\n{e}")
-                log(f"❌ JSON解析エラー: {e}")
+                self.on_main(messagebox.showerror, "エラー", f"JSONの解析に失敗しました:\n{e}")
+                self.log(f"❌ JSON解析エラー: {e}")
                 return
             except Exception as e:
-                messagebox.showerror("エラー", f"エラーが発生しました:\n{e}")
-                log(f"❌ エラー: {e}")
+                self.on_main(messagebox.showerror, "エラー", f"チャプター情報の抽出に失敗しました:\n{e}")
+                self.log(f"❌ エラー: {e}")
                 return
 
-        else:
-            # 音声ファイルの場合は、JSONファイルを選択
-            json_path = filedialog.askopenfilename(
-                title="チャプターJSONファイルを選択",
-                filetypes=[("JSON files", "*.json")],
-                initialdir=os.path.join(os.path.expanduser("~"), "Desktop")
-            )
-            if not json_path:
-                return
-            log(f"📄 JSONファイル: {json_path}")
+            # チャプターごとの進み具合（0〜1）から全体の進捗を出す
+            fractions = {}
 
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            def on_progress(index, job, fraction):
+                fractions[job["output_file"]] = fraction
+                self.set_status(progress=sum(fractions.values()) / len(plan.jobs) * 100)
 
-            chapters = data.get("chapters", [])
+            def on_chapter_done(index, job):
+                self.log(f"✅ {job['track']}: {job['title']}")
+                self.set_status(text=f"現在のチャプター: {job['track']} - {job['title']}")
 
-        media_filename = os.path.splitext(os.path.basename(media_path))[0]
-        desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-        output_dir = os.path.join(desktop_path, media_filename)
-        os.makedirs(output_dir, exist_ok=True)
-        log(f"💾 出力先: {output_dir}")
+            try:
+                split_func(
+                    plan, jobs=jobs, log=self.log,
+                    on_chapter_done=on_chapter_done, should_stop=lambda: self.stop_flag,
+                    on_progress=on_progress,
+                )
+            except SplitCancelled:
+                self.log("❌ 処理が中断されました")
+                self.on_main(messagebox.showwarning, "中断", "処理を中断しました。")
+                self.stop_flag = False
+                self.set_status("処理が中断されました", 0)
+                return
+            except SplitFailed as e:
+                self.log(f"❌ ffmpegがエラーコード{e.returncode}で終了しました")
+                self.on_main(messagebox.showerror, "エラー", f"チャプター{e.track}の処理に失敗しました")
+                return
 
-        ffmpeg_path = get_ffmpeg_path()
-        ffprobe_path = get_ffprobe_path()
-        log(f"▶ ffmpeg path: {ffmpeg_path}")
+            self.log("✅ 分割完了")
+            self.set_status("すべて完了", 0)
+            self.on_main(messagebox.showinfo, "完了", "チャプター分割が完了しました。")
 
-        # 元のファイルからメタデータを取得
-        metadata = {}
-        try:
-            cmd_metadata = [
-                ffprobe_path, "-i", media_path,
-                "-print_format", "json",
-                "-show_format",
-                "-show_streams",
-                "-loglevel", "error"
-            ]
-            process_metadata = subprocess.Popen(
-                cmd_metadata, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', errors='replace'
+        self.run_in_background(run)
+
+    def split_folder(self):
+        input_dir = filedialog.askdirectory(title="分割するファイルのフォルダを選択")
+        if not input_dir:
+            return
+        output_root = filedialog.askdirectory(
+            title="出力先のフォルダを選択",
+            initialdir=os.path.join(os.path.expanduser("~"), "Desktop")
+        )
+        if not output_root:
+            return
+
+        mode = self.mode_var.get()
+        jobs = max(1, self.jobs_var.get())
+        profiles = self.selected_profiles()
+        normalize = self.normalize_var.get() or None
+
+        def run():
+            self.set_status("一括分割中...")
+            results = run_batch(
+                [input_dir], output_root=output_root, jobs=jobs,
+                mode=mode, log=self.log, should_stop=lambda: self.stop_flag, profiles=profiles,
+                normalize=normalize,
             )
-            stdout_metadata, stderr_metadata = process_metadata.communicate()
-            if process_metadata.returncode == 0:
-                format_data = json.loads(stdout_metadata)
-
-                # formatタグとストリームタグの両方を確認
-                all_tags = {}
-                format_tags = format_data.get("format", {}).get("tags", {})
-                all_tags.update(format_tags)
-
-                # ストリームタグも確認（特に音声ストリーム）
-                streams = format_data.get("streams", [])
-                for stream in streams:
-                    if stream.get("codec_type") == "audio":
-                        stream_tags = stream.get("tags", {})
-                        all_tags.update(stream_tags)
-                        break
-
-                log(f"🔍 検出されたメタデータタグ: {list(all_tags.keys())}")
-
-                # 継承するメタデータのマッピング定義
-                metadata_mapping = {
-                    "album": ["album", "ALBUM", "Album", "©alb"],
-                    "artist": ["artist", "ARTIST", "Artist", "©ART", "album_artist", "ALBUM_ARTIST"],
-                    "album_artist": ["album_artist", "ALBUM_ARTIST", "albumartist"],
-                    "genre": ["genre", "GENRE", "Genre", "©gen"],
-                    "date": ["date", "DATE", "Date", "year", "YEAR", "©day"],
-                    "composer": ["composer", "COMPOSER", "Composer", "©wrt"],
-                    "comment": ["comment", "COMMENT", "Comment", "©cmt"],
-                    "copyright": ["copyright", "COPYRIGHT", "Copyright", "©cpy"],
-                    "publisher": ["publisher", "PUBLISHER", "Publisher", "label"],
-                    "description": ["description", "DESCRIPTION", "Description"],
-                }
-
-                # 各メタデータを検索して取得
-                for meta_key, possible_keys in metadata_mapping.items():
-                    for key in possible_keys:
-                        if key in all_tags and all_tags[key] and str(all_tags[key]).strip():
-                            metadata[meta_key] = str(all_tags[key]).strip()
-                            log(f"  📌 {meta_key}: {metadata[meta_key]}")
-                            break
-
-                # 動画ファイルの場合、元のファイルのタイトルをアルバムタイトルとして設定
-                if is_video:
-                    # 動画のタイトルタグを取得
-                    video_title = None
-                    for key in ["title", "TITLE", "Title", "©nam"]:
-                        if key in all_tags and all_tags[key] and str(all_tags[key]).strip():
-                            video_title = str(all_tags[key]).strip()
-                            break
-
-                    # タイトルが見つかった場合、それをアルバムタイトルとして設定
-                    if video_title:
-                        metadata["album"] = video_title
-                        log(f"  🎬 動画タイトルをアルバムに設定: {video_title}")
-                    # タイトルタグがない場合はファイル名をアルバムタイトルとして使用
-                    else:
-                        metadata["album"] = media_filename
-                        log(f"  📁 ファイル名をアルバムに設定: {media_filename}")
-
-                if metadata:
-                    log(f"📋 継承するメタデータ: {list(metadata.keys())}")
-                else:
-                    log(f"⚠️ メタデータが見つかりませんでした")
-        except Exception as e:
-            log(f"⚠️ メタデータの取得に失敗（継続します）: {e}")
-
-        # 出力ファイルのリストを保存（音声ファイルの場合、後でアートワークを追加）
-        output_files = []
-
-        for i, chapter in enumerate(chapters):
-            # 停止フラグをチェック
-            global stop_flag
-            if stop_flag:
-                log("❌ 処理が中断されました")
-                messagebox.showwarning("中断", "処理を中断しました。")
-                stop_flag = False
-                current_label.config(text="処理が中断されました")
-                progress_var.set(0)
-                return
+            self.stop_flag = False
+            self.set_status("すべて完了")
 
-            start = chapter["start_time"]
-            end = chapter["end_time"]
-            title = chapter.get("tags", {}).get("title", "chapter")
-            safe_title = title.replace(" ", "_").replace("/", "_")[:50]
-            chapter_id = chapter.get("id", 0)
-            track_number = chapter_id + 1
-
-            # 出力ファイルは常にm4a形式
-            output_file = os.path.join(output_dir, f"{track_number:02d}_{safe_title}.m4a")
-            output_files.append(output_file)
-
-            # 動画の場合は音声のみを抽出、音声の場合はそのまま処理
-            # 高品質AACエンコード（途切れのない正確な分割）
-            if is_video:
-                # 動画：-ss/-toを-iの前に配置（アートワーク継承に必須）
-                cmd = [
-                    ffmpeg_path, "-y",
-                    "-ss", start,
-                    "-to", end,
-                    "-i", media_path,
-                ]
+            if results["failed"]:
+                failed = "\n".join(os.path.basename(path) for path, _ in results["failed"])
+                self.on_main(messagebox.showwarning, "一括分割", f"一部のファイルの分割に失敗しました:\n{failed}")
             else:
-                # 音声：-ss/-toを-iの後に配置（0057704の方法で途切れ防止）
-                cmd = [
-                    ffmpeg_path, "-y", "-i", media_path,
-                    "-ss", start,
-                    "-to", end,
-                ]
-
-            # 音声ストリームのマッピング
-            cmd.extend([
-                "-map", "0:a:0",  # 最初の音声ストリームのみ
-                "-c:a", "aac",  # 再エンコードで正確な分割
-                "-b:a", "256k",  # 高品質ビットレート
-            ])
-
-            # 動画の場合のみアートワークを含める（音声は後で一斉に追加）
-            if is_video:
-                # 動画の場合：ストリーム#0:2以降がattached_pic（#0:0はメインビデオ、#0:1は音声）
-                cmd.extend([
-                    "-map", "0:v:1?",  # 2番目のビデオストリーム（attached_pic）
-                    "-map", "0:v:2?",  # 3番目のビデオストリーム（attached_pic）
-                    "-c:v", "copy",  # アートワークをコピー
-                    "-disposition:v", "attached_pic",  # アートワークとして設定
-                ])
-
-            cmd.extend(["-f", "mp4"])  # MP4コンテナを明示
-
-            # メタデータをクリアしてから設定
-            cmd.extend(["-map_metadata", "-1"])
-
-            # 取得したメタデータを明示的に設定
-            for meta_key, meta_value in metadata.items():
-                cmd.extend(["-metadata", f"{meta_key}={meta_value}"])
-
-            # チャプターごとのタイトルとトラック番号を設定
-            cmd.extend([
-                "-metadata", f"title={title}",
-                "-metadata", f"track={track_number}",
-                output_file
-            ])
-
-            log(f"▶️ {track_number}: {title}")
-            current_label.config(text=f"現在のチャプター: {track_number} - {title}")
-
-            process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8', errors='replace'
-            )
-            for line in process.stdout:
-                if line.strip():
-                    log(line.strip())
-            process.wait()
-
-            # エラーチェック
-            if process.returncode != 0:
-                log(f"❌ ffmpegがエラーコード{process.returncode}で終了しました")
-                messagebox.showerror("エラー", f"チャプター{track_number}の処理に失敗しました")
-                return
+                self.on_main(messagebox.showinfo, "一括分割", f"一括分割が完了しました。\n（完了 {len(results['done'])} / スキップ {len(results['skipped'])}）")
+
+        self.run_in_background(run)
+
+def format_clock(seconds):
+    minutes, seconds = divmod(max(0.0, seconds), 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}:{minutes:02d}:{seconds:06.3f}"
+
+# 波形の概要とチャプターの境界を表示するウィンドウ
+# ホイールで拡大・縮小、ドラッグで移動、クリックでその位置（境界の近くなら境界）の前後をffplayで試聴する
+# 表示のたびに必要な解像度の段だけを読むため、長いファイルでも再描画はすぐに終わる
+class WaveformWindow:
+    def __init__(self, app, media_path, overview):
+        self.app = app
+        self.media_path = media_path
+        self.overview = overview
+        self.start = 0.0
+        self.end = overview.duration
+        self.chapters = []
+        self.player = None
+        self.drag_x = None
+        self.dragged = False
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title(f"波形 - {media_name(media_path)}")
+        self.window.geometry("900x320")
+        self.canvas = tk.Canvas(self.window, background="#1e1e1e", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True)
+        self.info_label = tk.Label(self.window, anchor="w")
+        self.info_label.pack(fill="x", padx=10)
+
+        button_frame = tk.Frame(self.window)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        tk.Button(button_frame, text="🔄 入力欄のチャプターを再読込", command=self.reload_chapters).pack(side="left")
+        tk.Button(button_frame, text="🔍 全体を表示", command=self.show_all).pack(side="left")
+        tk.Button(button_frame, text="⏹ 再生を停止", command=self.stop_playback).pack(side="left")
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom(event.x, 0.8 if event.delta > 0 else 1.25))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(event.x, 0.8))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(event.x, 1.25))
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.reload_chapters()
+
+    def reload_chapters(self):
+        self.app.load_current_chapters(self.media_path, self.set_chapters)
+
+    def set_chapters(self, chapters):
+        # 読み込みの間にウィンドウが閉じられた場合は何もしない
+        if not self.window.winfo_exists():
+            return
+        self.chapters = chapters
+        self.redraw()
+
+    def show_all(self):
+        self.start, self.end = 0.0, self.overview.duration
+        self.redraw()
+
+    def time_at(self, x):
+        return self.start + (self.end - self.start) * x / max(1, self.canvas.winfo_width())
+
+    def x_at(self, seconds):
+        return (seconds - self.start) / max(self.end - self.start, 1e-9) * self.canvas.winfo_width()
+
+    # チャプターの境界（開始位置と最後の終了位置）
+    def boundaries(self):
+        bounds = [(chapter.start_ms / 1000, f"{chapter.index + 1}. {chapter.title}") for chapter in self.chapters]
+        if self.chapters:
+            bounds.append((self.chapters[-1].end_ms / 1000, "END"))
+        return bounds
+
+    def redraw(self):
+        self.canvas.delete("all")
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        if width <= 1 or self.overview.values is None:
+            return
+        middle = height / 2
+        for x, column in enumerate(self.overview.peaks(self.start, self.end, width)):
+            if column is None:
+                continue
+            low, high = column
+            self.canvas.create_line(x, middle - high * middle, x, middle - low * middle + 1, fill="#4fc3f7")
+
+        for seconds, label in self.boundaries():
+            if self.start <= seconds <= self.end:
+                x = self.x_at(seconds)
+                self.canvas.create_line(x, 0, x, height, fill="#ff7043")
+                self.canvas.create_text(x + 3, 3, anchor="nw", text=label, fill="#ffccbc")
+
+        self.info_label.config(
+            text=f"{format_clock(self.start)} 〜 {format_clock(self.end)}"
+                 f"（クリックで前後を試聴・ホイールで拡大/縮小・ドラッグで移動）"
+        )
 
-            progress = ((i + 1) / len(chapters)) * 100
-            progress_var.set(progress)
-            root.update_idletasks()
-
-        # 音声ファイルの場合、分割後に一斉にアートワークを追加
-        if not is_video and output_files:
-            log("🎨 アートワークを追加中...")
-            current_label.config(text="アートワークを追加中...")
-
-            for idx, output_file in enumerate(output_files):
-                temp_file = output_file + ".temp.m4a"
-
-                artwork_cmd = [
-                    ffmpeg_path, "-y",
-                    "-i", output_file,  # 分割済みファイル
-                    "-i", media_path,   # 元のファイル（アートワーク取得用）
-                    "-map", "0:a",      # 分割済みファイルの音声
-                    "-map", "1:v?",     # 元のファイルのアートワーク
-                    "-c:a", "copy",     # 音声はコピー
-                    "-c:v", "copy",     # アートワークもコピー
-                    "-disposition:v:0", "attached_pic",
-                    "-map_metadata", "0",  # 分割済みファイルのメタデータを保持
-                    temp_file
-                ]
-
-                process = subprocess.Popen(
-                    artwork_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8', errors='replace'
-                )
-                process.wait()
+    # xの位置を中心に表示範囲をfactor倍にする
+    def zoom(self, x, factor):
+        center = self.time_at(x)
+        span = min(self.overview.duration, max(MIN_VIEW_SECONDS, (self.end - self.start) * factor))
+        ratio = span / max(self.end - self.start, 1e-9)
+        self.set_view(center - (center - self.start) * ratio, span)
 
-                if process.returncode == 0:
-                    os.replace(temp_file, output_file)
-                    log(f"  ✅ {os.path.basename(output_file)}")
-                else:
-                    log(f"  ⚠️ {os.path.basename(output_file)} - アートワーク追加失敗")
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
+    def set_view(self, start, span):
+        start = min(max(0.0, start), max(0.0, self.overview.duration - span))
+        self.start, self.end = start, start + span
+        self.redraw()
 
-                progress = ((idx + 1) / len(output_files)) * 100
-                progress_var.set(progress)
-                root.update_idletasks()
+    def on_press(self, event):
+        self.drag_x = event.x
+        self.dragged = False
 
-        messagebox.showinfo("完了", "チャプター分割が完了しました。")
-        log("✅ 分割完了")
-        current_label.config(text="すべて完了")
-        progress_var.set(0)
+    def on_drag(self, event):
+        if self.drag_x is None:
+            return
+        dx = event.x - self.drag_x
+        if not self.dragged and abs(dx) < 3:
+            return
+        self.dragged = True
+        self.drag_x = event.x
+        span = self.end - self.start
+        self.set_view(self.start - dx * span / max(1, self.canvas.winfo_width()), span)
+
+    def on_release(self, event):
+        if self.drag_x is None or self.dragged:
+            self.drag_x = None
+            return
+        self.drag_x = None
+        seconds = self.time_at(event.x)
+        # 境界の近くをクリックした場合は境界の前後を再生する
+        for boundary, label in self.boundaries():
+            if abs(self.x_at(boundary) - event.x) <= MARKER_HIT_PX:
+                seconds = boundary
+                self.app.log(f"🔈 境界 {label}（{format_clock(boundary)}）の前後を再生します")
+                break
+        else:
+            self.app.log(f"🔈 {format_clock(seconds)}の前後を再生します")
+        self.play(seconds)
 
-    threading.Thread(target=run).start()
+    def play(self, seconds):
+        self.stop_playback()
+        self.player = play_snippet(self.media_path, seconds)
+        self.player.add_done_callback(self.on_played)
 
-btn_convert = tk.Button(root, text="📝 テキスト → JSON変換", command=convert_text_to_json)
-btn_convert.pack(fill="x", padx=10, pady=5)
+    # 再生の終了（runnerのスレッドから呼ばれる。ログはキュー経由なのでそのまま出せる）
+    def on_played(self, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, OSError):
+            self.app.log(f"⚠️ ffplayを起動できませんでした: {error}")
+        elif error is not None:
+            self.app.log(f"⚠️ 再生に失敗しました: {error}")
+
+    def stop_playback(self):
+        if self.player is not None and not self.player.done():
+            self.player.cancel()
+        self.player = None
+
+    def close(self):
+        self.stop_playback()
+        self.overview.close()
+        self.window.destroy()
+
+def main():
+    sys.excepthook = handle_exception
+
+    # 並列数（--jobs N、既定はCPU数）と分割モード
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    arg_parser.add_argument("--mode", choices=["encode", "copy"], default="encode")
+    cli_args, _ = arg_parser.parse_known_args()
 
-btn_extract = tk.Button(root, text="🎬 動画からチャプター抽出", command=extract_chapters_from_video)
-btn_extract.pack(fill="x", padx=10, pady=5)
+    try:
+        root = tk.Tk()
+        root.title("チャプター分割ツール")
+        root.geometry("600x750")
+    except Exception as e:
+        print(f"GUIの初期化に失敗しました: {e}", file=sys.stderr)
+        import tkinter.messagebox as mb
+        mb.showerror("エラー", f"アプリケーションの起動に失敗しました:\n{e}")
+        sys.exit(1)
 
-btn_split = tk.Button(root, text="🎬 動画/音声 → 分割", command=split_audio_fast)
-btn_split.pack(fill="x", padx=10, pady=5)
+    # macOSでウィンドウを前面に表示
+    root.lift()
+    root.attributes('-topmost', True)
+    root.after_idle(root.attributes, '-topmost', False)
 
-btn_stop = tk.Button(root, text="⛔ 処理を中断", command=stop_processing)
-btn_stop.pack(fill="x", padx=10, pady=5)
+    ChapterSplitterApp(root, cli_args.jobs, cli_args.mode)
 
-try:
-    root.mainloop()
-except Exception as e:
-    print(f"アプリケーション実行中のエラー: {e}", file=sys.stderr)
-    import tkinter.messagebox as mb
-    mb.showerror("エラー", f"アプリケーション実行中のエラーが発生しました:\n{e}")
-    sys.exit(1)
\ No newline at end of file
+    try:
+        root.mainloop()
+    except Exception as e:
+        print(f"アプリケーション実行中のエラー: {e}", file=sys.stderr)
+        import tkinter.messagebox as mb
+        mb.showerror("エラー", f"アプリケーション実行中のエラーが発生しました:\n{e}")
+        sys.exit(1)
+    finally:
+        # ウィンドウを閉じたときに実行中のffmpegを残さない
+        runner.shutdown()
+
+if __name__ == "__main__":
+    main()
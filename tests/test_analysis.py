@@ -0,0 +1,28 @@
+import struct
+
+import pytest
+
+from chapter_splitter.analysis import chapters_from_silences, frame_levels
+
+
+def pcm(values):
+    return b"".join(struct.pack("<h", value) for value in values)
+
+
+def test_frame_levels_keeps_partial_tail_frame():
+    pytest.importorskip("numpy")
+    levels = frame_levels(pcm([0] * 8 + [16384] * 3), 4)
+    assert len(levels) == 3
+    assert levels[-1] == pytest.approx(-6.02, abs=0.01)
+
+
+def test_frame_levels_ignores_odd_byte_tail():
+    pytest.importorskip("numpy")
+    assert len(frame_levels(pcm([0] * 8) + b"\x01", 4)) == 2
+    assert len(frame_levels(b"\x01", 4)) == 0
+
+
+def test_chapters_from_silences_skips_short_and_edge_silences():
+    silences = [(0.0, 1.0), (40.0, 42.0), (50.0, 52.0), (100.0, 102.0), (118.0, 120.0)]
+    chapters = chapters_from_silences(silences, 120.0, min_chapter=30.0)
+    assert [(chapter.start_ms, chapter.end_ms) for chapter in chapters] == [(0, 41000), (41000, 120000)]
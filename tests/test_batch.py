@@ -0,0 +1,144 @@
+import json
+import os
+
+import pytest
+
+from chapter_splitter import batch
+from chapter_splitter.batch import MANIFEST_FILENAME, BatchManifest, run_batch
+from chapter_splitter.parsers import parse_chapter_list
+from chapter_splitter.probe import MediaProbe
+from chapter_splitter.split import SplitFailed, plan_split
+
+CHAPTERS = "Intro 0:00\nMain 1:00\nOutro 2:00\nEND 3:00\n"
+
+
+@pytest.fixture
+def media(tmp_path):
+    path = tmp_path / "in.m4a"
+    path.write_bytes(b"source audio" * 100)
+    (tmp_path / "in.chapters.txt").write_text(CHAPTERS, encoding="utf-8")
+    return str(path)
+
+
+def fake_probe(media_path):
+    return MediaProbe(media_path, {
+        "format": {"duration": "180", "tags": {}},
+        "streams": [{"codec_type": "audio", "codec_name": "aac", "sample_rate": "44100"}],
+    })
+
+
+def make_plan(media, output_dir, mode="encode"):
+    return plan_split(media, parse_chapter_list(CHAPTERS), output_dir=output_dir, mode=mode,
+                      probe=fake_probe(media))
+
+
+def write_outputs(plan):
+    for job in plan.jobs:
+        for output in job["outputs"]:
+            os.makedirs(os.path.dirname(output["output_file"]), exist_ok=True)
+            with open(output["output_file"], "wb") as f:
+                f.write(job["title"].encode())
+
+
+@pytest.fixture
+def recorded(tmp_path, media):
+    plan = make_plan(media, str(tmp_path / "out"))
+    write_outputs(plan)
+    manifest = BatchManifest(str(tmp_path / MANIFEST_FILENAME))
+    for job in plan.jobs:
+        manifest.record(media, job, plan.mode)
+    manifest.save()
+    return plan, BatchManifest(manifest.path)
+
+
+def test_manifest_round_trip(media, recorded):
+    plan, manifest = recorded
+    assert all(manifest.is_valid(media, job, plan.mode, verify=True) for job in plan.jobs)
+
+
+def test_manifest_invalid_when_settings_change(tmp_path, media, recorded):
+    plan, manifest = recorded
+    job = plan.jobs[0]
+    assert not manifest.is_valid(media, job, "copy")
+    assert not manifest.is_valid(media, dict(job, end=job["end"] + 1), plan.mode)
+    assert not manifest.is_valid(media, dict(job, gain=-3.0), plan.mode)
+    profiled = dict(job, outputs=[dict(job["outputs"][0], profile="mp3_320")])
+    assert not manifest.is_valid(media, profiled, plan.mode)
+
+
+def test_manifest_invalid_when_files_change(media, recorded):
+    plan, manifest = recorded
+    first, second, third = plan.jobs
+    os.remove(first["output_file"])
+    assert not manifest.is_valid(media, first, plan.mode)
+    # 同じサイズで中身だけ変わった場合はハッシュの確認で見つける
+    with open(second["output_file"], "r+b") as f:
+        f.write(b"X")
+    assert manifest.is_valid(media, second, plan.mode)
+    assert not manifest.is_valid(media, second, plan.mode, verify=True)
+    # 元ファイルが変わったら記録は使わない
+    with open(media, "ab") as f:
+        f.write(b"more")
+    assert not manifest.is_valid(media, third, plan.mode)
+
+
+def test_manifest_ignores_broken_file(tmp_path):
+    path = tmp_path / MANIFEST_FILENAME
+    path.write_text("{broken", encoding="utf-8")
+    assert BatchManifest(str(path)).outputs == {}
+
+
+# plan_splitにはffprobeの代わりに固定の情報を渡し、splitは出力を書くだけにする
+@pytest.fixture
+def fake_split(monkeypatch):
+    calls = []
+
+    def plan(media_path, chapters, **kwargs):
+        return plan_split(media_path, chapters, probe=fake_probe(media_path), **kwargs)
+
+    def split(plan, **kwargs):
+        calls.append([job["title"] for job in plan.jobs])
+        write_outputs(plan)
+
+    monkeypatch.setattr(batch, "plan_split", plan)
+    monkeypatch.setattr(batch, "split", split)
+    return calls
+
+
+def test_resume_skips_completed_files(tmp_path, media, fake_split):
+    output_root = str(tmp_path / "out")
+    results = run_batch([media], output_root=output_root)
+    assert results == {"done": [media], "skipped": [], "failed": []}
+    assert fake_split == [["Intro", "Main", "Outro"]]
+
+    results = run_batch([media], output_root=output_root)
+    assert results == {"done": [], "skipped": [media], "failed": []}
+    assert len(fake_split) == 1
+
+    # 消えた出力だけを分割し直す
+    os.remove(os.path.join(output_root, "in", "02_Main.m4a"))
+    results = run_batch([media], output_root=output_root)
+    assert results["done"] == [media]
+    assert fake_split[-1] == ["Main"]
+
+
+def test_resume_after_failure_keeps_completed_outputs(tmp_path, media, fake_split, monkeypatch):
+    output_root = str(tmp_path / "out")
+    recording_split = batch.split
+
+    def failing_split(plan, **kwargs):
+        write_outputs(plan.subset(plan.jobs[:1]))
+        error = SplitFailed(2, 1)
+        error.completed_outputs = [plan.jobs[0]["output_file"]]
+        raise error
+
+    monkeypatch.setattr(batch, "split", failing_split)
+    results = run_batch([media], output_root=output_root)
+    assert [path for path, _ in results["failed"]] == [media]
+    with open(os.path.join(output_root, MANIFEST_FILENAME), encoding="utf-8") as f:
+        assert len(json.load(f)["outputs"]) == 1
+
+    # 再開すると記録済みの出力は分割し直さない
+    monkeypatch.setattr(batch, "split", recording_split)
+    assert run_batch([media], output_root=output_root)["done"] == [media]
+    assert fake_split == [["Main", "Outro"]]
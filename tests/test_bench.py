@@ -0,0 +1,46 @@
+import json
+import sys
+
+import pytest
+
+from chapter_splitter import bench
+from chapter_splitter.ffmpeg import PROGRESS_ARGS
+
+
+def fake_ffmpeg(tmp_path, returncode=0):
+    path = tmp_path / "ffmpeg"
+    path.write_text(
+        f"#!{sys.executable}\n"
+        "import json, sys\n"
+        f"open({str(tmp_path / 'args.json')!r}, 'w').write(json.dumps(sys.argv[1:]))\n"
+        "print('progress=end')\n"
+        "print('boom', file=sys.stderr)\n"
+        f"sys.exit({returncode})\n"
+    )
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_run_ffmpeg_reports_progress_through_runner(tmp_path):
+    bench.run_ffmpeg([fake_ffmpeg(tmp_path), "-y", "out.wav"], "ffmpeg bench media")
+    args = json.loads((tmp_path / "args.json").read_text())
+    assert args == PROGRESS_ARGS + ["-y", "out.wav"]
+
+
+def test_run_ffmpeg_raises_on_failure(tmp_path):
+    with pytest.raises(RuntimeError, match="boom"):
+        bench.run_ffmpeg([fake_ffmpeg(tmp_path, returncode=1), "-y", "out.wav"], "ffmpeg bench media")
+
+
+def test_copy_strategy_runs_on_pcm_containers(tmp_path, monkeypatch):
+    media = tmp_path / "media.bin"
+    media.write_bytes(b"\0" * 16)
+    monkeypatch.setattr(bench, "generate_media", lambda ffmpeg_path, duration, container, work_dir: str(media))
+    monkeypatch.setattr(bench, "get_ffprobe_version", lambda path: "test")
+    monkeypatch.setattr(bench, "run_case_in_subprocess",
+                        lambda spec, cache_dir: {"mode": "pcm", "wall_s": 1.0, "cpu_user_s": 0.5, "cpu_system_s": 0.1})
+    results = bench.run_benchmarks(durations=["1m"], chapter_counts=[5], containers=["wav", "aiff", "mp3"],
+                                   strategies=["copy"], work_dir=str(tmp_path))
+    assert {case["container"]: case["status"] for case in results["cases"]} == {
+        "wav": "ok", "aiff": "ok", "mp3": "skipped",
+    }
@@ -0,0 +1,52 @@
+import threading
+import types
+
+import pytest
+
+from chapter_splitter.chapters import make_chapter
+
+split_gui = pytest.importorskip("split_gui")
+
+
+class FakeApp:
+    def __init__(self, text=""):
+        self.text_input = types.SimpleNamespace(get=lambda start, end: text)
+        self.calls = []
+        self.logs = []
+        self.done = threading.Event()
+
+    def log(self, msg):
+        self.logs.append(msg)
+
+    def on_main(self, func, *args):
+        self.calls.append((func, args))
+        self.done.set()
+
+    def run_in_background(self, func):
+        return split_gui.runner.spawn(func)
+
+
+def test_chapters_are_probed_off_the_main_thread(monkeypatch):
+    probed_on = []
+
+    def load(path):
+        probed_on.append(threading.get_ident())
+        return types.SimpleNamespace(chapters=[make_chapter(0, "A", 0, 1000)])
+
+    monkeypatch.setattr(split_gui.MediaProbe, "load", load)
+    app = FakeApp()
+    received = []
+    split_gui.ChapterSplitterApp.load_current_chapters(app, "/in.m4a", received.append)
+    assert app.done.wait(10)
+    assert probed_on and probed_on[0] != threading.get_ident()
+    func, (chapters,) = app.calls[0]
+    func(chapters)
+    assert [(chapter.title, chapter.start_ms, chapter.end_ms) for chapter in received[0]] == [("A", 0, 1000)]
+
+
+def test_unreadable_chapters_deliver_empty_list():
+    app = FakeApp("not a chapter line")
+    split_gui.ChapterSplitterApp.load_current_chapters(app, "/in.m4a", lambda chapters: None)
+    assert app.done.wait(10)
+    assert app.calls[0][1] == ([],)
+    assert app.logs and "チャプターを読み込めませんでした" in app.logs[0]
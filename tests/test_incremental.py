@@ -0,0 +1,133 @@
+import json
+import os
+
+import pytest
+
+from chapter_splitter import incremental
+from chapter_splitter.incremental import STATE_FILENAME, incremental_split, load_state, plan_incremental
+from chapter_splitter.mp4 import find_path, iter_mp4_atoms, mp4_atom
+from chapter_splitter.parsers import parse_chapter_list
+from chapter_splitter.probe import MediaProbe
+from chapter_splitter.split import plan_split
+
+CHAPTERS = "Intro 0:00\nMain 1:00\nOutro 2:00\nEND 3:00\n"
+
+
+@pytest.fixture
+def media(tmp_path):
+    path = tmp_path / "in.m4a"
+    path.write_bytes(b"source audio" * 100)
+    return str(path)
+
+
+def make_plan(media, output_dir, chapters=CHAPTERS, album="Album"):
+    probe = MediaProbe(media, {
+        "format": {"duration": "180", "tags": {"album": album}},
+        "streams": [{"codec_type": "audio", "codec_name": "aac", "sample_rate": "44100"}],
+    })
+    return plan_split(media, parse_chapter_list(chapters), output_dir=output_dir, probe=probe)
+
+
+# ilstだけを書き換えられる最小のm4a（mdatの中身で音声を区別する）
+def write_output(path, audio):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(mp4_atom(b"ftyp", b"M4A \0\0\0\0") + mp4_atom(b"mdat", audio) + mp4_atom(b"moov", b""))
+
+
+def read_album(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    moov = next(data[offset + header:offset + size] for offset, size, kind, header in iter_mp4_atoms(data)
+                if kind == b"moov")
+    offset, size, header = find_path(moov, [b"udta", b"meta"])
+    meta = moov[offset + header + 4:offset + size]
+    offset, size, header = find_path(meta, [b"ilst", b"\xa9alb", b"data"])
+    return meta[offset + header + 8:offset + size].decode()
+
+
+# 前回の分割結果：出力ファイルと記録を作る
+def previous_run(plan):
+    fingerprints = plan_incremental(plan, {}, incremental.source_fingerprint(plan.media_path))[4]
+    for job in plan.jobs:
+        write_output(job["output_file"], job["title"].encode())
+    incremental.save_state(plan.output_dir, fingerprints)
+    return fingerprints
+
+
+def test_unchanged_outputs_are_kept(tmp_path, media):
+    plan = make_plan(media, str(tmp_path / "out"))
+    previous_run(plan)
+    unchanged, retag, encode, orphans, _ = plan_incremental(
+        plan, load_state(plan.output_dir), incremental.source_fingerprint(media))
+    assert unchanged == ["01_Intro.m4a", "02_Main.m4a", "03_Outro.m4a"]
+    assert (retag, encode, orphans) == ([], [], [])
+
+
+def test_missing_output_is_encoded_again(tmp_path, media):
+    plan = make_plan(media, str(tmp_path / "out"))
+    previous_run(plan)
+    os.remove(plan.jobs[1]["output_file"])
+    unchanged, retag, encode, orphans, _ = plan_incremental(
+        plan, load_state(plan.output_dir), incremental.source_fingerprint(media))
+    assert [job["title"] for job in encode] == ["Main"]
+    assert retag == [] and orphans == []
+
+
+def test_classifies_retag_encode_and_orphans(tmp_path, media):
+    output_dir = str(tmp_path / "out")
+    previous_run(make_plan(media, output_dir))
+    # タイトルの変更（名前が変わる）・区間の変更・チャプターの削除
+    plan = make_plan(media, output_dir, "Opening 0:00\nMain 1:00\nEND 2:30\n")
+    unchanged, retag, encode, orphans, _ = plan_incremental(
+        plan, load_state(output_dir), incremental.source_fingerprint(media))
+    assert unchanged == []
+    assert [(job["title"], os.path.basename(source)) for job, _, source in retag] == [("Opening", "01_Intro.m4a")]
+    assert [(job["title"], job["start"], job["end"]) for job in encode] == [("Main", 60.0, 150.0)]
+    assert orphans == ["03_Outro.m4a"]
+
+
+def test_incremental_split_retags_in_place_and_removes_orphans(tmp_path, media, monkeypatch):
+    output_dir = str(tmp_path / "out")
+    previous_run(make_plan(media, output_dir))
+    encoded = []
+
+    def fake_split(plan, **kwargs):
+        for job in plan.jobs:
+            write_output(job["output_file"], b"encoded")
+        encoded.extend(job["title"] for job in plan.jobs)
+
+    monkeypatch.setattr(incremental, "split", fake_split)
+    monkeypatch.setattr(incremental, "retag_output", lambda *args: pytest.fail("ffmpegでの書き換えは不要"))
+
+    # アルバム名の変更（名前は同じ）・最後のチャプターの区間の変更・チャプターの削除
+    plan = make_plan(media, output_dir, "Intro 0:00\nMain 1:00\nEND 2:30\n", album="New Album")
+    incremental_split(plan, log=lambda msg: None)
+
+    assert encoded == ["Main"]
+    assert sorted(os.listdir(output_dir)) == [STATE_FILENAME, "01_Intro.m4a", "02_Main.m4a"]
+    intro = os.path.join(output_dir, "01_Intro.m4a")
+    assert read_album(intro) == "New Album"
+    with open(intro, "rb") as f:
+        assert mp4_atom(b"mdat", b"Intro") in f.read()
+
+    with open(os.path.join(output_dir, STATE_FILENAME), encoding="utf-8") as f:
+        state = json.load(f)["outputs"]
+    assert state == plan_incremental(plan, {}, incremental.source_fingerprint(media))[4]
+
+
+def test_unmapped_tags_are_retagged_with_ffmpeg(tmp_path, media, monkeypatch):
+    output_dir = str(tmp_path / "out")
+    previous_run(make_plan(media, output_dir))
+    remuxed = []
+
+    def fake_retag_output(ffmpeg_path, source_file, temp_file, metadata, job, profile=None):
+        remuxed.append(os.path.basename(source_file))
+        with open(source_file, "rb") as src, open(temp_file, "wb") as dst:
+            dst.write(src.read())
+
+    monkeypatch.setattr(incremental, "retag_output", fake_retag_output)
+    plan = make_plan(media, output_dir)
+    plan.metadata["label"] = "Unmapped"
+    incremental_split(plan, log=lambda msg: None)
+    assert remuxed == ["01_Intro.m4a", "02_Main.m4a", "03_Outro.m4a"]
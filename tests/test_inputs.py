@@ -0,0 +1,83 @@
+import http.server
+import threading
+
+import pytest
+
+from chapter_splitter import inputs
+
+DATA = bytes(range(256)) * 64
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        start, end = inputs.RANGE_PATTERN.fullmatch(self.headers["Range"]).groups()
+        start, end = int(start), min(int(end), len(DATA) - 1)
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(DATA)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(DATA[start:end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(handler):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def origin():
+    server = serve(RangeHandler)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def redirect(origin):
+    class RedirectHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(302)
+            self.send_header("Location", origin + "/media.m4a")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = serve(RedirectHandler)
+    yield f"http://127.0.0.1:{server.server_address[1]}/start.m4a"
+    server.shutdown()
+
+
+def test_media_name_uses_url_path():
+    assert inputs.media_name("https://example.com/a/My%20Book.m4a?sig=1") == "My Book.m4a"
+    assert inputs.media_name("/tmp/book.m4a") == "book.m4a"
+
+
+def test_fetcher_reads_ranges_across_blocks(origin, monkeypatch):
+    monkeypatch.setattr(inputs, "BLOCK_SIZE", 1000)
+    fetcher = inputs.RangeFetcher(origin + "/media.m4a").open()
+    assert fetcher.size == len(DATA)
+    assert fetcher.read(990, 30) == DATA[990:1020]
+    assert fetcher.read(len(DATA) - 5, 100) == DATA[-5:]
+
+
+def test_redirect_to_other_host_drops_pooled_connections(redirect, origin):
+    fetcher = inputs.RangeFetcher(redirect).open()
+    port = int(origin.rsplit(":", 1)[1])
+    assert fetcher.port == port
+    pooled = []
+    while not fetcher.pool.empty():
+        pooled.append(fetcher.pool.get_nowait())
+    assert pooled and all(connection.port == port for connection in pooled)
+    for connection in pooled:
+        fetcher.release(connection)
+    assert fetcher.read(0, 10) == DATA[:10]
@@ -0,0 +1,25 @@
+import resource
+
+from chapter_splitter import instrument
+
+
+def test_timed_totals_have_no_cpu_time():
+    recorder = instrument.Recorder()
+    recorder.add_total("log", 0.25)
+    recorder.add_total("log", 0.25)
+    recorder.add_span("split", "stage", 0.0, 2.0, cpu=1.5)
+    assert recorder.summary() == [("log", 2, 0.5, None, None), ("split", 1, 2.0, 1.5, None)]
+    row = next(line for line in recorder.format_summary().splitlines() if line.startswith("log"))
+    assert row.split()[-2:] == ["-", "-"]
+
+
+def test_process_block_io_is_reported_separately():
+    recorder = instrument.Recorder()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    recorder.add_process("ffmpeg split", 1, 0.0, 1.0, usage)
+    recorder.add_process("ffmpeg split", 2, 0.0, 1.0, None)
+    recorder.add_bytes(read=100, written=50)
+    assert recorder.process_blocks() == (usage.ru_inblock * 512, usage.ru_oublock * 512)
+    other = recorder.chrome_trace()["otherData"]
+    assert (other["bytes_read"], other["bytes_written"]) == (100, 50)
+    assert other["process_block_read"] == usage.ru_inblock * 512
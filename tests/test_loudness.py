@@ -0,0 +1,148 @@
+import types
+
+import pytest
+
+from chapter_splitter import loudness
+from chapter_splitter.loudness import (
+    DEFAULT_MAX_TRUE_PEAK,
+    DEFAULT_TARGET_LUFS,
+    chapter_gains,
+    measure_loudness,
+    measure_ranges,
+    range_key,
+)
+from chapter_splitter.probe import MediaProbe
+
+# ffmpegのebur128（framelog=verbose）が出力するstderrの抜粋
+FRAME_LOG = (
+    "[Parsed_ebur128_2 @ 0x5581c8a1c2c0] t: 0.4        TARGET:-23 LUFS    M: -21.2 S:-120.7     "
+    "I: -21.2 LUFS       LRA:   0.0 LU  FTPK: -3.1 dBFS  TPK: -3.1 dBFS"
+)
+
+SUMMARY = """\
+[Parsed_ebur128_{index} @ 0x5581c8a1c2c0] Summary:
+
+  Integrated loudness:
+    I:         {integrated} LUFS
+    Threshold: -28.6 LUFS
+
+  Loudness range:
+    LRA:         {lra} LU
+    Threshold: -38.7 LUFS
+    LRA low:   -21.9 LUFS
+    LRA high:  -16.7 LUFS
+
+  True peak:
+    Peak:       {peak} dBFS
+"""
+
+# 無音のチャプター：ゲートで全ブロックが除かれ、-70 LUFSと-infのピークになる
+SILENT_SUMMARY = dict(integrated="-70.0", lra="0.0", peak="-inf")
+
+
+def summary(index, integrated="-18.3", lra="5.2", peak="-0.4"):
+    return SUMMARY.format(index=index, integrated=integrated, lra=lra, peak=peak)
+
+
+# runner.runの代わりに、記録したstderrを1行ずつ渡す
+@pytest.fixture
+def ffmpeg_stderr(monkeypatch):
+    calls = []
+
+    def use(text, returncode=0):
+        def run(cmd, name, on_stdout=None, on_stderr=None, **kwargs):
+            calls.append(cmd)
+            for line in text.splitlines(keepends=True):
+                on_stderr(line)
+            return types.SimpleNamespace(returncode=returncode)
+
+        monkeypatch.setattr(loudness.runner, "run", run)
+        return calls
+
+    return use
+
+
+def test_measure_ranges_parses_each_summary(ffmpeg_stderr):
+    calls = ffmpeg_stderr(
+        FRAME_LOG + "\n"
+        + summary(4, integrated="-23.5", lra="3.1", peak="-6.2")
+        + summary(2, **SILENT_SUMMARY)
+        + summary(6)
+    )
+    ranges = [(10.0, 70.0), (70.0, 130.0), (10.0, 130.0)]
+    result = measure_ranges("in.m4a", ranges, ffmpeg_path="ffmpeg")
+    assert result == {
+        range_key(10.0, 70.0): {"integrated": None, "range": 0.0, "true_peak": None},
+        range_key(70.0, 130.0): {"integrated": -23.5, "range": 3.1, "true_peak": -6.2},
+        range_key(10.0, 130.0): {"integrated": -18.3, "range": 5.2, "true_peak": -0.4},
+    }
+    # 最初の区間の開始から読み、atrimは読み始めからの相対時間になる
+    cmd = calls[0]
+    assert cmd[cmd.index("-ss") + 1] == "10.000000"
+    assert cmd[cmd.index("-t") + 1] == "120.000000"
+    assert "atrim=start=60.000000:end=120.000000" in cmd[cmd.index("-filter_complex") + 1]
+
+
+def test_measure_ranges_ignores_unknown_filters(ffmpeg_stderr):
+    ffmpeg_stderr(summary(2, integrated="-20.0") + summary(8, integrated="-99.0"))
+    result = measure_ranges("in.m4a", [(0.0, 60.0)], ffmpeg_path="ffmpeg")
+    assert result[range_key(0.0, 60.0)]["integrated"] == -20.0
+
+
+@pytest.mark.parametrize("stderr, returncode", [
+    (summary(2), 1),
+    ("[in#0 @ 0x1] Error opening input: No such file or directory\n" + summary(2), 0),
+])
+def test_measure_ranges_fails_without_every_summary(ffmpeg_stderr, stderr, returncode):
+    ffmpeg_stderr(stderr, returncode)
+    with pytest.raises(RuntimeError) as error:
+        measure_ranges("in.m4a", [(0.0, 60.0), (60.0, 120.0)], ffmpeg_path="ffmpeg")
+    if "Error" in stderr:
+        assert "No such file" in str(error.value)
+
+
+def test_measure_loudness_uses_cached_ranges(tmp_path, monkeypatch, ffmpeg_stderr):
+    monkeypatch.setenv("CHAPTER_SPLIT_CACHE_DIR", str(tmp_path / "cache"))
+    media = tmp_path / "in.m4a"
+    media.write_bytes(b"audio")
+    probe = MediaProbe(str(media), {"format": {"duration": "120"}, "streams": []}, cache_key="key")
+    jobs = [{"start": 0.0, "end": 60.0}, {"start": 60.0, "end": 120.0}]
+    calls = ffmpeg_stderr(summary(2, integrated="-20.0") + summary(4, integrated="-30.0") + summary(6))
+    chapters, album = measure_loudness(str(media), jobs, probe=probe, ffmpeg_path="ffmpeg")
+    assert [m["integrated"] for m in chapters] == [-20.0, -30.0]
+    assert album["integrated"] == -18.3
+
+    # キャッシュにない区間だけを測る
+    jobs.append({"start": 120.0, "end": 150.0})
+    ffmpeg_stderr(summary(2, integrated="-25.0") + summary(4, integrated="-19.0"))
+    chapters, album = measure_loudness(str(media), jobs, probe=probe, ffmpeg_path="ffmpeg")
+    assert [m["integrated"] for m in chapters] == [-20.0, -30.0, -25.0]
+    assert album["integrated"] == -19.0
+    assert len(calls) == 2 and calls[1].count("-map") == 2
+
+
+def measurement(integrated, true_peak):
+    return {"integrated": integrated, "range": 4.0, "true_peak": true_peak}
+
+
+@pytest.mark.parametrize("chapters, album, mode, expected", [
+    # 目標（-16 LUFS）との差をそのまま掛ける
+    ([measurement(-20.0, -10.0), measurement(-14.0, -3.0)], measurement(-18.0, -3.0), "track", [4.0, -2.0]),
+    # トゥルーピークが上限（-1 dBTP）を超えないように抑える
+    ([measurement(-26.0, -4.0)], measurement(-26.0, -4.0), "track", [3.0]),
+    # 無音のチャプターには何もしない
+    ([measurement(None, None), measurement(-20.0, -10.0)], measurement(-20.0, -10.0), "track", [0.0, 4.0]),
+    # アルバム全体のゲインをすべてのチャプターに掛ける
+    ([measurement(-20.0, -10.0), measurement(-24.0, -12.0)], measurement(-22.0, -10.0), "album", [6.0, 6.0]),
+    # 最もピークの高いチャプターで抑える
+    ([measurement(-20.0, -5.0), measurement(-24.0, -12.0)], measurement(-22.0, -6.0), "album", [4.0, 4.0]),
+    ([measurement(None, None)], measurement(None, None), "album", [0.0]),
+])
+def test_chapter_gains(chapters, album, mode, expected):
+    gains = chapter_gains(chapters, album, mode, DEFAULT_TARGET_LUFS, DEFAULT_MAX_TRUE_PEAK)
+    assert gains == pytest.approx(expected)
+
+
+def test_chapter_gains_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        chapter_gains([], measurement(-20.0, -1.0), "loud")
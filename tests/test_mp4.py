@@ -0,0 +1,137 @@
+import struct
+
+import pytest
+
+from chapter_splitter.mp4 import (
+    find_path,
+    item_key,
+    iter_mp4_atoms,
+    mp4_atom,
+    retag_mp4_in_place,
+    unsupported_tags,
+    write_gapless_info,
+)
+
+MDAT = mp4_atom(b"mdat", bytes(range(256)) * 4)
+
+
+def full_atom(kind, payload, version=0):
+    return mp4_atom(kind, struct.pack(">I", version << 24) + payload)
+
+
+# mvhd（1000）・tkhd・mdhd（44100）・stts/stsz（1024サンプルのフレームが10個）・elstを持つ最小のmoov
+def make_moov(media_time=2112):
+    mvhd = full_atom(b"mvhd", struct.pack(">IIII", 0, 0, 1000, 232) + b"\0" * 80)
+    tkhd = full_atom(b"tkhd", struct.pack(">IIIII", 0, 0, 1, 0, 232) + b"\0" * 60)
+    mdhd = full_atom(b"mdhd", struct.pack(">IIIIHH", 0, 0, 44100, 10240, 0, 0))
+    hdlr = full_atom(b"hdlr", struct.pack(">I4s", 0, b"soun") + b"\0" * 13)
+    stts = full_atom(b"stts", struct.pack(">III", 1, 10, 1024))
+    stsz = full_atom(b"stsz", struct.pack(">II", 0, 10) + struct.pack(">10I", *[100] * 10))
+    stbl = mp4_atom(b"stbl", stts + stsz)
+    mdia = mp4_atom(b"mdia", mdhd + hdlr + mp4_atom(b"minf", stbl))
+    elst = full_atom(b"elst", struct.pack(">IIiI", 1, 232, media_time, 0x10000))
+    trak = mp4_atom(b"trak", tkhd + mp4_atom(b"edts", elst) + mdia)
+    return mp4_atom(b"moov", mvhd + trak)
+
+
+def write_file(tmp_path, *atoms):
+    path = tmp_path / "out.m4a"
+    path.write_bytes(mp4_atom(b"ftyp", b"M4A \0\0\0\0") + b"".join(atoms))
+    return str(path)
+
+
+def top_level(data):
+    return [(kind, data[offset:offset + size]) for offset, size, kind, _ in iter_mp4_atoms(data)]
+
+
+def read_moov(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    moovs = [atom for kind, atom in top_level(data) if kind == b"moov"]
+    assert len(moovs) == 1
+    return data, moovs[0][8:]
+
+
+def ilst_values(moov_body):
+    atom = find_path(moov_body, [b"udta", b"meta"])
+    offset, size, header = atom
+    meta_body = moov_body[offset + header + 4:offset + size]
+    offset, size, header = find_path(meta_body, [b"ilst"])
+    values = {}
+    for item_offset, item_size, _, item_header in iter_mp4_atoms(meta_body, offset + header, offset + size):
+        item = meta_body[item_offset:item_offset + item_size]
+        data_offset, data_size, data_header = find_path(item, [b"data"], item_header)
+        values[item_key(item)] = item[data_offset + data_header + 8:data_offset + data_size]
+    return values
+
+
+def test_retag_trailing_moov_keeps_mdat(tmp_path):
+    path = write_file(tmp_path, MDAT, make_moov())
+    retag_mp4_in_place(path, {"title": "Intro", "track": "3/12"})
+    data, moov_body = read_moov(path)
+    values = ilst_values(moov_body)
+    assert values[b"\xa9nam"] == b"Intro"
+    assert values[b"trkn"] == struct.pack(">HHHH", 0, 3, 12, 0)
+    assert dict(top_level(data))[b"mdat"] == MDAT
+
+
+def test_retag_moov_before_mdat_moves_to_end(tmp_path):
+    path = write_file(tmp_path, make_moov(), MDAT)
+    with open(path, "rb") as f:
+        mdat_offset = f.read().index(MDAT)
+    retag_mp4_in_place(path, {"title": "Intro"})
+    data, moov_body = read_moov(path)
+    assert [kind for kind, _ in top_level(data)] == [b"ftyp", b"free", b"mdat", b"moov"]
+    assert data.index(MDAT) == mdat_offset
+    assert ilst_values(moov_body)[b"\xa9nam"] == b"Intro"
+
+
+def test_retag_shrinking_moov_leaves_free_atom(tmp_path):
+    path = write_file(tmp_path, MDAT, make_moov())
+    retag_mp4_in_place(path, {"title": "A long title", "artist": "Someone"})
+    retag_mp4_in_place(path, {"title": "B", "artist": None}, clear=True)
+    data, moov_body = read_moov(path)
+    assert [kind for kind, _ in top_level(data)] == [b"ftyp", b"mdat", b"moov", b"free"]
+    assert ilst_values(moov_body) == {b"\xa9nam": b"B"}
+
+
+def test_retag_replaces_publisher(tmp_path):
+    path = write_file(tmp_path, MDAT, make_moov())
+    retag_mp4_in_place(path, {"title": "A", "publisher": "Old Label"})
+    retag_mp4_in_place(path, {"title": "A", "publisher": "New Label"}, clear=True)
+    _, moov_body = read_moov(path)
+    assert ilst_values(moov_body) == {b"\xa9nam": b"A", b"\xa9pub": b"New Label"}
+
+
+def test_retag_rejects_tags_without_ilst_item(tmp_path):
+    path = write_file(tmp_path, MDAT, make_moov())
+    with open(path, "rb") as f:
+        before = f.read()
+    assert unsupported_tags({"title": "A", "track": "1", "label": "X"}) == ["label"]
+    with pytest.raises(ValueError):
+        retag_mp4_in_place(path, {"title": "A", "label": "X"})
+    with open(path, "rb") as f:
+        assert f.read() == before
+
+
+def test_write_gapless_info(tmp_path):
+    path = write_file(tmp_path, MDAT, make_moov())
+    result = write_gapless_info(path, 8000, 44100)
+    assert (result["priming"], result["padding"], result["valid"]) == (2112, 10240 - 2112 - 8000, 8000)
+
+    _, moov_body = read_moov(path)
+    smpb = ilst_values(moov_body)[(b"----", "iTunSMPB")].decode()
+    assert smpb.split()[1:4] == ["00000840", "00000080", "0000000000001F40"]
+    duration = 8000 * 1000 // 44100
+    offset, _, header = find_path(moov_body, [b"trak", b"edts", b"elst"])
+    assert struct.unpack(">Ii", moov_body[offset + header + 8:offset + header + 16]) == (duration, 2112)
+    offset, _, header = find_path(moov_body, [b"trak", b"tkhd"])
+    assert struct.unpack(">I", moov_body[offset + header + 20:offset + header + 24])[0] == duration
+    offset, _, header = find_path(moov_body, [b"mvhd"])
+    assert struct.unpack(">I", moov_body[offset + header + 16:offset + header + 20])[0] == duration
+
+
+def test_write_gapless_info_rejects_empty_audio(tmp_path):
+    path = write_file(tmp_path, MDAT, make_moov())
+    with pytest.raises(ValueError):
+        write_gapless_info(path, 0, 44100)
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from chapter_splitter import output_cache
+from chapter_splitter.output_cache import cache_stats, find_entry, prune, restore, store
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHAPTER_SPLIT_CACHE_DIR", str(tmp_path / "cache"))
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+# 最終利用日時を指定してキャッシュに保存する
+def stored(tmp_path, audio_key, tag_key, size, mtime):
+    output = write(str(tmp_path / "out" / f"{audio_key}.m4a"), b"x" * size)
+    path = store(output, audio_key, tag_key)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_find_entry_exact_and_retag_only(tmp_path):
+    path = stored(tmp_path, "ab12", "tags1", 10, 1000)
+    assert find_entry("ab12", "tags1", ".m4a") == (path, True)
+    # 音声が同じでタグだけ違う場合は、タグを書き換えて使う
+    assert find_entry("ab12", "tags2", ".m4a") == (path, False)
+    assert find_entry("ab12", "tags1", ".mp3") == (None, False)
+    assert find_entry("ab99", "tags1", ".m4a") == (None, False)
+
+
+def test_store_is_read_only_and_keeps_existing(tmp_path):
+    path = stored(tmp_path, "ab12", "tags1", 10, 1000)
+    assert os.stat(path).st_mode & 0o222 == 0
+    other = write(str(tmp_path / "other.m4a"), b"y" * 20)
+    assert store(other, "ab12", "tags1") == path
+    assert os.path.getsize(path) == 10
+
+
+def test_restore_updates_last_used(tmp_path):
+    path = stored(tmp_path, "ab12", "tags1", 10, 1000)
+    dest = str(tmp_path / "restored.m4a")
+    restore(path, dest)
+    with open(dest, "rb") as f:
+        assert f.read() == b"x" * 10
+    assert os.path.getmtime(path) > 1000
+
+
+def test_prune_removes_least_recently_used_first(tmp_path):
+    oldest = stored(tmp_path, "aa01", "t", 100, 1000)
+    middle = stored(tmp_path, "bb02", "t", 100, 2000)
+    newest = stored(tmp_path, "cc03", "t", 100, 3000)
+    assert prune(limit=300) == (0, 0)
+    assert prune(limit=150) == (2, 200)
+    assert not os.path.exists(oldest) and not os.path.exists(middle)
+    assert os.path.exists(newest)
+
+
+def test_prune_uses_configured_limit_and_max_age(tmp_path, monkeypatch):
+    stored(tmp_path, "aa01", "t", 1024, 1000)
+    recent = stored(tmp_path, "bb02", "t", 1024, 10 ** 10)
+    monkeypatch.setenv("CHAPTER_SPLIT_OUTPUT_CACHE_MB", str(1536 / 1024 / 1024))
+    assert output_cache.cache_limit() == 1536
+    assert prune() == (1, 1024)
+    assert cache_stats()["entries"] == 1
+    # 上限内でも長く使われていないものは削除する
+    os.utime(recent, (1000, 1000))
+    assert prune(max_age=60) == (1, 1024)
+    assert cache_stats()["bytes"] == 0
+
+
+def test_prune_ignores_temporary_files(tmp_path):
+    directory = os.path.dirname(stored(tmp_path, "aa01", "t", 100, 1000))
+    temp = write(os.path.join(directory, "aa01.t.m4a.1.2.tmp"), b"z" * 500)
+    assert prune(limit=0) == (1, 100)
+    assert os.path.exists(temp)
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+
+def run_python(code):
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+
+
+def test_import_does_not_load_submodules():
+    loaded = run_python("import sys, chapter_splitter; print('asyncio' in sys.modules, 'chapter_splitter.split' in sys.modules)")
+    assert loaded == ["False", "False"]
+
+
+def test_exports_resolve_to_functions_after_submodule_import():
+    kinds = run_python(
+        "import chapter_splitter.cli\n"
+        "from chapter_splitter import probe, runner, split\n"
+        "print(type(split).__name__, type(probe).__name__, type(runner).__name__)"
+    )
+    assert kinds == ["function", "function", "module"]
@@ -0,0 +1,107 @@
+import pytest
+
+from chapter_splitter.parsers import (
+    ChapterParseError,
+    detect_format,
+    parse_chapter_list,
+    parse_timestamp_ms,
+)
+
+
+def spans(chapters):
+    return [(chapter.title, chapter.start_ms, chapter.end_ms) for chapter in chapters]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1:05", 65000),
+    ("01:02:03", 3723000),
+    ("0:01.5", 1500),
+    ("0:01,25", 1250),
+])
+def test_parse_timestamp_ms(text, expected):
+    assert parse_timestamp_ms(text) == expected
+
+
+@pytest.mark.parametrize("text", ["1:60", "1:60:00", "abc"])
+def test_parse_timestamp_ms_rejects(text):
+    with pytest.raises(ValueError):
+        parse_timestamp_ms(text)
+
+
+def test_legacy_text_with_end_line():
+    chapters = parse_chapter_list("Intro 0:00\nMain 1:00.500\nEND 2:00\n")
+    assert spans(chapters) == [("Intro", 0, 60500), ("Main", 60500, 120000)]
+
+
+def test_youtube_time_first_uses_duration_for_last():
+    chapters = parse_chapter_list("0:00 Intro\n1. [01:30] - Song\n", duration_ms=200000)
+    assert spans(chapters) == [("Intro", 0, 90000), ("Song", 90000, 200000)]
+
+
+def test_range_with_trailing_end_time():
+    chapters = parse_chapter_list("0:00 Intro - 1:00\n1:00 Outro - 2:00\n")
+    assert spans(chapters) == [("Intro", 0, 60000), ("Outro", 60000, 120000)]
+
+
+def test_range_with_leading_bracket():
+    chapters = parse_chapter_list("[0:00 - 1:00] A\n[1:30 - 2:00] B\n")
+    assert spans(chapters) == [("A", 0, 60000), ("B", 90000, 120000)]
+
+
+def test_title_with_dash_after_leading_time():
+    chapters = parse_chapter_list("0:00 Artist - Song\n1:00 Next\n", duration_ms=90000)
+    assert spans(chapters) == [("Artist - Song", 0, 60000), ("Next", 60000, 90000)]
+
+
+def test_errors_are_collected_with_line_numbers():
+    with pytest.raises(ChapterParseError) as info:
+        parse_chapter_list("Intro 0:00\nbroken line\nMain 0:00\nOther 1:99\n")
+    assert [line_no for line_no, _ in info.value.errors] == [2, 3, 4]
+
+
+def test_overlapping_ranges_are_rejected():
+    with pytest.raises(ChapterParseError) as info:
+        parse_chapter_list("[0:00 - 2:00] A\n[1:00 - 3:00] B\n")
+    assert info.value.errors[0][0] == 2
+
+
+def test_cue_sheet():
+    text = "\n".join([
+        'PERFORMER "Album Artist"',
+        'FILE "mix.wav" WAVE',
+        "  TRACK 01 AUDIO",
+        '    TITLE "First"',
+        '    PERFORMER "DJ"',
+        "    INDEX 01 00:00:00",
+        "  TRACK 02 AUDIO",
+        "    INDEX 00 01:59:00",
+        "    INDEX 01 02:00:37",
+    ])
+    assert detect_format(text.splitlines()[0]) == "cue"
+    chapters = parse_chapter_list(text, duration_ms=300000)
+    assert spans(chapters) == [("DJ - First", 0, 120493), ("Track 02", 120493, 300000)]
+
+
+def test_ffmetadata():
+    text = "\n".join([
+        ";FFMETADATA1",
+        "title=Whole",
+        "[CHAPTER]",
+        "TIMEBASE=1/1000",
+        "START=0",
+        "END=60000",
+        "title=One \\= two",
+        "[CHAPTER]",
+        "TIMEBASE=1/44100",
+        "START=2646000",
+        "END=5292000",
+    ])
+    chapters = parse_chapter_list(text)
+    assert spans(chapters) == [("One = two", 0, 60000), ("Chapter 2", 60000, 120000)]
+
+
+def test_streams_many_entries():
+    lines = (f"{minute}:00 Track {minute}\n" for minute in range(5000))
+    chapters = parse_chapter_list(lines, duration_ms=5000 * 60000)
+    assert len(chapters) == 5000
+    assert chapters[-1].end_ms == 5000 * 60000
@@ -0,0 +1,119 @@
+import struct
+
+import pytest
+
+from chapter_splitter.pcm import (
+    build_header,
+    parse_pcm_header,
+    split_pcm,
+)
+
+GUID_TAIL = b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+
+
+def wav_bytes(fmt, data):
+    chunks = struct.pack("<4sI", b"fmt ", len(fmt)) + fmt + struct.pack("<4sI", b"data", len(data)) + data
+    return struct.pack("<4sI4s", b"RIFF", 4 + len(chunks), b"WAVE") + chunks
+
+
+def pcm_fmt(channels=2, sample_rate=8000, bits=16):
+    block_align = channels * bits // 8
+    return struct.pack("<HHIIHH", 1, channels, sample_rate, sample_rate * block_align, block_align, bits)
+
+
+def extensible_fmt(subformat_code, channels=2, sample_rate=8000, bits=16):
+    block_align = channels * bits // 8
+    return (struct.pack("<HHIIHH", 0xFFFE, channels, sample_rate, sample_rate * block_align, block_align, bits)
+            + struct.pack("<HHI", 22, bits, 3) + struct.pack("<H", subformat_code) + GUID_TAIL)
+
+
+def aiff_bytes(channels, sample_rate, bits, data):
+    # 8000Hzの80ビット拡張精度
+    rate = struct.pack(">HQ", 16383 + 12, sample_rate << (63 - 12))
+    comm = struct.pack(">hIh", channels, len(data) // (channels * bits // 8), bits) + rate
+    chunks = (struct.pack(">4sI", b"COMM", len(comm)) + comm
+              + struct.pack(">4sIII", b"SSND", 8 + len(data), 0, 0) + data)
+    return struct.pack(">4sI4s", b"FORM", 4 + len(chunks), b"AIFF") + chunks
+
+
+def write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_parse_wav_pcm(tmp_path):
+    data = bytes(range(200)) * 4
+    info = parse_pcm_header(write(tmp_path, "in.wav", wav_bytes(pcm_fmt(), data)))
+    assert (info.container, info.channels, info.sample_rate, info.bits, info.block_align) == ("wav", 2, 8000, 16, 4)
+    assert info.data_offset == 12 + 8 + 16 + 8
+    assert info.data_size == len(data)
+    assert info.frames == 200
+    assert info.byte_offset(0.01) == 80 * 4
+
+
+@pytest.mark.parametrize("code", [1, 3])
+def test_parse_wav_extensible_pcm_and_float(tmp_path, code):
+    info = parse_pcm_header(write(tmp_path, "in.wav", wav_bytes(extensible_fmt(code), b"\0" * 64)))
+    assert info.block_align == 4 and info.data_size == 64
+
+
+def test_parse_wav_rejects_extensible_non_pcm(tmp_path):
+    # SubFormatがPCM/浮動小数点以外（ここではMPEG）ならffmpegの経路に任せる
+    path = write(tmp_path, "in.wav", wav_bytes(extensible_fmt(0x0050), b"\0" * 64))
+    with pytest.raises(ValueError):
+        parse_pcm_header(path)
+
+
+def test_parse_wav_rejects_compressed_format(tmp_path):
+    fmt = struct.pack("<HHIIHH", 0x0055, 2, 44100, 16000, 1, 0)
+    with pytest.raises(ValueError):
+        parse_pcm_header(write(tmp_path, "in.wav", wav_bytes(fmt, b"\0" * 64)))
+
+
+def test_parse_aiff(tmp_path):
+    info = parse_pcm_header(write(tmp_path, "in.aiff", aiff_bytes(1, 8000, 16, b"\0" * 100)))
+    assert (info.container, info.channels, info.sample_rate, info.bits) == ("aiff", 1, 8000, 16)
+    assert info.data_size == 100
+    assert info.extension == ".aiff"
+
+
+def test_build_header_round_trips_wav(tmp_path):
+    info = parse_pcm_header(write(tmp_path, "in.wav", wav_bytes(pcm_fmt(), b"\0" * 400)))
+    data = b"\1\2\3\4" * 10
+    header = build_header(info, len(data), {"title": "Intro", "track": "1"})
+    out = parse_pcm_header(write(tmp_path, "out.wav", header + data))
+    assert out.data_size == len(data)
+    assert out.format_chunk == info.format_chunk
+    assert b"INAM" in header and b"Intro\0" in header
+
+
+def test_build_header_round_trips_aiff(tmp_path):
+    info = parse_pcm_header(write(tmp_path, "in.aiff", aiff_bytes(2, 8000, 16, b"\0" * 400)))
+    header = build_header(info, 40, {"title": "Intro"})
+    out = parse_pcm_header(write(tmp_path, "out.aiff", header + b"\0" * 40))
+    assert out.data_size == 40
+    assert struct.unpack(">I", out.format_chunk[2:6])[0] == 10
+
+
+def test_split_pcm_cuts_at_sample_boundaries(tmp_path):
+    data = b"".join(struct.pack("<hh", i, -i) for i in range(800))
+    source = write(tmp_path, "in.wav", wav_bytes(pcm_fmt(), data))
+    info = parse_pcm_header(source)
+    jobs = [
+        {"start": 0.0, "end": 0.05, "title": "A", "track": 1, "output_file": str(tmp_path / "01.wav")},
+        {"start": 0.05, "end": 0.1, "title": "B", "track": 2, "output_file": str(tmp_path / "02.wav")},
+    ]
+    done = []
+    completed = split_pcm(info, source, jobs, {}, lambda metadata, job: {"title": job["title"]},
+                          on_chapter_done=lambda index, job: done.append(index))
+    assert completed == [job["output_file"] for job in jobs]
+    assert done == [0, 1]
+    pieces = []
+    for job in jobs:
+        out = parse_pcm_header(job["output_file"])
+        with open(job["output_file"], "rb") as f:
+            f.seek(out.data_offset)
+            pieces.append(f.read(out.data_size))
+    assert [len(piece) for piece in pieces] == [400 * 4, 400 * 4]
+    assert b"".join(pieces) == data
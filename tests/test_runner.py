@@ -0,0 +1,87 @@
+import sys
+import time
+
+import pytest
+
+from chapter_splitter import runner
+
+
+def python_command(code):
+    return [sys.executable, "-c", code]
+
+
+def test_run_collects_output_and_returncode():
+    result = runner.run(python_command("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"), "test")
+    assert result.returncode == 3
+    assert result.stdout == "out\n"
+    assert result.stderr == "err\n"
+
+
+def test_run_passes_fixed_size_chunks():
+    chunks = []
+    result = runner.run(
+        python_command("import sys; sys.stdout.buffer.write(b'x' * 10007)"), "test",
+        on_stdout=chunks.append, chunk_size=1000,
+    )
+    assert result.returncode == 0
+    assert [len(chunk) for chunk in chunks] == [1000] * 10 + [7]
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+
+
+def test_run_stops_when_cancelled():
+    started = time.monotonic()
+    with pytest.raises(runner.ProcessCancelled):
+        runner.run(
+            python_command("import time; time.sleep(30)"), "test",
+            should_stop=lambda: time.monotonic() - started > 0.2,
+        )
+    assert time.monotonic() - started < 10
+
+
+def test_run_times_out_without_output():
+    with pytest.raises(runner.ProcessTimeout):
+        runner.run(python_command("import time; time.sleep(30)"), "test", idle_timeout=0.3)
+
+
+def fake_tool(tmp_path, name, code):
+    path = tmp_path / name
+    path.write_text(f"#!{sys.executable}\n{code}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_ffprobe_version_runs_through_runner(tmp_path):
+    from chapter_splitter.ffmpeg import get_ffprobe_version
+
+    ffprobe = fake_tool(tmp_path, "ffprobe", "print('ffprobe version 6.1-test Copyright')")
+    assert get_ffprobe_version(ffprobe) == "ffprobe version 6.1-test Copyright"
+    assert get_ffprobe_version(str(tmp_path / "missing")) == "unknown"
+
+
+def test_shutdown_stops_snippet_playback(tmp_path):
+    from chapter_splitter.waveform import play_snippet
+
+    ffplay = fake_tool(tmp_path, "ffplay", "import time; time.sleep(30)")
+    player = play_snippet(str(tmp_path / "in.m4a"), 10.0, ffplay_path=ffplay)
+    deadline = time.monotonic() + 5
+    while not runner.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert runner.running
+    started = time.monotonic()
+    runner.shutdown()
+    assert player.result(timeout=10).returncode != 0
+    assert time.monotonic() - started < 10
+    assert not runner.running
+
+
+def test_cancelling_snippet_stops_playback(tmp_path):
+    from chapter_splitter.waveform import play_snippet
+
+    ffplay = fake_tool(tmp_path, "ffplay", "import time; time.sleep(30)")
+    player = play_snippet(str(tmp_path / "in.m4a"), 10.0, ffplay_path=ffplay)
+    time.sleep(0.2)
+    player.cancel()
+    deadline = time.monotonic() + 10
+    while runner.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not runner.running
@@ -0,0 +1,239 @@
+import importlib
+import threading
+
+import pytest
+
+from chapter_splitter import output_cache
+from chapter_splitter.parsers import parse_chapter_list
+from chapter_splitter.probe import MediaProbe
+from chapter_splitter.split import (
+    build_copy_command,
+    build_split_command,
+    chapter_fraction,
+    chapters_done,
+    plan_copy_cuts,
+    plan_split,
+    plan_split_groups,
+    snap_to_packet,
+)
+
+
+def make_job(track, start, end, profiles=("aac256",)):
+    return {
+        "start": start,
+        "end": end,
+        "title": f"Chapter {track}",
+        "track": track,
+        "output_file": f"/out/{track:02d}.m4a",
+        "outputs": [{"profile": name, "output_file": f"/out/{name}/{track:02d}.m4a"} for name in profiles],
+    }
+
+
+def test_chapters_done_counts_chapters_behind_position():
+    bounds = [(0.0, 10.0), (10.0, 25.0), (25.0, 40.0)]
+    assert chapters_done(bounds, 0.0) == 0
+    assert chapters_done(bounds, 9.99) == 0
+    assert chapters_done(bounds, 10.0) == 1
+    assert chapters_done(bounds, 24.0) == 1
+    assert chapters_done(bounds, 30.0) == 2
+    assert chapters_done(bounds, 40.0) == 3
+    assert chapters_done(bounds, 100.0) == 3
+
+
+def test_chapters_done_with_gaps_between_chapters():
+    bounds = [(0.0, 5.0), (8.0, 12.0)]
+    assert chapters_done(bounds, 6.0) == 1
+    assert chapters_done(bounds, 11.0) == 1
+
+
+def test_chapter_fraction_only_for_chapter_being_encoded():
+    bounds = [(0.0, 10.0), (12.0, 22.0)]
+    assert chapter_fraction(bounds, 0, 0.0) == 0.0
+    assert chapter_fraction(bounds, 0, 5.0) == 0.5
+    assert chapter_fraction(bounds, 1, 11.0) is None
+    assert chapter_fraction(bounds, 1, 17.0) == 0.5
+    assert chapter_fraction(bounds, 1, 22.0) is None
+    assert chapter_fraction(bounds, 2, 30.0) is None
+
+
+def test_chapter_fraction_ignores_empty_chapters():
+    assert chapter_fraction([(5.0, 5.0)], 0, 5.0) is None
+
+
+def test_plan_split_groups_balances_by_duration():
+    jobs = [make_job(track, start, start + 10.0) for track, start in enumerate([0.0, 10.0, 20.0, 30.0], 1)]
+    assert plan_split_groups(jobs, 2) == [[0, 1], [2, 3]]
+    assert plan_split_groups(jobs, 8) == [[0], [1], [2], [3]]
+    assert plan_split_groups(jobs, 0) == [[0, 1, 2, 3]]
+
+
+def test_plan_split_groups_keeps_long_chapter_alone():
+    jobs = [make_job(1, 0.0, 100.0)] + [make_job(track, 98.0 + track, 99.0 + track) for track in (2, 3, 4)]
+    assert plan_split_groups(jobs, 2) == [[0], [1, 2, 3]]
+
+
+def test_split_command_reports_position_from_untrimmed_branch():
+    jobs = [make_job(1, 100.0, 110.0), make_job(2, 110.0, 130.0)]
+    cmd = build_split_command("ffmpeg", "/in.m4a", jobs, {}, offset=100.0, duration=30.0)
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:a:0]asplit=3[s0][s1][pos]")
+    assert "[s0]atrim=start=0.000000:end=10.000000,asetpts=PTS-STARTPTS[c0_0]" in graph
+    assert "[s1]atrim=start=10.000000:end=30.000000,asetpts=PTS-STARTPTS[c1_0]" in graph
+    assert cmd[-5:] == ["-map", "[pos]", "-f", "null", "-"]
+    assert cmd[cmd.index("-ss") + 1] == "100.000000"
+
+
+def test_split_command_fans_out_profiles():
+    jobs = [make_job(1, 0.0, 10.0, profiles=("aac256", "opus64"))]
+    cmd = build_split_command("ffmpeg", "/in.m4a", jobs, {})
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert "asetpts=PTS-STARTPTS,asplit=2[c0_0][c0_1]" in graph
+    assert "-ss" not in cmd
+    assert "/out/aac256/01.m4a" in cmd and "/out/opus64/01.m4a" in cmd
+
+
+def test_split_command_sample_accurate_trim():
+    jobs = [make_job(1, 1.0, 2.0)]
+    cmd = build_split_command("ffmpeg", "/in.m4a", jobs, {}, offset=1.0, duration=1.0, sample_rate=48000)
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:a:0]asetpts=N/SR/TB,asplit=2[s0][pos]")
+    assert "atrim=start_sample=0:end_sample=48000" in graph
+
+
+def test_copy_command_adds_position_output():
+    jobs = [make_job(1, 0.0, 10.0), make_job(2, 10.0, 20.0)]
+    cmd = build_copy_command("ffmpeg", "/in.m4a", jobs, {})
+    assert cmd[-7:] == ["-map", "0:a:0", "-c:a", "copy", "-f", "null", "-"]
+    assert "/out/01.m4a" in cmd and "/out/02.m4a" in cmd
+
+
+def test_split_reports_pending_chapters_with_original_indices(tmp_path, monkeypatch):
+    # パッケージのsplitは関数なので、モジュールはimport_moduleで取る
+    split_module = importlib.import_module("chapter_splitter.split")
+
+    jobs = [make_job(1, 0.0, 10.0), make_job(2, 10.0, 20.0), make_job(3, 20.0, 30.0)]
+    for job in jobs:
+        for output in job["outputs"]:
+            output["output_file"] = str(tmp_path / output["output_file"].lstrip("/"))
+    plan = split_module.SplitPlan("/in.m4a", str(tmp_path), jobs, {})
+    monkeypatch.setattr(split_module, "source_fingerprint", lambda path: "source")
+    monkeypatch.setattr(split_module, "store_cached_outputs", lambda *args: None)
+    # 2番目のチャプターだけがキャッシュにない
+    monkeypatch.setattr(
+        split_module, "restore_cached_outputs",
+        lambda plan, *args: ([], [plan.jobs[1]], [1]),
+    )
+
+    def fake_run_split(pending_plan, jobs, ffmpeg_path, log, on_chapter_done, should_stop, on_progress):
+        on_progress(0, pending_plan.jobs[0], 0.5)
+        on_chapter_done(0, pending_plan.jobs[0])
+
+    monkeypatch.setattr(split_module, "run_split", fake_run_split)
+    progress, done = [], []
+    split_module.split(
+        plan, jobs=1, ffmpeg_path="ffmpeg",
+        on_progress=lambda index, job, fraction: progress.append((index, job["track"], fraction)),
+        on_chapter_done=lambda index, job: done.append((index, job["track"])),
+    )
+    assert progress == [(1, 2, 0.5)]
+    assert done == [(1, 2)]
+
+
+def test_link_or_copy_uses_per_thread_temp_files(tmp_path, monkeypatch):
+    source = tmp_path / "source.m4a"
+    source.write_bytes(b"audio")
+    seen = []
+    real_copyfile = output_cache.shutil.copyfile
+
+    def copyfile(src, dst):
+        seen.append(dst)
+        return real_copyfile(src, dst)
+
+    monkeypatch.setattr(output_cache.shutil, "copyfile", copyfile)
+    dest = str(tmp_path / "out.m4a")
+    threads = [threading.Thread(target=output_cache.link_or_copy, args=(str(source), dest, False)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(seen)) == 2
+    assert open(dest, "rb").read() == b"audio"
+
+
+def make_probe(duration):
+    return MediaProbe("/in.m4a", {
+        "format": {"duration": str(duration)},
+        "streams": [{"codec_type": "audio", "codec_name": "aac", "sample_rate": "44100"}],
+    })
+
+
+def test_plan_extends_open_ended_last_chapter_to_duration(tmp_path):
+    chapters = parse_chapter_list("Intro 0:00\nMain 1:00\n")
+    assert chapters[-1].end_ms == chapters[-1].start_ms
+    plan = plan_split("/in.m4a", chapters, output_dir=str(tmp_path), probe=make_probe(95.5))
+    assert [(job["start"], job["end"]) for job in plan.jobs] == [(0.0, 60.0), (60.0, 95.5)]
+
+
+def test_plan_rejects_open_ended_last_chapter_without_duration(tmp_path):
+    chapters = parse_chapter_list("Intro 0:00\nMain 1:00\n")
+    with pytest.raises(ValueError):
+        plan_split("/in.m4a", chapters, output_dir=str(tmp_path), probe=make_probe(""))
+
+
+# AACのパケット（1024サンプル）の開始時刻
+AAC_FRAME = 1024 / 44100
+AAC_PACKETS = [i * AAC_FRAME for i in range(int(180 / AAC_FRAME) + 1)]
+
+
+@pytest.mark.parametrize("packet_times, seconds, expected", [
+    ([0.0, 1.0, 2.0], 1.0, 1.0),
+    ([0.0, 1.0, 2.0], 1.4, 1.0),
+    ([0.0, 1.0, 2.0], 1.6, 2.0),
+    # ちょうど中間なら前のパケット
+    ([0.0, 1.0, 2.0], 1.5, 1.0),
+    ([0.5, 1.0, 2.0], 0.0, 0.5),
+    ([0.0, 1.0, 2.0], 9.0, 2.0),
+    ([], 1.3, 1.3),
+])
+def test_snap_to_packet(packet_times, seconds, expected):
+    assert snap_to_packet(packet_times, seconds) == expected
+
+
+@pytest.mark.parametrize("boundaries, expected", [
+    # パケット境界ちょうどのチャプターはずれない
+    ([0.0, 1.0, 2.0], [(0.0, 1.0, 0.0, 0.0), (1.0, 2.0, 0.0, 0.0)]),
+    ([0.1, 1.3, 1.8], [(0.0, 1.0, -0.1, -0.3), (1.0, 2.0, -0.3, 0.2)]),
+    # 最後のパケットより後の終端はそのまま残す
+    ([0.0, 1.2, 2.7], [(0.0, 1.0, 0.0, -0.2), (1.0, 2.7, -0.2, 0.0)]),
+])
+def test_plan_copy_cuts(boundaries, expected):
+    jobs = [make_job(i + 1, start, end) for i, (start, end) in enumerate(zip(boundaries, boundaries[1:]))]
+    planned = plan_copy_cuts(jobs, [0.0, 1.0, 2.0])
+    assert [(job["start"], job["end"], job["start_drift"], job["end_drift"]) for job in planned] == [
+        pytest.approx(row) for row in expected]
+    assert [job["title"] for job in planned] == [job["title"] for job in jobs]
+
+
+def test_plan_copy_cuts_drift_does_not_accumulate():
+    # 1.5秒ごとの境界はパケット境界と一致しないが、各境界を独立に合わせるため
+    # ずれは常に半パケット以内で、前のチャプターの終端と次の開始は同じ位置になる
+    boundaries = [i * 1.5 for i in range(121)]
+    jobs = [make_job(i + 1, start, end) for i, (start, end) in enumerate(zip(boundaries, boundaries[1:]))]
+    planned = plan_copy_cuts(jobs, AAC_PACKETS)
+    assert all(abs(job["start_drift"]) <= AAC_FRAME / 2 and abs(job["end_drift"]) <= AAC_FRAME / 2
+               for job in planned)
+    assert all(a["end"] == b["start"] for a, b in zip(planned, planned[1:]))
+    assert abs(planned[-1]["end"] - 180.0) <= AAC_FRAME / 2
+
+
+def test_plan_split_copy_mode_snaps_to_packets(tmp_path, monkeypatch):
+    probe = make_probe(180)
+    monkeypatch.setattr(probe, "packet_times", lambda ffprobe_path=None: AAC_PACKETS)
+    chapters = parse_chapter_list("Intro 0:00\nMain 1:00.5\nEND 3:00\n")
+    plan = plan_split("/in.m4a", chapters, output_dir=str(tmp_path), mode="copy", probe=probe)
+    assert plan.mode == "copy"
+    intro, main = plan.jobs
+    assert intro["end"] == main["start"] in AAC_PACKETS
+    assert abs(main["start"] - 60.5) <= AAC_FRAME / 2
+    # 最後のパケットより後の終端（ファイル末尾）はそのまま
+    assert AAC_PACKETS[-1] < 180.0 and main["end"] == 180.0
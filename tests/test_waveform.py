@@ -0,0 +1,67 @@
+import struct
+import sys
+
+import pytest
+
+from chapter_splitter import waveform
+from chapter_splitter.waveform import (
+    BASE_BLOCK,
+    LEVEL_FACTOR,
+    WaveformOverview,
+    block_peaks,
+    reduce_peaks,
+    save_levels,
+)
+
+
+def pcm(values):
+    return struct.pack(f"<{len(values)}h", *values)
+
+
+def test_block_peaks_and_reduce():
+    peaks = block_peaks(pcm([1, -5, 3, 7, -2, 0, 4]), 3)
+    assert list(peaks) == [-5, 3, -2, 7, 4, 4]
+    assert list(reduce_peaks(peaks, 2)) == [-5, 7, 4, 4]
+
+
+def test_saved_levels_are_little_endian_and_round_trip(tmp_path):
+    # 1ブロック目は無音、2ブロック目は-16384〜16384、以降は無音
+    samples = [0] * BASE_BLOCK + [-16384, 16384] * (BASE_BLOCK // 2) + [0] * BASE_BLOCK * (LEVEL_FACTOR * 2 - 2)
+    base = block_peaks(pcm(samples), BASE_BLOCK)
+    levels = [base, reduce_peaks(base, LEVEL_FACTOR)]
+    data_path, meta_path = str(tmp_path / "w.peaks"), str(tmp_path / "w.json")
+    duration = len(samples) / waveform.WAVEFORM_SAMPLE_RATE
+    meta = save_levels(levels, data_path, meta_path, duration)
+
+    with open(data_path, "rb") as f:
+        raw = f.read()
+    assert list(struct.unpack(f"<{len(raw) // 2}h", raw)) == list(levels[0]) + list(levels[1])
+    assert [level["count"] for level in meta["levels"]] == [LEVEL_FACTOR * 2, 2]
+
+    overview = WaveformOverview(meta, data_path)
+    try:
+        block_seconds = BASE_BLOCK / overview.sample_rate
+        columns = overview.peaks(0.0, block_seconds * 4, 4)
+        assert columns == [(0.0, 0.0), (-0.5, 0.5), (0.0, 0.0), (0.0, 0.0)]
+        # 1列に複数ブロックが入る場合は粗い段を使う
+        assert overview.peaks(0.0, duration, 2) == [(-0.5, 0.5), (0.0, 0.0)]
+        assert overview.peaks(duration, duration * 2, 1) == [None]
+    finally:
+        overview.close()
+
+
+def test_overview_byte_swaps_on_big_endian(tmp_path, monkeypatch):
+    if sys.byteorder != "little":
+        pytest.skip("リトルエンディアンの環境でビッグエンディアンの読み込みを再現する")
+    # ビッグエンディアンの環境では、リトルエンディアンの.peaksをネイティブの順序で読むと
+    # ここで書くバイト列と同じ並びになる
+    data_path = tmp_path / "w.peaks"
+    data_path.write_bytes(struct.pack(">4h", -3, 3, -100, 100))
+    monkeypatch.setattr(sys, "byteorder", "big")
+    monkeypatch.setattr(waveform, "np", None)
+    meta = {"sample_rate": 8000, "duration": 0.02, "levels": [{"block": BASE_BLOCK, "offset": 0, "count": 2}]}
+    overview = WaveformOverview(meta, str(data_path))
+    try:
+        assert list(overview.values) == [-3, 3, -100, 100]
+    finally:
+        overview.close()